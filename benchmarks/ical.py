@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+iCalendar parser benchmark for kagenda_helper.parse_ical_events
+
+Parses a large synthetic .ics corpus (or a real file) and fails if the
+parse cost per event exceeds the budget.
+
+Usage: python3 benchmarks/ical.py [--events N] [--file calendar.ics] [--max-us-per-event US]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import kagenda_helper
+from synthetic import ics_corpus, ics_objects
+
+
+def best_of(runs, func):
+    """Return (best seconds, result) over several runs"""
+    best, result = None, None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--file', help='parse this .ics file instead of the synthetic corpus')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-us-per-event', type=float, default=100)
+    args = parser.parse_args()
+    # As the helper's main() does at startup
+    kagenda_helper.tune_gc()
+
+    if args.file:
+        corpora = {'file': [Path(args.file).read_text(encoding='utf-8')]}
+    else:
+        corpora = {
+            'single .ics': [ics_corpus(args.events)],
+            'per-object .ics': ics_objects(args.events),
+        }
+
+    failed = False
+    for name, texts in corpora.items():
+        size = sum(len(t) for t in texts)
+        elapsed, events = best_of(args.runs, lambda: [e for t in texts for e in kagenda_helper.parse_ical_events(t)])
+        per_event = elapsed / max(len(events), 1) * 1e6
+        status = 'ok'
+        if per_event > args.max_us_per_event:
+            status = f"FAIL: over budget of {args.max_us_per_event:.0f} us/event"
+            failed = True
+        print(f"{name}: {len(events)} events, {size / 1e6:.1f} MB in {elapsed * 1000:.0f} ms "
+              f"({per_event:.1f} us/event, {size / elapsed / 1e6:.1f} MB/s) - {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Interval index benchmark for kagenda_helper.EventIndex
+
+Indexes a year of events from several busy calendars, then times the
+overlap query behind "what is on now", the free slot search behind "next
+free 30-minute slot" and the conflict sweep, and fails if building the
+index or a query exceeds its budget. Query results are checked against a
+linear scan.
+
+Usage: python3 benchmarks/intervals.py [--events N] [--queries N] [--runs N] [--max-us-per-event US]
+                                       [--max-us-per-query US]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import kagenda_helper
+from ical import best_of
+
+YEAR_START_MS = int(datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+YEAR_MS = 365 * 86400 * 1000
+MINUTE_MS = 60000
+
+
+def synthetic_events(count, seed=1):
+    """Events as the fetch returns them: mostly meetings, some long and all-day ones"""
+    rng = random.Random(seed)
+    events = []
+    for index in range(count):
+        start = YEAR_START_MS + rng.randrange(YEAR_MS // (15 * MINUTE_MS)) * 15 * MINUTE_MS
+        minutes = rng.choice((15, 30, 30, 45, 60, 60, 90, 120, 480, 4320))
+        events.append({'uid': f"synthetic-{index}", 'summary': f"Synthetic meeting {index}", 'location': '',
+                       'start': '', 'start_ms': start, 'end_ms': start + minutes * MINUTE_MS,
+                       'all_day': index % 20 == 0})
+    return events
+
+
+def timed_per_call(calls):
+    """Run the calls and return (seconds per call, results)"""
+    started = time.perf_counter()
+    results = [call() for call in calls]
+    return (time.perf_counter() - started) / len(calls), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=50000, help='events in the indexed year')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-us-per-event', type=float, default=30,
+                        help='allowed cost of indexing per event, and of the conflict sweep per result')
+    parser.add_argument('--max-us-per-query', type=float, default=200)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events)
+    rng = random.Random(2)
+    points = [YEAR_START_MS + rng.randrange(YEAR_MS) for _ in range(args.queries)]
+    failed = False
+
+    def report(name, per_item, budget, unit, detail, wrong=0):
+        nonlocal failed
+        status = 'ok'
+        if wrong:
+            status = f"FAIL: {wrong} results differ from a linear scan"
+            failed = True
+        elif per_item * 1e6 > budget:
+            status = f"FAIL: over budget of {budget:.0f} us/{unit}"
+            failed = True
+        print(f"{name}: {detail} ({per_item * 1e6:.1f} us/{unit}) - {status}")
+
+    elapsed, index = best_of(args.runs, lambda: kagenda_helper.EventIndex(events))
+    report('build', elapsed / args.events, args.max_us_per_event, 'event',
+           f"{len(index.events)} timed events indexed in {elapsed * 1000:.0f} ms")
+
+    per_query, found = timed_per_call([lambda p=p: index.overlapping(p, p + 30 * MINUTE_MS) for p in points])
+    checked = points[:50]
+    wrong = sum(1 for p, result in zip(checked, found)
+                if len(result) != sum(1 for e in index.events if e['start_ms'] < p + 30 * MINUTE_MS
+                                      and e['end_ms'] > p))
+    report('overlapping', per_query, args.max_us_per_query, 'query',
+           f"{sum(map(len, found))} events over {args.queries} half-hours", wrong)
+
+    per_query, found = timed_per_call([lambda p=p: next(index.free_slots(p, p + YEAR_MS, 30 * MINUTE_MS), None)
+                                       for p in points])
+    wrong = sum(1 for slot in found[:50] if slot and index.overlapping(slot[0], slot[0] + 30 * MINUTE_MS))
+    report('next free slot', per_query, args.max_us_per_query, 'query',
+           f"{sum(1 for slot in found if slot)} slots found for {args.queries} points in time", wrong)
+
+    # The sweep is linear in events plus pairs found, so it is budgeted per both
+    elapsed, conflicts = best_of(args.runs, lambda: sum(1 for _ in index.conflicts()))
+    report('conflicts', elapsed / (args.events + conflicts), args.max_us_per_event, 'result',
+           f"{conflicts} overlapping pairs in {elapsed * 1000:.0f} ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the helper's fetch subcommands against local stand-in servers
+
+Starts a Nextcloud-like CalDAV server and a fake Google Calendar/Tasks API
+(benchmarks/mock_servers.py) holding synthetic calendars of each size,
+then runs every subcommand in its own interpreter, cold (empty cache) and
+again after another client changed 1% of the data, with the window
+starting a few minutes later as the widget's does. For each run it
+reports the end-to-end latency, peak RSS, requests and bytes on the wire
+and bytes printed for the widget, and fails if a run exceeds its budget,
+if an incremental refresh transfers more than a fraction of a full one,
+or if a run regressed against a baseline saved with --save.
+
+Usage: python3 benchmarks/load.py [--sizes N,N,...] [--calendars N] [--base-ms MS] [--max-us-per-event US]
+                                  [--base-rss-mb MB] [--max-kb-per-event KB] [--max-delta-ratio R]
+                                  [--baseline FILE] [--save FILE] [--tolerance R]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS.parent))
+sys.path.insert(0, str(BENCHMARKS))
+
+from mock_servers import MockCalDAVServer, MockGoogleServer
+
+# The widget's window starts at the current time, so each refresh asks for a later one
+TIME_MINS = ['2024-01-01T08:00:00.000Z', '2024-01-01T08:05:00.000Z']
+TIME_MAX = '2025-01-01T00:00:00Z'
+TOKEN = 'benchmark-token'
+
+
+class CountingWriter:
+    """stdout stand-in that only counts what the helper prints"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode('utf-8'))
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def run_child(spec):
+    """Run one helper command in this process and print its measurements as JSON.
+
+    The Google endpoints are pointed at the mock server before the command
+    runs, which is why commands go through this instead of oauth-helper.py.
+    """
+    import kagenda_helper
+    google = spec.get('google')
+    if google:
+        kagenda_helper.GOOGLE_EVENTS_URL = google + "/calendar/v3/calendars/{calendar_id}/events"
+        kagenda_helper.GOOGLE_TASKS_URL = google + "/tasks/v1"
+        kagenda_helper.GOOGLE_TASKS_BATCH_URL = google + "/batch/tasks/v1"
+
+    stdout, sys.stdout = sys.stdout, CountingWriter()
+    status = 0
+    started = time.perf_counter()
+    try:
+        if spec.get('list_calendars'):
+            print(json.dumps(kagenda_helper.list_nextcloud_calendars(spec['list_calendars'], TOKEN)))
+        else:
+            sys.argv = ['oauth-helper.py'] + spec['argv']
+            kagenda_helper.main()
+    except SystemExit as e:
+        status = e.code or 0
+    elapsed = time.perf_counter() - started
+    output_bytes, sys.stdout = sys.stdout.bytes, stdout
+    print(json.dumps({'status': status, 'call_ms': elapsed * 1000, 'output_bytes': output_bytes,
+                      'rss_kb': peak_rss_kb()}))
+
+
+def peak_rss_kb():
+    """Peak RSS of this process in KB.
+
+    VmHWM is reset by exec, unlike ru_maxrss, which on Linux keeps the
+    peak of the benchmark process this one was forked from.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(spec, home, servers):
+    """Run a scenario in a fresh interpreter and return its measurements"""
+    trace_file = Path(home) / 'trace.jsonl'
+    trace_file.unlink(missing_ok=True)
+    env = dict(os.environ, HOME=home, KAGENDA_TRACE=str(trace_file))
+    env.pop('XDG_CACHE_HOME', None)
+    for server in servers:
+        server.reset_counters()
+
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, __file__, '--child', json.dumps(spec)], env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0 or not proc.stdout.strip():
+        raise RuntimeError(f"child failed: {proc.stderr.strip()[-500:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result['status']:
+        raise RuntimeError(f"command failed: {proc.stderr.strip()[-500:]}")
+
+    result['ms'] = wall * 1000
+    for server in servers:
+        for name, value in server.counters().items():
+            result[name] = result.get(name, 0) + value
+    if trace_file.exists():
+        trace = json.loads(trace_file.read_text().splitlines()[-1])
+        result['phases'] = {phase: round(value['ms'], 1) for phase, value in trace['phases'].items()}
+    return result
+
+
+def scenarios(size, caldav, google, time_min):
+    """(name, spec, change) of each scenario; change edits the data before the second run"""
+    changed = max(1, size // 100)
+
+    def calendars(*entries):
+        return json.dumps([{'provider': provider, 'server_url': caldav.url, 'calendar_id': calendar_id,
+                            'access_token': TOKEN} for provider, calendar_id in entries])
+
+    return [
+        ('fetch-events', {'argv': ['--fetch-events', caldav.url, 'bench/personal', TOKEN, time_min, TIME_MAX]},
+         lambda: caldav.change('personal', changed)),
+        ('fetch-events no-sync', {'argv': ['--fetch-events', caldav.url, 'bench/legacy', TOKEN, time_min, TIME_MAX]},
+         lambda: caldav.change('legacy', changed)),
+        ('fetch-google-events', {'argv': ['--fetch-google-events', 'primary', TOKEN, time_min, TIME_MAX],
+                                 'google': google.url},
+         lambda: google.change('primary', changed)),
+        ('fetch-calendars', {'argv': ['--fetch-calendars', calendars(('nextcloud', 'bench/work'), ('google', 'work')),
+                                      time_min, TIME_MAX], 'google': google.url},
+         lambda: (caldav.change('work', changed // 2 or 1), google.change('work', changed // 2 or 1))),
+        # Unchanged calendars without sync-collection: the PROPFIND of the home must be all
+        ('fetch-calendars no-sync', {'argv': ['--fetch-calendars', calendars(('nextcloud', 'bench/legacy'),
+                                                                             ('nextcloud', 'bench/archive')),
+                                              time_min, TIME_MAX], 'warm_requests': 1}, None),
+        ('fetch-tasks', {'argv': ['--fetch-tasks', TOKEN], 'google': google.url}, None),
+    ]
+
+
+def check(name, size, result, budgets, cold, max_requests=None):
+    """Return the reasons a run failed its budgets, if any"""
+    problems = []
+    if max_requests is not None and result['requests'] > max_requests:
+        problems.append(f"{result['requests']} requests instead of {max_requests}")
+    max_ms = budgets['base_ms'] + budgets['us_per_event'] * size / 1000
+    if result['ms'] > max_ms:
+        problems.append(f"over budget of {max_ms:.0f} ms")
+    max_rss = budgets['base_rss_mb'] * 1024 + budgets['kb_per_event'] * size
+    if result['rss_kb'] > max_rss:
+        problems.append(f"over budget of {max_rss / 1024:.0f} MB RSS")
+    if cold and name.endswith((' delta', ' warm')) and cold['bytes_sent'] > 0:
+        # An incremental refresh must not download the calendar again
+        max_bytes = cold['bytes_sent'] * budgets['delta_ratio'] + 16384
+        if result['bytes_sent'] > max_bytes:
+            problems.append(f"delta downloaded {result['bytes_sent']} of {cold['bytes_sent']} bytes")
+    return problems
+
+
+def regressions(result, baseline, tolerance):
+    """Return how a run got worse than its baseline by more than tolerance"""
+    problems = []
+    # Small absolute slack, so a 40 ms run does not fail on scheduler noise
+    for key, unit, slack in (('ms', 'ms', 50), ('rss_kb', 'KB RSS', 4096), ('bytes_sent', 'bytes', 1024),
+                             ('requests', 'requests', 0)):
+        if key in baseline and result.get(key, 0) > baseline[key] * (1 + tolerance) + slack:
+            problems.append(f"regressed from {baseline[key]:.0f} to {result[key]:.0f} {unit}")
+    return problems
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        run_child(json.loads(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='comma-separated events per calendar (up to 100000)')
+    parser.add_argument('--calendars', type=int, default=20, help='calendars listed by list-calendars')
+    parser.add_argument('--base-ms', type=float, default=1000, help='allowed latency of any run')
+    parser.add_argument('--max-us-per-event', type=float, default=600, help='allowed latency per event')
+    parser.add_argument('--base-rss-mb', type=float, default=80, help='allowed peak RSS of any run')
+    parser.add_argument('--max-kb-per-event', type=float, default=12, help='allowed peak RSS per event')
+    parser.add_argument('--max-delta-ratio', type=float, default=0.1,
+                        help='allowed bytes of a delta refresh, as a fraction of a cold one')
+    parser.add_argument('--baseline', help='fail on regressions against results saved with --save')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed regression against --baseline')
+    args = parser.parse_args()
+    budgets = {'base_ms': args.base_ms, 'us_per_event': args.max_us_per_event, 'base_rss_mb': args.base_rss_mb,
+               'kb_per_event': args.max_kb_per_event, 'delta_ratio': args.max_delta_ratio}
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+
+    results = {}
+    failed = False
+
+    def report(key, size, result, cold=None, max_requests=None):
+        nonlocal failed
+        results[key] = result
+        problems = check(key.split(' @ ')[0], size, result, budgets, cold, max_requests)
+        problems += regressions(result, baseline.get(key, {}), args.tolerance)
+        failed = failed or bool(problems)
+        phases = ', '.join(f"{phase} {ms:.0f}" for phase, ms in sorted(result.get('phases', {}).items()))
+        print(f"{key}: {result['ms']:.0f} ms ({phases or 'no trace'}), {result['rss_kb'] / 1024:.1f} MB RSS, "
+              f"{result['requests']} requests, {result['bytes_sent'] / 1024:.0f} KB down, "
+              f"{result['bytes_received'] / 1024:.0f} KB up, {result['output_bytes'] / 1024:.0f} KB out - "
+              f"{'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        caldav = MockCalDAVServer({'personal': size, 'legacy': size, 'archive': size // 2, 'work': size // 2},
+                                  no_sync=['legacy', 'archive']).start()
+        google = MockGoogleServer({'primary': size, 'work': size // 2}, tasks=size).start()
+        try:
+            for (name, spec, change), (_, later_spec, _) in zip(*(scenarios(size, caldav, google, time_min)
+                                                                  for time_min in TIME_MINS)):
+                with tempfile.TemporaryDirectory() as home:
+                    cold = run(spec, home, [caldav, google])
+                    report(f"{name} @ {size}", size, cold)
+                    if change:
+                        change()
+                    report(f"{name} {'delta' if change else 'warm'} @ {size}", size,
+                           run(later_spec, home, [caldav, google]), cold, spec.get('warm_requests'))
+        finally:
+            caldav.stop()
+            google.stop()
+
+    # Calendar discovery does not depend on the number of events
+    caldav = MockCalDAVServer({f"calendar-{i}": 1 for i in range(args.calendars)}).start()
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            report(f"list-calendars @ {args.calendars}", 0, run({'list_calendars': caldav.url}, home, [caldav]))
+    finally:
+        caldav.stop()
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
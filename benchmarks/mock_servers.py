@@ -0,0 +1,324 @@
+"""
+Local stand-ins for the servers the helper talks to, for the benchmarks
+
+MockCalDAVServer answers like Nextcloud: OCS user lookup, principal and
+calendar-home discovery, Depth: 1 PROPFIND of the calendar home, and
+sync-collection, calendar-query and calendar-multiget REPORTs.
+MockGoogleServer answers the Google Calendar events list (with sync
+tokens and paging) and the Tasks API. Both serve synthetic data, can
+change part of it between runs, and count requests and bytes on the wire.
+"""
+
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+from synthetic import ics_objects
+
+MULTISTATUS_START = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                     '<d:multistatus xmlns:d="DAV:" xmlns:cal="urn:ietf:params:xml:ns:caldav" '
+                     'xmlns:cs="http://calendarserver.org/ns/" xmlns:oc="http://owncloud.org/ns" '
+                     'xmlns:x1="http://apple.com/ns/ical/">')
+MULTISTATUS_END = '</d:multistatus>'
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Helper processes exit without closing their pooled connections
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockServer:
+    """Threaded loopback HTTP server that counts what goes over the wire"""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_any(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+                status, content_type, payload = mock.handle(self.command, self.path, self.headers, body)
+                if not isinstance(payload, bytes):
+                    payload = payload.encode('utf-8')
+                encoded = 'gzip' in self.headers.get('Accept-Encoding', '') and len(payload) > 1024
+                if encoded:
+                    payload = gzip.compress(payload, compresslevel=1)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                if encoded:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.end_headers()
+                self.wfile.write(payload)
+                with mock.lock:
+                    mock.requests += 1
+                    mock.bytes_received += len(body) + sum(len(k) + len(v) + 4 for k, v in self.headers.items())
+                    mock.bytes_sent += len(payload)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_PROPFIND = do_REPORT = handle_any
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = self.bytes_sent = self.bytes_received = 0
+
+    def counters(self):
+        with self.lock:
+            return {'requests': self.requests, 'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received}
+
+    def handle(self, method, path, headers, body):
+        raise NotImplementedError
+
+
+class MockCalDAVServer(MockServer):
+    """Nextcloud-like CalDAV server over synthetic calendars.
+
+    calendars maps a calendar name to its number of events. Calendars named
+    in no_sync answer sync-collection with 501, like servers without
+    RFC 6578 support, so the helper falls back to calendar-query.
+    """
+
+    def __init__(self, calendars, user='bench', no_sync=()):
+        super().__init__()
+        self.user = user
+        self.no_sync = set(no_sync)
+        self.home = f"/remote.php/dav/calendars/{user}/"
+        self.calendars = {}
+        for seed, (name, count) in enumerate(sorted(calendars.items()), 1):
+            objects = {}
+            for index, text in enumerate(ics_objects(count, seed=seed)):
+                objects[f"{self.home}{name}/event-{index}.ics"] = (f'"{seed}-{index}-0"', text)
+            # Changes by sync version: [(version, href)]
+            self.calendars[name] = {'objects': objects, 'version': 1, 'changes': []}
+        self.data_lock = threading.Lock()
+
+    def change(self, name, count, seed=0):
+        """Edit count events of a calendar, as another client would"""
+        rng = random.Random(seed)
+        with self.data_lock:
+            calendar = self.calendars[name]
+            calendar['version'] += 1
+            hrefs = sorted(calendar['objects'])
+            for href in rng.sample(hrefs, min(count, len(hrefs))):
+                etag, text = calendar['objects'][href]
+                calendar['objects'][href] = (etag[:-1] + 'x"', text.replace('SUMMARY:', 'SUMMARY:Moved '))
+                calendar['changes'].append((calendar['version'], href))
+
+    def sync_token(self, name):
+        return f"http://sabre.io/ns/sync/{self.calendars[name]['version']}"
+
+    def handle(self, method, path, headers, body):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(path).path)
+        if method == 'GET' and path == '/ocs/v2.php/cloud/user':
+            return 200, 'application/json', json.dumps({'ocs': {'data': {'id': self.user}}})
+        if method == 'PROPFIND':
+            return self.propfind(path, headers.get('Depth', '0'))
+        if method == 'REPORT':
+            name = path[len(self.home):].strip('/')
+            if not path.startswith(self.home) or name not in self.calendars:
+                return 404, 'text/plain', 'Not Found'
+            return self.report(name, body.decode('utf-8'))
+        return 404, 'text/plain', 'Not Found'
+
+    def propfind(self, path, depth):
+        principal = f"/remote.php/dav/principals/users/{self.user}/"
+        if path == '/remote.php/dav/':
+            props = f"<d:current-user-principal><d:href>{principal}</d:href></d:current-user-principal>"
+            return 207, 'application/xml', MULTISTATUS_START + response(path, props) + MULTISTATUS_END
+        if path == principal:
+            props = f"<cal:calendar-home-set><d:href>{self.home}</d:href></cal:calendar-home-set>"
+            return 207, 'application/xml', MULTISTATUS_START + response(path, props) + MULTISTATUS_END
+        if path != self.home:
+            return 404, 'text/plain', 'Not Found'
+
+        parts = [MULTISTATUS_START, response(self.home, '<d:resourcetype><d:collection/></d:resourcetype>')]
+        if depth == '1':
+            with self.data_lock:
+                for index, name in enumerate(sorted(self.calendars)):
+                    props = (f"<d:displayname>Calendar {escape(name)}</d:displayname>"
+                             "<d:resourcetype><d:collection/><cal:calendar/></d:resourcetype>"
+                             f"<cs:getctag>{self.sync_token(name)}</cs:getctag>"
+                             f"<d:sync-token>{self.sync_token(name)}</d:sync-token>"
+                             f"<x1:calendar-color>#{(index * 2654435761) % 0xffffff:06x}</x1:calendar-color>"
+                             '<cal:supported-calendar-component-set><cal:comp name="VEVENT"/>'
+                             '</cal:supported-calendar-component-set>')
+                    parts.append(response(f"{self.home}{name}/", props, missing='<oc:owner-displayname/>'))
+        parts.append(MULTISTATUS_END)
+        return 207, 'application/xml', ''.join(parts)
+
+    def report(self, name, body):
+        with self.data_lock:
+            calendar = self.calendars[name]
+            objects = calendar['objects']
+            if 'sync-collection' in body:
+                if name in self.no_sync:
+                    return 501, 'text/plain', 'Not Implemented'
+                token = re.search(r'<d:sync-token>([^<]*)</d:sync-token>', body).group(1)
+                if token:
+                    since = int(token.rsplit('/', 1)[1])
+                    hrefs = sorted({href for version, href in calendar['changes'] if version > since})
+                else:
+                    hrefs = sorted(objects)
+                parts = [object_response(href, *objects[href]) if href in objects
+                         else f"<d:response><d:href>{href}</d:href><d:status>HTTP/1.1 404 Not Found</d:status></d:response>"
+                         for href in hrefs]
+                parts.append(f"<d:sync-token>{self.sync_token(name)}</d:sync-token>")
+            elif 'calendar-multiget' in body:
+                hrefs = [urllib.parse.unquote(href) for href in re.findall(r'<d:href>([^<]*)</d:href>', body)]
+                parts = [object_response(href, *objects[href]) for href in hrefs if href in objects]
+            else:
+                # calendar-query: the time-range is not applied, the helper filters anyway
+                with_data = 'calendar-data' in body
+                parts = [object_response(href, etag, text if with_data else None)
+                         for href, (etag, text) in sorted(objects.items())]
+        return 207, 'application/xml', MULTISTATUS_START + ''.join(parts) + MULTISTATUS_END
+
+
+def response(href, props, missing=None):
+    """One <d:response> with found properties, and optionally missing ones"""
+    text = (f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>{props}</d:prop>"
+            "<d:status>HTTP/1.1 200 OK</d:status></d:propstat>")
+    if missing:
+        text += f"<d:propstat><d:prop>{missing}</d:prop><d:status>HTTP/1.1 404 Not Found</d:status></d:propstat>"
+    return text + "</d:response>"
+
+
+def object_response(href, etag, text):
+    props = f"<d:getetag>{escape(etag)}</d:getetag>"
+    if text is not None:
+        props += f"<cal:calendar-data>{escape(text)}</cal:calendar-data>"
+    return response(href, props)
+
+
+class MockGoogleServer(MockServer):
+    """Google Calendar events list and Tasks API over synthetic data.
+
+    calendars maps a calendar ID to its number of events; tasks is the
+    number of tasks, spread over task_lists lists.
+    """
+
+    def __init__(self, calendars, tasks=0, task_lists=4):
+        super().__init__()
+        self.calendars = {}
+        for seed, (calendar_id, count) in enumerate(sorted(calendars.items()), 1):
+            rng = random.Random(seed)
+            events = {}
+            for index in range(count):
+                event = google_event(index, rng)
+                events[event['id']] = event
+            self.calendars[calendar_id] = {'events': events, 'version': 1, 'changes': []}
+        self.task_lists = {f"list-{i}": [] for i in range(task_lists if tasks else 0)}
+        for index in range(tasks):
+            self.task_lists[f"list-{index % task_lists}"].append({
+                'id': f"task-{index}", 'title': f"Synthetic task {index}", 'notes': 'Notes ' * 5,
+                'status': 'completed' if index % 3 == 0 else 'needsAction', 'position': f"{index:020d}",
+                'updated': '2024-01-01T00:00:00.000Z'})
+        self.data_lock = threading.Lock()
+
+    def change(self, calendar_id, count, seed=0):
+        """Edit count events of a calendar"""
+        rng = random.Random(seed)
+        with self.data_lock:
+            calendar = self.calendars[calendar_id]
+            calendar['version'] += 1
+            for event_id in rng.sample(sorted(calendar['events']), min(count, len(calendar['events']))):
+                event = dict(calendar['events'][event_id], summary='Moved meeting')
+                event['etag'] = f'"{event_id}-{calendar["version"]}"'
+                calendar['events'][event_id] = event
+                calendar['changes'].append((calendar['version'], event_id))
+
+    def handle(self, method, path, headers, body):
+        parts = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        path = urllib.parse.unquote(parts.path)
+        match = re.fullmatch(r'/calendar/v3/calendars/([^/]+)/events', path)
+        if method == 'GET' and match and match.group(1) in self.calendars:
+            return self.events(match.group(1), query)
+        if method == 'GET' and path == '/tasks/v1/users/@me/lists':
+            items = [{'id': list_id, 'title': f"Tasks {list_id}", 'updated': '2024-01-01T00:00:00.000Z'}
+                     for list_id in self.task_lists]
+            return 200, 'application/json', json.dumps({'items': items})
+        match = re.fullmatch(r'/tasks/v1/lists/([^/]+)/tasks', path)
+        if method == 'GET' and match and match.group(1) in self.task_lists:
+            tasks = self.task_lists[match.group(1)]
+            if 'updatedMin' in query:
+                tasks = [task for task in tasks if task['updated'] >= query['updatedMin']]
+            return 200, 'application/json', json.dumps(page(tasks, query, 100))
+        return 404, 'application/json', json.dumps({'error': {'code': 404}})
+
+    def events(self, calendar_id, query):
+        with self.data_lock:
+            calendar = self.calendars[calendar_id]
+            if 'syncToken' in query:
+                since = int(query['syncToken'].split('-')[1])
+                ids = sorted({event_id for version, event_id in calendar['changes'] if version > since})
+            else:
+                ids = sorted(calendar['events'])
+            items = [calendar['events'][event_id] for event_id in ids]
+            data = page(items, query, int(query.get('maxResults', 250)))
+            if 'nextPageToken' not in data:
+                data['nextSyncToken'] = f"sync-{calendar['version']}"
+        return 200, 'application/json', json.dumps(data)
+
+
+def page(items, query, default_size):
+    """One page of items, with nextPageToken if more follow"""
+    size = int(query.get('maxResults', default_size))
+    start = int(query.get('pageToken', 0))
+    data = {'items': items[start:start + size]}
+    if start + size < len(items):
+        data['nextPageToken'] = str(start + size)
+    return data
+
+
+def google_event(index, rng):
+    """One Google Calendar event resource"""
+    start = datetime(2024, 1, 1) + timedelta(days=rng.randrange(365), hours=rng.randrange(7, 19),
+                                             minutes=rng.choice((0, 15, 30, 45)))
+    event = {'id': f"event{index:07d}", 'etag': f'"{index}-1"', 'status': 'confirmed',
+             'summary': f"Synthetic meeting {index}", 'location': f"Room {index % 40}",
+             'description': 'Agenda\n- item one\n- item two',
+             'iCalUID': f"synthetic-{index}@google.com"}
+    if index % 10 == 0:
+        event['start'] = {'date': f"{start:%Y-%m-%d}"}
+        event['end'] = {'date': f"{start + timedelta(days=1):%Y-%m-%d}"}
+    else:
+        end = start + timedelta(minutes=rng.choice((30, 45, 60, 90)))
+        event['start'] = {'dateTime': f"{start:%Y-%m-%dT%H:%M:%S}+01:00", 'timeZone': 'Europe/Berlin'}
+        event['end'] = {'dateTime': f"{end:%Y-%m-%dT%H:%M:%S}+01:00", 'timeZone': 'Europe/Berlin'}
+    if index % 25 == 0:
+        event['recurrence'] = ['RRULE:FREQ=WEEKLY;COUNT=10']
+    return event
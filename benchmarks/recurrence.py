@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Recurrence expansion benchmark for kagenda_helper.parse_ical_events
+
+Expands thousands of recurring series (started up to two years before the
+window, as in a long-lived calendar) into the widget's fetch window and
+fails if the cost per series exceeds the budget.
+
+Usage: python3 benchmarks/recurrence.py [--series N] [--days D] [--max-us-per-series US]
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import kagenda_helper
+from ical import best_of
+from synthetic import ics_objects
+
+RRULES = {
+    'daily': 'FREQ=DAILY',
+    'weekdays': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    'biweekly': 'FREQ=WEEKLY;INTERVAL=2;BYDAY=TU',
+    'last friday': 'FREQ=MONTHLY;BYDAY=-1FR',
+    'yearly': 'FREQ=YEARLY',
+    'counted daily': 'FREQ=DAILY;COUNT=1000',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--series', type=int, default=2000, help='recurring series per rule')
+    parser.add_argument('--days', type=int, default=30, help='length of the fetch window')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-us-per-series', type=float, default=2500)
+    args = parser.parse_args()
+
+    window_start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    window_end = window_start + timedelta(days=args.days)
+
+    failed = False
+    for name, rrule in RRULES.items():
+        texts = ics_objects(args.series, rrule=rrule)
+        elapsed, events = best_of(args.runs, lambda: [
+            e for t in texts for e in kagenda_helper.parse_ical_events(t, window_start, window_end)])
+        per_series = elapsed / args.series * 1e6
+        status = 'ok'
+        if per_series > args.max_us_per_series:
+            status = f"FAIL: over budget of {args.max_us_per_series:.0f} us/series"
+            failed = True
+        print(f"{name}: {args.series} series -> {len(events)} occurrences in {elapsed * 1000:.0f} ms "
+              f"({per_series:.1f} us/series) - {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
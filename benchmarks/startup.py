@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for oauth-helper.py
+
+Runs the quick subcommands under `python -X importtime` and fails if they
+import the Google client stack (or, for --find-port and --refresh-token,
+requests/http.server)
+or if their startup overhead over a bare interpreter exceeds the budget.
+
+Usage: python3 benchmarks/startup.py [--runs N] [--find-port-ms MS] [--refresh-token-ms MS]
+                                    [--fetch-events-ms MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HELPER = Path(__file__).resolve().parent.parent / "oauth-helper.py"
+
+# Modules that must never be imported by a scenario
+GOOGLE_MODULES = {'google', 'googleapiclient', 'google_auth_oauthlib'}
+SCENARIOS = {
+    'find-port': {
+        'args': ['--find-port'],
+        'forbidden': GOOGLE_MODULES | {'requests', 'http.server'},
+    },
+    'refresh-token': {
+        # No token is stored in the scratch HOME, so this only reads and fails
+        'args': ['--refresh-token', 'nextcloud'],
+        'forbidden': GOOGLE_MODULES | {'requests', 'http.server'},
+    },
+    'fetch-events': {
+        # requests has no adapter for ftp://, so the fetch fails right away
+        # instead of retrying the connection
+        'args': ['--fetch-events', 'ftp://127.0.0.1:9', 'user/personal', 'token',
+                 '2024-01-01T00:00:00Z', '2024-01-02T00:00:00Z'],
+        'forbidden': GOOGLE_MODULES | {'http.server'},
+    },
+}
+
+
+def run(argv, env):
+    """Run a command once and return (wall seconds, stderr)"""
+    start = time.perf_counter()
+    proc = subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return time.perf_counter() - start, proc.stderr
+
+
+def imported_modules(importtime_output):
+    """Return the set of modules listed in -X importtime output"""
+    modules = set()
+    for line in importtime_output.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            if name != 'imported package':
+                modules.add(name)
+    return modules
+
+
+def median_ms(argv, env, runs):
+    return statistics.median(run(argv, env)[0] for _ in range(runs)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--find-port-ms', type=float, default=40,
+                        help='allowed overhead of --find-port over a bare interpreter')
+    parser.add_argument('--refresh-token-ms', type=float, default=40,
+                        help='allowed overhead of --refresh-token when no refresh is needed')
+    parser.add_argument('--fetch-events-ms', type=float, default=150,
+                        help='allowed overhead of --fetch-events (includes importing requests)')
+    args = parser.parse_args()
+    budgets = {'find-port': args.find_port_ms, 'refresh-token': args.refresh_token_ms,
+               'fetch-events': args.fetch_events_ms}
+
+    failed = False
+    with tempfile.TemporaryDirectory() as home:
+        # Keep the helper away from the real ~/.config/kagenda, and let
+        # kagenda_helper.py get its bytecode cached as it does when installed
+        env = dict(os.environ, HOME=home)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        baseline = median_ms([sys.executable, '-c', 'pass'], env, args.runs)
+        print(f"baseline interpreter: {baseline:.1f} ms")
+
+        for name, scenario in SCENARIOS.items():
+            argv = [sys.executable, str(HELPER)] + scenario['args']
+            _, stderr = run([sys.executable, '-X', 'importtime', str(HELPER)] + scenario['args'], env)
+            modules = imported_modules(stderr)
+            bad = sorted(m for m in modules if m in scenario['forbidden']
+                         or m.split('.')[0] in scenario['forbidden'])
+            overhead = median_ms(argv, env, args.runs) - baseline
+
+            status = 'ok'
+            if bad:
+                status = f"FAIL: imports {', '.join(bad)}"
+                failed = True
+            elif overhead > budgets[name]:
+                status = f"FAIL: over budget of {budgets[name]:.0f} ms"
+                failed = True
+            print(f"{name}: +{overhead:.1f} ms, {len(modules)} modules - {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Synthetic calendar data for the benchmarks
+
+Generates deterministic iCalendar objects that exercise the parts of the
+helper that matter for performance: folded lines, TZID parameters, a
+non-IANA VTIMEZONE, all-day events and escaped text.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+VTIMEZONE = (
+    "BEGIN:VTIMEZONE\r\n"
+    "TZID:W. Europe Standard Time\r\n"
+    "BEGIN:STANDARD\r\n"
+    "DTSTART:16010101T030000\r\n"
+    "TZOFFSETFROM:+0200\r\n"
+    "TZOFFSETTO:+0100\r\n"
+    "RRULE:FREQ=YEARLY;BYDAY=-1SU;BYMONTH=10\r\n"
+    "END:STANDARD\r\n"
+    "BEGIN:DAYLIGHT\r\n"
+    "DTSTART:16010101T020000\r\n"
+    "TZOFFSETFROM:+0100\r\n"
+    "TZOFFSETTO:+0200\r\n"
+    "RRULE:FREQ=YEARLY;BYDAY=-1SU;BYMONTH=3\r\n"
+    "END:DAYLIGHT\r\n"
+    "END:VTIMEZONE\r\n"
+)
+
+TZIDS = ['Europe/Berlin', 'America/New_York', 'W. Europe Standard Time', None]
+
+
+def fold(line):
+    """Fold a content line at 75 characters as RFC 5545 clients do"""
+    parts = [line[:75]]
+    line = line[75:]
+    while line:
+        parts.append(' ' + line[:74])
+        line = line[74:]
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def vevent(index, rng, start_base, rrule=None):
+    """Return one VEVENT as text"""
+    start = start_base + timedelta(days=rng.randrange(365), hours=rng.randrange(7, 19),
+                                   minutes=rng.choice((0, 15, 30, 45)))
+    lines = ["BEGIN:VEVENT\r\n", f"UID:synthetic-{index}@kagenda\r\n", "DTSTAMP:20240101T000000Z\r\n"]
+    if index % 10 == 0:
+        lines.append(f"DTSTART;VALUE=DATE:{start:%Y%m%d}\r\n")
+        lines.append(f"DTEND;VALUE=DATE:{start + timedelta(days=1):%Y%m%d}\r\n")
+    else:
+        tzid = TZIDS[index % len(TZIDS)]
+        end = start + timedelta(minutes=rng.choice((30, 45, 60, 90)))
+        if tzid:
+            lines.append(f"DTSTART;TZID={tzid}:{start:%Y%m%dT%H%M%S}\r\n")
+            lines.append(f"DTEND;TZID={tzid}:{end:%Y%m%dT%H%M%S}\r\n")
+        else:
+            lines.append(f"DTSTART:{start:%Y%m%dT%H%M%S}Z\r\n")
+            lines.append(f"DTEND:{end:%Y%m%dT%H%M%S}Z\r\n")
+    if rrule:
+        lines.append(f"RRULE:{rrule}\r\n")
+    lines.append(fold(f"SUMMARY:Synthetic meeting {index}\\, planning and review of the quarterly roadmap"))
+    lines.append(f"LOCATION:Room {index % 40}\r\n")
+    lines.append(fold("DESCRIPTION:" + "Agenda\\n- item one\\n- item two\; with details " * 3))
+    lines.append("END:VEVENT\r\n")
+    return ''.join(lines)
+
+
+def calendar_object(events_text):
+    """Wrap VEVENT text into a VCALENDAR with the shared VTIMEZONE"""
+    return ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//KAgenda//Benchmark//EN\r\n"
+            + VTIMEZONE + events_text + "END:VCALENDAR\r\n")
+
+
+def ics_corpus(count, seed=1, rrule=None):
+    """Return one .ics text holding count events"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    return calendar_object(''.join(vevent(i, rng, base, rrule) for i in range(count)))
+
+
+def ics_objects(count, seed=1, rrule=None):
+    """Return count single-event .ics objects, as a CalDAV server stores them"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    return [calendar_object(vevent(i, rng, base, rrule)) for i in range(count)]
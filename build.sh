@@ -92,6 +92,7 @@ fi
 # Copy OAuth helper script
 echo "  Copying OAuth helper..."
 cp "$SCRIPT_DIR/oauth-helper.py" "$PLASMOID_DIR/" 2>/dev/null || true
+cp "$SCRIPT_DIR/kagenda_helper.py" "$PLASMOID_DIR/" 2>/dev/null || true
 chmod +x "$PLASMOID_DIR/oauth-helper.py" 2>/dev/null || true
 
 # Copy helper scripts if they exist
@@ -59,6 +59,7 @@ echo "Step 3: Copying required scripts..."
 if [ -f "$SCRIPT_DIR/oauth-helper.py" ]; then
     echo "  Copying OAuth helper..."
     cp "$SCRIPT_DIR/oauth-helper.py" "$PLASMOID_DIR/" 2>/dev/null || true
+    cp "$SCRIPT_DIR/kagenda_helper.py" "$PLASMOID_DIR/" 2>/dev/null || true
     chmod +x "$PLASMOID_DIR/oauth-helper.py" 2>/dev/null || true
 fi
 
@@ -117,7 +118,7 @@ echo "  - contents/config/*"
 if [ -f "$SCRIPT_DIR/build/kagendaplugin.so" ] || [ -f "$SCRIPT_DIR/build/kagendaplugin.so.1.0.0" ]; then
     echo "  - contents/code/kagendaplugin.so"
 fi
-echo "  - oauth-helper.py"
+echo "  - oauth-helper.py, kagenda_helper.py"
 echo ""
 echo "Next steps:"
 echo "1. Review the package structure"
@@ -24,6 +24,7 @@ cp "$SCRIPT_DIR/metadata.desktop" "$PLASMOID_DIR/" 2>/dev/null || true
 cp "$SCRIPT_DIR/ui"/*.qml "$PLASMOID_DIR/contents/ui/" 2>/dev/null || true
 cp "$SCRIPT_DIR/contents/config"/* "$PLASMOID_DIR/contents/config/" 2>/dev/null || true
 cp "$SCRIPT_DIR/oauth-helper.py" "$PLASMOID_DIR/" 2>/dev/null || true
+cp "$SCRIPT_DIR/kagenda_helper.py" "$PLASMOID_DIR/" 2>/dev/null || true
 
 # Make OAuth helper executable
 chmod +x "$PLASMOID_DIR/oauth-helper.py" 2>/dev/null || true
@@ -0,0 +1,4216 @@
+"""
+OAuth helper for Google Calendar and Nextcloud Calendar
+This runs separately from the widget to handle OAuth flow, see oauth-helper.py
+"""
+
+import contextvars
+import fcntl
+import gc
+import sys
+import json
+import os
+import time
+import urllib.parse
+import socket
+import re
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta, timezone, tzinfo
+from pathlib import Path
+import threading
+
+# The Google client stack and requests take hundreds of milliseconds to
+# import, so they are only loaded by the subcommands that need them (see
+# google_available() and requests_available()). None means "not tried yet".
+GOOGLE_AVAILABLE = None
+REQUESTS_AVAILABLE = None
+
+def google_available():
+    """Import the Google OAuth/API client libraries on first use"""
+    global GOOGLE_AVAILABLE, InstalledAppFlow, Credentials, Request, build
+    if GOOGLE_AVAILABLE is None:
+        try:
+            with trace_phase('import'):
+                from google_auth_oauthlib.flow import InstalledAppFlow
+                from google.oauth2.credentials import Credentials
+                from google.auth.transport.requests import Request
+                from googleapiclient.discovery import build
+            GOOGLE_AVAILABLE = True
+        except ImportError:
+            GOOGLE_AVAILABLE = False
+    return GOOGLE_AVAILABLE
+
+def requests_available():
+    """Import requests (used for Nextcloud) on first use"""
+    global REQUESTS_AVAILABLE, requests
+    if REQUESTS_AVAILABLE is None:
+        try:
+            with trace_phase('import'):
+                import requests
+            REQUESTS_AVAILABLE = True
+        except ImportError:
+            REQUESTS_AVAILABLE = False
+    return REQUESTS_AVAILABLE
+
+# Tokens granted before the Tasks scope was added need a new login (see authenticate_google)
+SCOPES = ['https://www.googleapis.com/auth/calendar.readonly', 'https://www.googleapis.com/auth/tasks']
+config_dir = Path.home() / ".config" / "kagenda"
+config_dir.mkdir(parents=True, exist_ok=True)
+token_file = config_dir / "token.json"
+credentials_file = config_dir / "credentials.json"
+config_file = config_dir / "config.json"
+nextcloud_token_file = config_dir / "nextcloud_token.json"
+nextcloud_credentials_file = config_dir / "nextcloud_credentials.json"
+helper_state_file = config_dir / "helper.json"
+cache_dir = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / ".cache") / "kagenda"
+caldav_cache_dir = cache_dir / "caldav"
+google_cache_dir = cache_dir / "google"
+google_tasks_queue_file = google_cache_dir / "tasks-queue.json"
+caldav_discovery_file = cache_dir / "discovery.json"
+events_snapshot_file = cache_dir / "events-snapshot.json"
+tasks_snapshot_file = cache_dir / "tasks-snapshot.json"
+
+# Network defaults for create_http_session(); KAGENDA_HTTP_TIMEOUT overrides the timeouts
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 60
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+
+# Access tokens are refreshed this long (seconds) before they expire. The
+# --serve scheduler looks at the stored token at least every
+# TOKEN_CHECK_INTERVAL, which also caps its wait after a failed refresh.
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_CHECK_INTERVAL = 900
+
+# Pooled HTTP sessions, one per host. In --serve mode they keep the
+# connections to the servers alive between refreshes.
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+class HelperError(Exception):
+    """Error raised by helper operations, reported to the caller as a message"""
+
+
+# KAGENDA_LOG_LEVEL ("debug", "warning" or "error", default "warning")
+# selects which DEBUG:/WARNING: lines reach stderr; ERROR: lines always do
+LOG_DEBUG = 10
+LOG_WARNING = 30
+LOG_LEVEL = {'debug': LOG_DEBUG, 'error': 40}.get(os.environ.get('KAGENDA_LOG_LEVEL', '').lower(), LOG_WARNING)
+
+def log_debug(message, *args):
+    """Write a DEBUG: line if debug logging is on.
+
+    args are %-formatted into message only then, so a disabled debug line
+    costs a function call.
+    """
+    if LOG_LEVEL <= LOG_DEBUG:
+        sys.stderr.write("DEBUG: " + (message % args if args else message) + "\n")
+
+def log_warning(message, *args):
+    """Write a WARNING: line unless KAGENDA_LOG_LEVEL=error"""
+    if LOG_LEVEL <= LOG_WARNING:
+        sys.stderr.write("WARNING: " + (message % args if args else message) + "\n")
+
+
+# Tracing (KAGENDA_TRACE or --profile) records how long each phase of a
+# command or helper method call takes: "import", "token", "connect" (DNS,
+# TCP and TLS of new connections), "request" (until the response headers),
+# "sync", "parse" and "serialize", plus counters such as received bytes.
+# KAGENDA_TRACE is "1" (or "stderr") for TRACE: lines on stderr, or a file
+# to append one JSON record per line to, as --serve has no stderr.
+TRACE_TARGET = os.environ.get('KAGENDA_TRACE', '')
+_current_trace = contextvars.ContextVar('kagenda_trace', default=None)
+_connections_traced = False
+
+
+class Trace:
+    """Phase timings and counters of one command or helper method call"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+        self.responses = []
+        self.lock = threading.Lock()
+    
+    def add(self, phase, seconds):
+        with self.lock:
+            total, count = self.phases.get(phase, (0.0, 0))
+            self.phases[phase] = (total + seconds, count + 1)
+    
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def to_dict(self):
+        counters = dict(self.counters)
+        if self.responses:
+            # Bytes read off the wire, before decompression
+            counters['bytes_received'] = sum(response.raw.tell() for response in self.responses
+                                             if hasattr(response.raw, 'tell'))
+            counters['requests'] = len(self.responses)
+        return {
+            'name': self.name,
+            'pid': os.getpid(),
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'phases': {phase: {'ms': round(total * 1000, 2), 'count': count}
+                       for phase, (total, count) in self.phases.items()},
+            'counters': counters,
+        }
+
+
+def start_trace(name):
+    """Start tracing the current call if tracing is on; returns the Trace or None"""
+    if not TRACE_TARGET:
+        return None
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+def finish_trace(trace):
+    """Write a trace record started with start_trace()"""
+    if trace is None:
+        return
+    _current_trace.set(None)
+    line = json.dumps(trace.to_dict(), separators=(',', ':'))
+    if TRACE_TARGET in ('1', 'stderr'):
+        sys.stderr.write(f"TRACE: {line}\n")
+        return
+    try:
+        with open(TRACE_TARGET, 'a') as f:
+            f.write(line + "\n")
+    except OSError as e:
+        log_warning("Could not write trace to %s: %s", TRACE_TARGET, e)
+
+@contextmanager
+def trace_phase(phase):
+    """Add the time spent in the with block to a phase of the current trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(phase, time.perf_counter() - started)
+
+def trace_count(name, amount=1):
+    """Add to a counter of the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, amount)
+
+def trace_response(response, *args, **kwargs):
+    """requests response hook: time to the response headers and bytes received"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add('request', response.elapsed.total_seconds())
+        with trace.lock:
+            trace.responses.append(response)
+
+def trace_connections():
+    """Time new HTTP connections (DNS, TCP and TLS) as the "connect" phase"""
+    global _connections_traced
+    if _connections_traced:
+        return
+    _connections_traced = True
+    import urllib3.connection
+    for cls in (urllib3.connection.HTTPConnection, urllib3.connection.HTTPSConnection):
+        if 'connect' not in cls.__dict__:
+            continue
+        def connect(self, _connect=cls.__dict__['connect']):
+            with trace_phase('connect'):
+                return _connect(self)
+        cls.connect = connect
+
+def dump_json(data):
+    """Serialize a result for the widget (compact), traced as "serialize" """
+    with trace_phase('serialize'):
+        text = json.dumps(data, indent=None, separators=(',', ':'))
+    trace_count('bytes_sent', len(text))
+    return text
+
+
+def get_http_session(url=None):
+    """Return the pooled requests.Session for the host of url, creating it on first use.
+
+    Each host gets its own session and connection pool, so concurrent
+    fetches from different servers do not compete for connections.
+    """
+    if not requests_available():
+        raise HelperError("requests library not available. Install: pip3 install requests")
+    parts = urllib.parse.urlsplit(url or '')
+    key = (parts.scheme, parts.netloc)
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = _http_sessions[key] = create_http_session()
+    return session
+
+def http_timeout():
+    """(connect, read) timeout in seconds, from KAGENDA_HTTP_TIMEOUT ("read" or "connect,read")"""
+    value = os.environ.get('KAGENDA_HTTP_TIMEOUT', '')
+    try:
+        parts = [float(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        parts = []
+    if len(parts) == 1:
+        return (min(HTTP_CONNECT_TIMEOUT, parts[0]), parts[0])
+    if len(parts) >= 2:
+        return (parts[0], parts[1])
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+def create_http_session():
+    """Create a requests.Session with keep-alive, compression, timeouts and retries.
+
+    Requests without an explicit timeout get http_timeout(), and responses
+    with 429 Too Many Requests or 503 Service Unavailable are retried with
+    exponential backoff, honouring Retry-After.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    default_timeout = http_timeout()
+    
+    class TimeoutHTTPAdapter(HTTPAdapter):
+        def send(self, request, timeout=None, **kwargs):
+            return super().send(request, timeout=timeout or default_timeout, **kwargs)
+    
+    # Reads are not retried (read=False): a REPORT may already have been half consumed
+    retry_options = dict(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=False, status=HTTP_RETRIES,
+                         backoff_factor=HTTP_BACKOFF, status_forcelist=(429, 503),
+                         respect_retry_after_header=True, raise_on_status=False)
+    try:
+        # Retry every method: CalDAV uses REPORT and PROPFIND
+        retry = Retry(allowed_methods=None, **retry_options)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = Retry(method_whitelist=None, **retry_options)
+    
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'KAgenda'})
+    session.hooks['response'].append(trace_response)
+    if TRACE_TARGET:
+        trace_connections()
+    return session
+
+
+def write_json_file(path, data, sync=True, **dump_options):
+    """Write JSON to path atomically, through a temporary file and a rename.
+
+    Readers (including the widget's `cat`) see either the old or the new
+    contents, never a partial write. The file is created with mode 0600 as
+    it may hold tokens. With sync set the data is flushed to disk before
+    the rename, so a crash cannot leave an empty file behind either.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, **dump_options)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+@contextmanager
+def locked_file(path):
+    """Hold an exclusive advisory lock on path for a read-modify-write.
+
+    The lock is taken on a separate "<name>.lock" file, since path itself is
+    replaced on every write. It serializes writers across threads and helper
+    processes; readers need no lock because writes are atomic.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path.with_name(path.name + '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+def read_config():
+    """Return the contents of config.json, or {} if it is missing or unreadable"""
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def update_config(values):
+    """Merge values into config.json (read by the widget) and write it back.
+
+    Every write increments "version" and sets "updated_at" (epoch seconds),
+    so the widget can tell whether it has already seen the contents.
+    """
+    with locked_file(config_file):
+        config = read_config()
+        config.update(values)
+        config['version'] = config.get('version', 0) + 1
+        config['updated_at'] = time.time()
+        write_json_file(config_file, config)
+    return config
+
+
+def mask_secrets(text):
+    """Mask tokens and client secrets that might appear in a server response"""
+    text = re.sub(r'["\']?access_token["\']?\s*[:=]\s*["\']?[^"\'\s]+["\']?', 'access_token=***masked***', text, flags=re.IGNORECASE)
+    text = re.sub(r'["\']?refresh_token["\']?\s*[:=]\s*["\']?[^"\'\s]+["\']?', 'refresh_token=***masked***', text, flags=re.IGNORECASE)
+    text = re.sub(r'["\']?client_secret["\']?\s*[:=]\s*["\']?[^"\'\s]+["\']?', 'client_secret=***masked***', text, flags=re.IGNORECASE)
+    return text
+
+def create_callback_server(port):
+    """Create the local server that receives the OAuth redirect.
+
+    http.server pulls in http.client, email and ssl, so it is only imported
+    by the subcommands that actually run a server.
+    """
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    
+    class OAuthCallbackHandler(BaseHTTPRequestHandler):
+        """HTTP handler for OAuth callback.
+
+        The result is stored on the handler's own server, so concurrent
+        logins on different ports do not mix up their codes, and setting
+        server.done wakes wait_for_callback() immediately.
+        """
+    
+        def do_GET(self):
+            query = urllib.parse.urlparse(self.path).query
+            params = urllib.parse.parse_qs(query)
+        
+            if 'code' in params:
+                self.send_response(200)
+                self.send_header('Content-type', 'text/html')
+                self.end_headers()
+                self.wfile.write(b'<html><body><h1>Authentication successful!</h1><p>You can close this window.</p></body></html>')
+                self.server.auth_code = params['code'][0]
+                self.server.done.set()
+            elif 'error' in params:
+                self.send_response(400)
+                self.send_header('Content-type', 'text/html')
+                self.end_headers()
+                self.wfile.write(f'<html><body><h1>Authentication failed</h1><p>{params["error"][0]}</p></body></html>'.encode())
+                self.server.auth_error = params['error'][0]
+                self.server.done.set()
+            else:
+                self.send_response(400)
+                self.send_header('Content-type', 'text/html')
+                self.end_headers()
+                self.wfile.write(b'<html><body><h1>Invalid request</h1></body></html>')
+    
+        def log_message(self, format, *args):
+            pass  # Suppress logging
+    
+    class ReusableHTTPServer(HTTPServer):
+        """HTTPServer subclass that allows quick reuse of the same address/port.
+    
+        This avoids 'address already in use' errors when the helper is run
+        multiple times in quick succession (common when re-authenticating).
+        """
+        allow_reuse_address = True
+    
+    server = ReusableHTTPServer(('localhost', port), OAuthCallbackHandler)
+    server.auth_code = None
+    server.auth_error = None
+    server.done = threading.Event()
+    return server
+
+def open_callback_server(preferred_port=8080, max_offset=20):
+    """Start a callback server on the first free port from preferred_port.
+
+    Binding right away, instead of probing with find_free_port() and binding
+    later, lets several logins run at once without racing for the same port.
+    Returns None if every port in the range is taken.
+    """
+    for offset in range(max_offset):
+        try:
+            return create_callback_server(preferred_port + offset)
+        except OSError:
+            continue
+    return None
+
+# Callback servers waiting in wait_for_callback(), see cancel_oauth_callbacks()
+_callback_servers = set()
+_callback_servers_lock = threading.Lock()
+
+def cancel_oauth_callbacks():
+    """Make every pending wait_for_callback() give up and return None"""
+    with _callback_servers_lock:
+        servers = list(_callback_servers)
+    for server in servers:
+        server.done.set()
+
+def wait_for_callback(server, timeout=300):
+    """Serve the OAuth redirect and return the authorization code.
+
+    The server runs on its own thread while the caller sleeps on its done
+    event, so the code is returned the moment the browser is redirected.
+    Returns None on timeout, on cancel_oauth_callbacks() or if the provider
+    reported an error (left in server.auth_error). The server is shut down
+    on a background thread, so closing it does not delay the token exchange.
+    """
+    def serve():
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    
+    with _callback_servers_lock:
+        _callback_servers.add(server)
+    threading.Thread(target=serve, daemon=True).start()
+    try:
+        server.done.wait(timeout)
+    finally:
+        with _callback_servers_lock:
+            _callback_servers.discard(server)
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    return server.auth_code
+
+
+def find_free_port(preferred_port: int = 8080, max_offset: int = 20) -> int | None:
+    """Find a free TCP port on localhost, starting from preferred_port.
+    
+    Tries preferred_port, preferred_port+1, ... up to max_offset range.
+    Returns the first free port number, or None if none found.
+    """
+    for offset in range(max_offset):
+        port = preferred_port + offset
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                s.bind(("localhost", port))
+            except OSError:
+                continue
+        return port
+    return None
+
+def authenticate_google(client_id=None, client_secret=None, port=None):
+    """Run Google OAuth flow and save token"""
+    if not google_available():
+        sys.stderr.write("ERROR: Google OAuth libraries not available. Install: sudo apt install python3-google-auth-oauthlib python3-google-api-python-client\n")
+        sys.exit(1)
+    
+    creds = None
+    
+    if token_file.exists():
+        try:
+            creds = Credentials.from_authorized_user_file(str(token_file), SCOPES)
+            # A token lacking a scope cannot be refreshed into one that has
+            # it, so log in again to ask for the missing consent
+            with open(token_file, 'r') as f:
+                if not set(SCOPES) <= set(json.load(f).get('scopes') or ()):
+                    creds = None
+        except:
+            pass
+    
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+            except Exception as e:
+                if token_file.exists():
+                    token_file.unlink()
+                creds = None
+        
+        if not creds or not creds.valid:
+            # Use provided credentials or try to read from file
+            if client_id and client_secret:
+                # Create credentials dict from provided values
+                client_config = {
+                    "installed": {
+                        "client_id": client_id,
+                        "client_secret": client_secret,
+                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                        "token_uri": "https://oauth2.googleapis.com/token",
+                        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+                        "redirect_uris": ["http://localhost"]
+                    }
+                }
+                log_debug("Using provided Google OAuth credentials")
+            else:
+                # Fallback to credentials file
+                if not credentials_file.exists():
+                    sys.stderr.write(f"ERROR: Either provide client_id and client_secret as arguments, or place credentials.json in {credentials_file}\n")
+                    sys.exit(1)
+                
+                try:
+                    with open(credentials_file, 'r') as f:
+                        client_config = json.load(f)
+                        if 'installed' not in client_config:
+                            sys.stderr.write(f"ERROR: credentials.json must have 'installed' key. Current keys: {list(client_config.keys())}\n")
+                            sys.exit(1)
+                except json.JSONDecodeError as e:
+                    sys.stderr.write(f"ERROR: credentials.json is not valid JSON: {e}\n")
+                    sys.exit(1)
+                except Exception as e:
+                    sys.stderr.write(f"ERROR: Cannot read credentials.json: {e}\n")
+                    sys.exit(1)
+            
+            # Create a temporary credentials file if using provided credentials
+            temp_creds_file = None
+            if client_id and client_secret:
+                import tempfile
+                temp_creds_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
+                json.dump(client_config, temp_creds_file)
+                temp_creds_file.close()
+                credentials_path = temp_creds_file.name
+            else:
+                credentials_path = str(credentials_file)
+            
+            try:
+                flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
+                
+                # Use provided port or find a free one
+                if port:
+                    oauth_port = port
+                else:
+                    oauth_port = find_free_port(8080, 20)
+                    if oauth_port is None:
+                        sys.stderr.write(
+                            "ERROR: Could not find a free local port for OAuth callback "
+                            "(tried ports 8080-8099 on localhost).\n"
+                        )
+                        if temp_creds_file:
+                            os.unlink(temp_creds_file.name)
+                        sys.exit(1)
+                
+                # Use the found port and report it
+                redirect_uri = f"http://localhost:{oauth_port}/"
+                sys.stderr.write(f"Using redirect URI: {redirect_uri}\n")
+                sys.stderr.write("Make sure this URI is registered in your Google OAuth app settings.\n")
+                
+                creds = flow.run_local_server(port=oauth_port, open_browser=True)
+                
+                # Clean up temporary file if created
+                if temp_creds_file:
+                    os.unlink(temp_creds_file.name)
+            except Exception as e:
+                if temp_creds_file:
+                    try:
+                        os.unlink(temp_creds_file.name)
+                    except:
+                        pass
+                error_msg = str(e)
+                if "access_denied" in error_msg or "blocked" in error_msg.lower():
+                    sys.stderr.write(f"ERROR: Authorization blocked. Possible causes:\n")
+                    sys.stderr.write(f"  1. OAuth client is deleted or disabled in Google Cloud Console\n")
+                    sys.stderr.write(f"  2. Google Calendar API is not enabled for this project\n")
+                    sys.stderr.write(f"  3. Your Google account is not authorized for this OAuth client\n")
+                    sys.stderr.write(f"  4. Redirect URI mismatch - ensure 'http://localhost' is authorized\n")
+                    sys.stderr.write(f"  5. OAuth client is in testing mode and your account is not a test user\n")
+                    sys.stderr.write(f"\nPlease check your Google Cloud Console settings.\n")
+                else:
+                    sys.stderr.write(f"ERROR: Authentication failed: {error_msg}\n")
+                sys.exit(1)
+        
+        write_json_file(token_file, json.loads(creds.to_json()))
+    
+    # Save access token to config for QML to use
+    forget_snapshots()
+    update_config({'provider': 'google', 'access_token': creds.token})
+
+    # Fetch calendar list
+    try:
+        calendar_list = list_google_calendars(creds)
+        print(dump_json(calendar_list))
+    except Exception as e:
+        sys.stderr.write(f"ERROR: Failed to fetch calendar list: {e}\n")
+        sys.exit(1)
+
+def load_google_credentials():
+    """Load stored Google credentials, refreshing and saving them if expired.
+
+    Raises HelperError when no usable token is stored, in which case the
+    interactive authenticate_google() flow has to be run again.
+    """
+    if not google_available():
+        raise HelperError("Google OAuth libraries not available")
+    if not token_file.exists():
+        raise HelperError("No Google token stored, please authenticate")
+
+    with trace_phase('token'), locked_file(token_file):
+        # The scopes saved with the token: refreshing an older token with
+        # SCOPES would ask for the Tasks scope it was never granted
+        creds = Credentials.from_authorized_user_file(str(token_file))
+        if not creds.valid:
+            if not (creds.expired and creds.refresh_token):
+                raise HelperError("Google token is invalid, please authenticate")
+            creds.refresh(Request())
+            write_json_file(token_file, json.loads(creds.to_json()))
+            update_config({'provider': 'google', 'access_token': creds.token})
+    return creds
+
+# Calendar API client, built once per credentials object. Building the
+# discovery client is expensive, so --serve mode keeps it around.
+_google_service = None
+_google_service_creds = None
+
+def list_google_calendars(creds):
+    """Return the Google calendar list for the given credentials"""
+    global _google_service, _google_service_creds
+    if _google_service is None or _google_service_creds is not creds:
+        _google_service = build('calendar', 'v3', credentials=creds)
+        _google_service_creds = creds
+    return _google_service.calendarList().list().execute()
+
+def refresh_nextcloud_token(token_endpoint, client_id, client_secret, refresh_token):
+    """Exchange a Nextcloud refresh token for a new access token.
+
+    Saves and returns the new token data, or returns None if the refresh
+    failed and the user has to authenticate again. The caller holds
+    locked_file(nextcloud_token_file), as the server rotates refresh tokens.
+    """
+    data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': client_id,
+        'client_secret': client_secret
+    }
+    try:
+        response = get_http_session(token_endpoint).post(token_endpoint, data=data)
+    except Exception as e:
+        # Refresh failed, need to re-authenticate
+        log_debug("Token refresh exception: %s", str(e))
+        return None
+    
+    if response.status_code != 200:
+        # Mask any potential secrets in error response
+        error_text = mask_secrets(response.text if hasattr(response, 'text') else str(response))
+        log_debug("Token refresh failed (status %s): %s", response.status_code, error_text[:200])
+        return None
+    
+    token_data = response.json()
+    # Servers may omit the refresh token when it is not rotated
+    token_data.setdefault('refresh_token', refresh_token)
+    token_data['expires_at'] = int(time.time()) + token_data.get('expires_in', 3600)
+    # Keep what the next refresh needs next to the token
+    token_data.update(token_endpoint=token_endpoint, client_id=client_id, client_secret=client_secret)
+    write_json_file(nextcloud_token_file, token_data)
+    return token_data
+
+def load_stored_token(provider):
+    """Return (token data, access token, expires_at) of the stored token.
+
+    Reads token.json or nextcloud_token.json directly, so checking a token
+    does not import the Google client libraries. expires_at is in epoch
+    seconds, or None if unknown. Raises HelperError if no token is stored.
+    """
+    name = 'Google' if provider == 'google' else 'Nextcloud'
+    path = token_file if provider == 'google' else nextcloud_token_file
+    try:
+        with open(path, 'r') as f:
+            token_data = json.load(f)
+    except FileNotFoundError:
+        raise HelperError(f"No {name} token stored, please authenticate")
+    except (OSError, ValueError) as e:
+        raise HelperError(f"Cannot read stored {name} token: {e}")
+    
+    if provider == 'google':
+        expiry = token_data.get('expiry')
+        expires_at = int(parse_iso_datetime(expiry).timestamp()) if expiry else None
+        return token_data, token_data.get('token'), expires_at
+    return token_data, token_data.get('access_token'), token_data.get('expires_at')
+
+def refresh_google_token(token_data):
+    """Exchange the refresh token from token.json for a new access token.
+
+    Talks to the token endpoint directly rather than through google-auth, so
+    a refresh costs one request instead of importing the client stack. The
+    new token is saved in the format Credentials.from_authorized_user_file()
+    reads.
+    """
+    if not requests_available():
+        raise HelperError("requests library not available. Install: pip3 install requests")
+    if not (token_data.get('refresh_token') and token_data.get('client_id')):
+        raise HelperError("Google token cannot be refreshed, please authenticate")
+    
+    token_uri = token_data.get('token_uri') or 'https://oauth2.googleapis.com/token'
+    response = get_http_session(token_uri).post(token_uri, data={
+        'grant_type': 'refresh_token',
+        'refresh_token': token_data['refresh_token'],
+        'client_id': token_data['client_id'],
+        'client_secret': token_data.get('client_secret', '')
+    })
+    if response.status_code != 200:
+        error_text = mask_secrets(response.text)
+        raise HelperError(f"Google token refresh failed (status {response.status_code}): {error_text[:200]}")
+    
+    payload = response.json()
+    token_data['token'] = payload['access_token']
+    if payload.get('refresh_token'):
+        token_data['refresh_token'] = payload['refresh_token']
+    expiry = datetime.now(timezone.utc) + timedelta(seconds=payload.get('expires_in', 3600))
+    token_data['expiry'] = expiry.strftime('%Y-%m-%dT%H:%M:%SZ')
+    write_json_file(token_file, token_data)
+    return token_data
+
+def authenticate_nextcloud(server_url, client_id, client_secret, auth_endpoint=None, token_endpoint=None, port=None):
+    """Run Nextcloud OAuth flow and save token"""
+    if not requests_available():
+        sys.stderr.write("ERROR: requests library not available. Install: pip3 install requests\n")
+        sys.exit(1)
+    
+    # Debug: Log all input parameters
+    log_debug("===== Nextcloud Authentication Parameters =====")
+    log_debug("Input server_url parameter: %s", server_url)
+    log_debug("Input auth_endpoint parameter: %s", auth_endpoint)
+    log_debug("Input token_endpoint parameter: %s", token_endpoint)
+    log_debug("Input client_id: %s (masked)", client_id[:8] + '***' if client_id and len(client_id) > 8 else '***')
+    log_debug("Input client_secret: ***masked***")
+    log_debug("Input port: %s", port)
+    
+    # Extract base URL - prefer token_endpoint over auth_endpoint to avoid localhost confusion
+    # This ensures we use the actual Nextcloud server URL from the user's input
+    original_server_url = server_url
+    if token_endpoint:
+        parsed_token = urllib.parse.urlparse(token_endpoint)
+        base_url = f"{parsed_token.scheme}://{parsed_token.netloc}"
+        log_debug("Parsed token_endpoint - scheme: %s, netloc: %s", parsed_token.scheme, parsed_token.netloc)
+        # Only use if it's not localhost (which would be the redirect URI)
+        if 'localhost' not in base_url and '127.0.0.1' not in base_url:
+            server_url = base_url.rstrip('/')
+            log_debug("✓ Using base URL from token_endpoint: %s", server_url)
+        else:
+            log_debug("✗ token_endpoint contains localhost, trying auth_endpoint...")
+            # Token endpoint is localhost, try auth_endpoint instead
+            if auth_endpoint:
+                parsed_auth = urllib.parse.urlparse(auth_endpoint)
+                base_url = f"{parsed_auth.scheme}://{parsed_auth.netloc}"
+                log_debug("Parsed auth_endpoint - scheme: %s, netloc: %s", parsed_auth.scheme, parsed_auth.netloc)
+                if 'localhost' not in base_url and '127.0.0.1' not in base_url:
+                    server_url = base_url.rstrip('/')
+                    log_debug("✓ Using base URL from auth_endpoint: %s", server_url)
+                else:
+                    log_debug("✗ auth_endpoint also contains localhost")
+                    log_warning("Both endpoints contain localhost. Falling back to provided server_url parameter: %s", original_server_url)
+                    server_url = original_server_url.rstrip('/') if original_server_url else ""
+            else:
+                log_debug("No auth_endpoint provided, using server_url parameter: %s", original_server_url)
+                server_url = original_server_url.rstrip('/') if original_server_url else ""
+    elif auth_endpoint:
+        parsed_auth = urllib.parse.urlparse(auth_endpoint)
+        base_url = f"{parsed_auth.scheme}://{parsed_auth.netloc}"
+        log_debug("Parsed auth_endpoint - scheme: %s, netloc: %s", parsed_auth.scheme, parsed_auth.netloc)
+        server_url = base_url.rstrip('/')
+        log_debug("✓ Using base URL from auth_endpoint: %s", server_url)
+    else:
+        # Normalize server URL
+        server_url = server_url.rstrip('/') if server_url else ""
+        log_debug("No endpoints provided, using server_url parameter: %s", server_url)
+        auth_endpoint = f"{server_url}/index.php/apps/oauth2/authorize"
+    
+    log_debug("Final server_url: %s", server_url)
+    
+    # Set default endpoints if not provided
+    if not auth_endpoint:
+        auth_endpoint = f"{server_url}/index.php/apps/oauth2/authorize"
+    if not token_endpoint:
+        token_endpoint = f"{server_url}/index.php/apps/oauth2/api/v1/token"
+    
+    log_debug("Final auth_endpoint: %s", auth_endpoint)
+    log_debug("Final token_endpoint: %s", token_endpoint)
+    log_debug("============================================")
+    
+    # Use provided token endpoint or default
+    if not token_endpoint:
+        token_endpoint = f"{server_url}/index.php/apps/oauth2/api/v1/token"
+    
+    # Check if token needs refresh
+    access_token = None
+    refresh_token = None
+    
+    # Locked like helper_refresh_token(), so the helper cannot spend the
+    # same refresh token concurrently
+    with locked_file(nextcloud_token_file):
+        # Load existing token if available
+        token_data = None
+        if nextcloud_token_file.exists():
+            try:
+                with open(nextcloud_token_file, 'r') as f:
+                    token_data = json.load(f)
+            except:
+                pass
+        
+        if token_data:
+            access_token = token_data.get('access_token')
+            refresh_token = token_data.get('refresh_token')
+            expires_at = token_data.get('expires_at', 0)
+            
+            # Try to refresh if expired
+            if expires_at and expires_at < int(time.time()) and refresh_token:
+                token_data = refresh_nextcloud_token(token_endpoint, client_id, client_secret, refresh_token)
+                if token_data:
+                    access_token = token_data['access_token']
+                    refresh_token = token_data.get('refresh_token')
+                else:
+                    access_token = None
+    
+    # If no valid token, start OAuth flow
+    if not access_token:
+        # Use provided auth endpoint (Nextcloud instance URL, may contain query params)
+        auth_url = auth_endpoint
+
+        # Use provided port, or dynamically find a free local port for the callback server.
+        # This avoids collisions when multiple helpers or other services
+        # are using common ports.
+        # The callback server is bound here, so the port cannot be taken by
+        # another login between choosing it and listening on it.
+        if port is not None:
+            try:
+                port = int(port)
+                server = create_callback_server(port)
+            except (ValueError, OSError) as e:
+                sys.stderr.write(
+                    f"ERROR: Provided port {port} is not available: {e}\n"
+                )
+                sys.stderr.write(
+                    "Hint: Another KAgenda OAuth helper may still be running, or this port is blocked.\n"
+                )
+                sys.exit(1)
+        else:
+            server = open_callback_server(8080, 20)
+            if server is None:
+                sys.stderr.write(
+                    "ERROR: Could not find a free local port for OAuth callback "
+                    "(tried ports 8080-8099 on localhost).\n"
+                )
+                sys.exit(1)
+            port = server.server_address[1]
+
+        redirect_uri = f"http://localhost:{port}/oauth-callback"
+        
+        params = {
+            'response_type': 'code',
+            'client_id': client_id,
+            'redirect_uri': redirect_uri,
+            'scope': 'calendars'
+        }
+        
+        # Parse the auth endpoint URL
+        parsed_auth = urllib.parse.urlparse(auth_url)
+        
+        # Get base URL without query string
+        auth_url_base = urllib.parse.urlunparse(
+            (
+                parsed_auth.scheme,
+                parsed_auth.netloc,
+                parsed_auth.path,
+                parsed_auth.params,
+                "",  # query will be set separately
+                parsed_auth.fragment,
+            )
+        )
+        
+        # Merge existing query params (if any) with our required params
+        # Our params always take precedence to ensure redirect_uri is set
+        existing_query = urllib.parse.parse_qs(parsed_auth.query)
+        merged = {}
+        
+        # First, add existing params (but skip redirect_uri if it exists, we'll override it)
+        for k, v in existing_query.items():
+            if k != 'redirect_uri':  # Always use our redirect_uri
+                merged[k] = v[0] if isinstance(v, list) and len(v) > 0 else v
+        
+        # Then add our required params (this ensures redirect_uri is always set)
+        merged.update(params)
+        
+        # Build query string
+        query_string = urllib.parse.urlencode(merged)
+        auth_url_with_params = f"{auth_url_base}?{query_string}"
+        
+        # Debug: print the final URL to stderr so user can verify
+        log_debug("Final authorization URL: %s", auth_url_with_params)
+        
+        sys.stderr.write(
+            f"Using redirect URI: {redirect_uri}\n"
+            "Make sure this URI is registered in your Nextcloud OAuth app settings (including port).\n"
+        )
+        print(f"Opening browser for Nextcloud authentication...", file=sys.stderr)
+        import webbrowser
+        webbrowser.open(auth_url_with_params)
+        
+        # Wait up to 5 minutes for the callback; SIGTERM cancels the login
+        # and releases the port
+        if threading.current_thread() is threading.main_thread():
+            import signal
+            signal.signal(signal.SIGTERM, lambda signum, frame: cancel_oauth_callbacks())
+        auth_code = wait_for_callback(server, timeout=300)
+        
+        if server.auth_error:
+            sys.stderr.write(f"ERROR: Authentication failed: {server.auth_error}\n")
+            sys.exit(1)
+        if not auth_code:
+            sys.stderr.write("ERROR: Authentication timeout or cancelled\n")
+            sys.exit(1)
+        
+        # Exchange code for token
+        # Use provided token endpoint
+        exchange_token_url = token_endpoint
+        data = {
+            'grant_type': 'authorization_code',
+            'code': auth_code,
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'redirect_uri': redirect_uri
+        }
+        
+        response = get_http_session(exchange_token_url).post(exchange_token_url, data=data)
+        if response.status_code != 200:
+            # Mask any potential secrets in error response
+            error_text = mask_secrets(response.text)
+            sys.stderr.write(f"ERROR: Failed to get access token: {error_text}\n")
+            sys.exit(1)
+        
+        token_data = response.json()
+        token_data['expires_at'] = int(time.time()) + token_data.get('expires_in', 3600)
+        # Saved with the token, so it can be refreshed without the widget's
+        # configuration or nextcloud_credentials.json
+        token_data.update(server_url=server_url, token_endpoint=token_endpoint,
+                          client_id=client_id, client_secret=client_secret)
+        with locked_file(nextcloud_token_file):
+            write_json_file(nextcloud_token_file, token_data)
+        
+        access_token = token_data['access_token']
+        refresh_token = token_data.get('refresh_token')
+    
+    # Save access token to config for QML to use
+    log_debug("Saving to config file - nextcloud_server: %s", server_url)
+    forget_snapshots()
+    update_config({
+        'provider': 'nextcloud',
+        'nextcloud_server': server_url,
+        'access_token': access_token
+    })
+    
+    calendar_list = list_nextcloud_calendars(server_url, access_token)
+    print(dump_json(calendar_list))
+
+def extract_calendar_path_from_dav(cal, username):
+    """Extract the full CalDAV path (username/calendar) from calendar data"""
+    # Try to get the full DAV URL
+    dav_url = None
+    if isinstance(cal.get('dav'), dict):
+        dav_url = cal.get('dav', {}).get('url', '')
+    elif cal.get('url'):
+        dav_url = cal.get('url')
+    
+    if dav_url:
+        # Extract path from DAV URL: /remote.php/dav/calendars/{username}/{calendar}/
+        parts = dav_url.split('/remote.php/dav/calendars/')
+        if len(parts) > 1:
+            path = parts[1].rstrip('/')
+            return path  # Returns "username/calendar"
+    
+    # Fallback: construct from username and calendar name/ID
+    if username:
+        calendar_name = cal.get('id', '') or cal.get('calendarId', '') or cal.get('name', '')
+        if calendar_name:
+            return f"{username}/{calendar_name}"
+    
+    # Last resort: just return the calendar ID
+    return cal.get('id', '') or cal.get('calendarId', '') or ''
+
+def list_nextcloud_calendars(server_url, access_token):
+    """Fetch the calendar list from Nextcloud in Google Calendar API format.
+
+    Falls back to a single default calendar if nothing could be fetched,
+    so the user can still configure the widget.
+    """
+    session = get_http_session(server_url)
+    
+    # Fetch calendar list using Nextcloud Calendar API or CalDAV
+    try:
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Accept': 'application/json'
+        }
+        
+        # Method 1: Try Nextcloud Calendar API v1 (most reliable)
+        # Use the base URL extracted from auth_endpoint (the actual server URL the user provided)
+        cal_api_url = f"{server_url}/apps/calendar/api/v1/calendars"
+        log_debug("===== Fetching Calendar List =====")
+        log_debug("Using server_url: %s", server_url)
+        log_debug("Calendar API URL: %s", cal_api_url)
+        log_debug("Request headers: Authorization=Bearer ***masked***")
+        response = session.get(cal_api_url, headers=headers)
+        log_debug("Calendar API response status: %s", response.status_code)
+        if response.status_code != 200:
+            log_debug("Calendar API response text (first 200 chars): %s", response.text[:200])
+        
+        if response.status_code == 200:
+            calendars_data = response.json()
+            # Handle different response formats
+            calendars = []
+            if isinstance(calendars_data, dict):
+                if 'ocs' in calendars_data and 'data' in calendars_data['ocs']:
+                    calendars = calendars_data['ocs']['data']
+                elif 'data' in calendars_data:
+                    calendars = calendars_data['data']
+            elif isinstance(calendars_data, list):
+                calendars = calendars_data
+            
+            if calendars:
+                # Get username for CalDAV path construction
+                try:
+                    username = discover_caldav_account(session, server_url, access_token)['username']
+                except HelperError:
+                    username = None
+                
+                # Convert to Google Calendar API format for compatibility
+                calendar_list_items = []
+                for i, cal in enumerate(calendars):
+                    # Extract calendar ID
+                    cal_id = None
+                    if username:
+                        cal_id = extract_calendar_path_from_dav(cal, username)
+                    if not cal_id:
+                        if isinstance(cal.get('dav'), dict):
+                            dav_url = cal.get('dav', {}).get('url', '')
+                            if dav_url:
+                                cal_id = dav_url.split('/')[-1]
+                        if not cal_id and cal.get('url'):
+                            cal_id = cal.get('url').split('/')[-1]
+                        if not cal_id:
+                            cal_id = cal.get('id', '') or cal.get('calendarId', '') or str(i)
+                    
+                    cal_summary = cal.get('displayname', '') or cal.get('name', '') or cal.get('title', '') or 'Unnamed Calendar'
+                    
+                    if LOG_LEVEL <= LOG_DEBUG:
+                        log_debug("Calendar %s: summary='%s', id='%s'", i, cal_summary, cal_id)
+                        log_debug("Calendar %s raw data keys: %s", i, list(cal.keys()))
+                    
+                    # Skip invalid calendar IDs (including single character invalid IDs)
+                    if not cal_id or len(cal_id) < 1 or cal_id == '<' or cal_id == '>':
+                        log_warning("Calendar %s has invalid ID '%s', skipping", i, cal_id)
+                        continue
+                    
+                    calendar_list_items.append({
+                        'id': cal_id,
+                        'summary': cal_summary,
+                        'primary': i == 0
+                    })
+                
+                # Sort calendars by summary (name) for consistent ordering, with primary first
+                calendar_list_items.sort(key=lambda x: (not x.get('primary', False), x.get('summary', '').lower()))
+                
+                calendar_list = {'items': calendar_list_items}
+                log_debug("Final calendar list with %s calendars (after filtering and sorting)", len(calendar_list_items))
+                return calendar_list
+            else:
+                raise Exception("No calendars found in API response")
+        else:
+            # Method 2: Try CalDAV PROPFIND to get calendar list
+            log_debug("Calendar API returned %s, trying CalDAV...", response.status_code)
+            log_debug("Calendar API URL that failed: %s", cal_api_url)
+            log_debug("Server URL being used: %s", server_url)
+            
+            # List the calendar home found by principal discovery
+            try:
+                caldav_url = discover_caldav_account(session, server_url, access_token)['calendar_home']
+            except HelperError:
+                caldav_url = f"{server_url}/remote.php/dav/calendars/"
+            
+            calendar_items = []
+            for collection in list_caldav_collections(session, caldav_url, access_token).values():
+                if collection['components'] and 'VEVENT' not in collection['components']:
+                    # A task list, not a calendar of events
+                    continue
+                item = {
+                    'id': collection['id'],
+                    'summary': collection['displayname'].strip() or collection['id'],
+                    'primary': not calendar_items,  # First calendar is primary
+                    'accessRole': 'reader' if collection['read_only'] else 'owner'
+                }
+                if collection['color']:
+                    item['backgroundColor'] = collection['color']
+                calendar_items.append(item)
+            
+            if not calendar_items:
+                raise Exception("No calendars found in CalDAV response")
+            
+            # Sort calendars by summary (name) for consistent ordering
+            calendar_items.sort(key=lambda x: (not x.get('primary', False), x.get('summary', '').lower()))
+            
+            calendar_list = {'items': calendar_items}
+            log_debug("Final calendar list with %s calendars (after filtering and sorting)", len(calendar_items))
+            return calendar_list
+    except Exception as e:
+        sys.stderr.write(f"ERROR: Failed to fetch calendar list: {e}\n")
+        log_debug("===== Error Summary =====")
+        log_debug("Server URL used: %s", server_url)
+        # Log more details for debugging
+        if 'response' in locals() and hasattr(response, 'status_code'):
+            log_debug("Calendar API response status: %s", response.status_code)
+        if isinstance(e, CalDAVRequestError):
+            log_debug("CalDAV response status: %s", e.status_code)
+        log_debug("=========================")
+        # Return default calendar so user can still configure
+        calendar_list = {'items': [{'id': 'default', 'summary': 'Default Calendar', 'primary': True}]}
+        return calendar_list
+
+def authenticate():
+    """Main authentication function - determines provider and calls appropriate function"""
+    # Read provider from config or command line argument
+    provider = None
+    
+    # Check command line arguments
+    if len(sys.argv) > 1:
+        provider = sys.argv[1].lower()
+    
+    # If not provided, check config file
+    if not provider and config_file.exists():
+        try:
+            with open(config_file, 'r') as f:
+                config = json.load(f)
+                provider = config.get('provider', 'google')
+        except:
+            provider = 'google'
+    
+    # Default to Google if not specified
+    if not provider:
+        provider = 'google'
+    
+    if provider == 'google':
+        # Check if credentials are provided as command line arguments
+        # Format: python3 oauth-helper.py google [client_id] [client_secret] [port]
+        client_id = None
+        client_secret = None
+        port = None
+        
+        if len(sys.argv) >= 3:
+            client_id = sys.argv[2]
+        if len(sys.argv) >= 4:
+            client_secret = sys.argv[3]
+        if len(sys.argv) >= 5:
+            try:
+                port = int(sys.argv[4])
+            except ValueError:
+                log_warning("Invalid port number: %s, will find available port", sys.argv[4])
+        
+        authenticate_google(client_id=client_id, client_secret=client_secret, port=port)
+    elif provider == 'nextcloud':
+        # Check if endpoints and credentials are provided as command-line arguments
+        auth_endpoint = None
+        token_endpoint = None
+        client_id = None
+        client_secret = None
+        port = None
+        server_url = None
+        
+        if len(sys.argv) > 2:
+            auth_endpoint = sys.argv[2]
+        if len(sys.argv) > 3:
+            token_endpoint = sys.argv[3]
+        if len(sys.argv) > 4:
+            client_id = sys.argv[4]
+        if len(sys.argv) > 5:
+            client_secret = sys.argv[5]
+        if len(sys.argv) > 6:
+            try:
+                port = int(sys.argv[6])
+            except ValueError:
+                log_warning("Invalid port number '%s', will scan for available port", sys.argv[6])
+                port = None
+
+        # If CLI credentials are provided, derive server URL from authorization endpoint
+        if auth_endpoint and client_id and client_secret:
+            parsed = urllib.parse.urlparse(auth_endpoint)
+            server_url = f"{parsed.scheme}://{parsed.netloc}"
+        else:
+            # Fall back to credentials file
+            if not nextcloud_credentials_file.exists():
+                sys.stderr.write(f"ERROR: Place nextcloud_credentials.json in {nextcloud_credentials_file}\n")
+                sys.stderr.write("Format: {\"server_url\": \"https://your-nextcloud.com\", \"client_id\": \"...\", \"client_secret\": \"...\"}\n")
+                sys.exit(1)
+            
+            try:
+                with open(nextcloud_credentials_file, 'r') as f:
+                    nc_creds = json.load(f)
+                    server_url = nc_creds.get('server_url')
+                    if not client_id:
+                        client_id = nc_creds.get('client_id')
+                    if not client_secret:
+                        client_secret = nc_creds.get('client_secret')
+                    
+                    if not all([server_url, client_id, client_secret]):
+                        sys.stderr.write("ERROR: nextcloud_credentials.json must contain server_url, client_id, and client_secret\n")
+                        sys.exit(1)
+            except json.JSONDecodeError as e:
+                sys.stderr.write(f"ERROR: nextcloud_credentials.json is not valid JSON: {e}\n")
+                sys.exit(1)
+            except Exception as e:
+                sys.stderr.write(f"ERROR: Cannot read nextcloud_credentials.json: {e}\n")
+                sys.exit(1)
+        
+        authenticate_nextcloud(server_url, client_id, client_secret, auth_endpoint, token_endpoint, port)
+    else:
+        sys.stderr.write(f"ERROR: Unknown provider: {provider}. Use 'google' or 'nextcloud'\n")
+        sys.exit(1)
+
+class ICalComponent:
+    """A parsed iCalendar component (VCALENDAR, VEVENT, VTIMEZONE, ...).
+
+    properties maps each upper-case property name to the raw remainders of
+    its content lines (";PARAM=x:value" or ":value") in file order.
+    Parameters are only split out when a caller asks for them, which keeps
+    parsing cheap for the many properties nobody looks at.
+    """
+    __slots__ = ('name', 'properties', 'components')
+    
+    def __init__(self, name):
+        self.name = name
+        self.properties = {}
+        self.components = []
+    
+    def get(self, name):
+        """Return the first (params, value) of a property, or None"""
+        values = self.properties.get(name)
+        return parse_ical_params(values[0]) if values else None
+    
+    def get_all(self, name):
+        """Return (params, value) for every occurrence of a property"""
+        return [parse_ical_params(raw) for raw in self.properties.get(name, ())]
+    
+    def value(self, name, default=None):
+        """Return the first value of a property, or default"""
+        values = self.properties.get(name)
+        if not values:
+            return default
+        raw = values[0]
+        return raw[1:] if raw[0] == ':' else parse_ical_params(raw)[1]
+    
+    def walk(self, name):
+        """Yield all nested components with the given name"""
+        for component in self.components:
+            if component.name == name:
+                yield component
+            yield from component.walk(name)
+
+
+def parse_ical_property(line):
+    """Split a content line into (name, params, value)"""
+    colon = line.find(':')
+    if colon < 0:
+        return line.upper(), {}, ''
+    semi = line.find(';', 0, colon)
+    cut = colon if semi < 0 else semi
+    return (line[:cut].upper(),) + parse_ical_params(line[cut:])
+
+def parse_ical_params(raw):
+    """Split ";PARAM=x;OTHER=y:value" (or ":value") into (params, value).
+
+    params maps upper-case parameter names to their unquoted values.
+    """
+    if raw[0] == ':':
+        return {}, raw[1:]
+    colon = raw.find(':')
+    if colon < 0:
+        colon = len(raw)
+    if '"' in raw[:colon]:
+        # Quoted parameter values may contain ':' and ';' - scan properly
+        return _parse_quoted_ical_params(raw)
+    
+    params = {}
+    for param in raw[1:colon].split(';'):
+        key, _, param_value = param.partition('=')
+        params[key.upper()] = param_value
+    return params, raw[colon + 1:]
+
+def _parse_quoted_ical_params(raw):
+    params = {}
+    i = 1
+    length = len(raw)
+    while i < length:
+        eq = raw.find('=', i)
+        if eq < 0:
+            break
+        key = raw[i:eq].upper()
+        i = eq + 1
+        if i < length and raw[i] == '"':
+            end = raw.find('"', i + 1)
+            if end < 0:
+                end = length
+            params[key] = raw[i + 1:end]
+            i = end + 1
+        else:
+            end = i
+            while end < length and raw[end] not in ';:':
+                end += 1
+            params[key] = raw[i:end]
+            i = end
+        if i >= length or raw[i] == ':':
+            return params, raw[i + 1:]
+        i += 1  # skip ';'
+    return params, ''
+
+# Allocations that trigger a collection of the cyclic GC's youngest
+# generation. Parsing a large calendar creates hundreds of thousands of
+# containers, none of them in a cycle, which the default of 700 would have
+# the collector rescan over and over
+GC_THRESHOLD = 50000
+
+def tune_gc():
+    """Raise the GC threshold to GC_THRESHOLD, once at startup.
+
+    This is process-wide, so it is set before any threads start rather than
+    around each parse. The modules imported so far are frozen out of later
+    collections, which matters for the long-lived helper.
+    """
+    gc.freeze()
+    gc.set_threshold(GC_THRESHOLD, *gc.get_threshold()[1:])
+
+def parse_ical(text):
+    """Parse iCalendar text into its top-level components in a single pass.
+
+    Continuation lines (RFC 5545 folding) are joined first, so property
+    values and parameters are always complete.
+    """
+    # Unfold: a line break followed by a space or tab continues the line
+    text = text.replace('\r\n', '\n').replace('\n ', '').replace('\n\t', '')
+    
+    roots = []
+    stack = []
+    current = None
+    for line in text.split('\n'):
+        if not line:
+            continue
+        if line[:6] == 'BEGIN:':
+            component = ICalComponent(line[6:].strip().upper())
+            if current is not None:
+                current.components.append(component)
+            else:
+                roots.append(component)
+            stack.append(component)
+            current = component
+        elif line[:4] == 'END:':
+            if stack:
+                stack.pop()
+            current = stack[-1] if stack else None
+        elif current is not None:
+            colon = line.find(':')
+            if colon < 0:
+                continue
+            semi = line.find(';', 0, colon)
+            cut = colon if semi < 0 else semi
+            name = line[:cut].upper()
+            properties = current.properties
+            if name in properties:
+                properties[name].append(line[cut:])
+            else:
+                properties[name] = [line[cut:]]
+    return roots
+
+_TEXT_ESCAPE_RE = re.compile(r'\\(.)')
+_TEXT_ESCAPES = {'n': '\n', 'N': '\n'}
+
+def unescape_ical_text(value):
+    """Decode the backslash escapes of a TEXT value"""
+    if '\\' not in value:
+        return value
+    if '\\\\' not in value:
+        # Common case: plain str.replace is much cheaper than a regex
+        return (value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',')
+                .replace('\\;', ';'))
+    return _TEXT_ESCAPE_RE.sub(lambda m: _TEXT_ESCAPES.get(m.group(1), m.group(1)), value)
+
+def escape_ical_text(value):
+    """Encode a string as a TEXT value (the inverse of unescape_ical_text)"""
+    return (value.replace('\\', '\\\\').replace('\n', '\\n').replace(',', '\\,')
+            .replace(';', '\\;'))
+
+_DURATION_RE = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+def parse_ical_duration(value):
+    """Parse an iCalendar DURATION (e.g. PT1H30M, P1D, -P1W) into a timedelta"""
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                      minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -delta if sign == '-' else delta
+
+
+class VTimezone(tzinfo):
+    """tzinfo built from a VTIMEZONE component.
+
+    Used for TZIDs that are not IANA names (e.g. Outlook's "W. Europe
+    Standard Time"). Supports the usual yearly BYMONTH/BYDAY transition
+    rules and fixed one-off transitions.
+    """
+    
+    def __init__(self, component):
+        self.tzid = component.value('TZID', '')
+        self.observances = []
+        for observance in component.components:
+            if observance.name not in ('STANDARD', 'DAYLIGHT'):
+                continue
+            start = observance.value('DTSTART')
+            offset_to = _parse_utc_offset(observance.value('TZOFFSETTO', '+0000'))
+            if not start or offset_to is None:
+                continue
+            try:
+                onset = datetime.strptime(start[:15], '%Y%m%dT%H%M%S')
+            except ValueError:
+                continue
+            rrule = observance.value('RRULE')
+            rule = parse_rrule(rrule) if rrule else None
+            self.observances.append((onset, rule, offset_to, observance.name == 'DAYLIGHT',
+                                     observance.value('TZNAME', self.tzid)))
+        self.observances.sort(key=lambda o: o[0])
+        self._cache = {}
+    
+    def _onsets(self, year):
+        """Sorted (onset, observance) transitions of a year and the one before"""
+        onsets = self._cache.get(year)
+        if onsets is None:
+            onsets = []
+            for observance in self.observances:
+                for onset_year in (year - 1, year):
+                    onset = _observance_onset(observance, onset_year)
+                    if onset is not None:
+                        onsets.append((onset, observance))
+            onsets.sort(key=lambda o: o[0])
+            self._cache[year] = onsets
+        return onsets
+    
+    def _observance(self, dt):
+        local = dt.replace(tzinfo=None)
+        best = None
+        for onset, observance in self._onsets(local.year):
+            if onset > local:
+                break
+            best = observance
+        if best:
+            return best
+        return self.observances[0] if self.observances else None
+    
+    def utcoffset(self, dt):
+        observance = self._observance(dt)
+        return observance[2] if observance else timedelta(0)
+    
+    def dst(self, dt):
+        observance = self._observance(dt)
+        if observance and observance[3]:
+            standard = [o[2] for o in self.observances if not o[3]]
+            return observance[2] - standard[0] if standard else timedelta(hours=1)
+        return timedelta(0)
+    
+    def tzname(self, dt):
+        observance = self._observance(dt)
+        return observance[4] if observance else self.tzid
+
+def _parse_utc_offset(value):
+    match = re.match(r'([+-])(\d\d)(\d\d)(\d\d)?$', value.strip())
+    if not match:
+        return None
+    sign, hours, minutes, seconds = match.groups()
+    delta = timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds or 0))
+    return -delta if sign == '-' else delta
+
+def _observance_onset(observance, year):
+    """Local time at which an observance starts in the given year, or None"""
+    onset, rule = observance[0], observance[1]
+    if year < onset.year:
+        return None
+    if not rule:
+        return onset if year == onset.year else None
+    month = int(rule.get('BYMONTH', [onset.month])[0])
+    byday = rule.get('BYDAY')
+    if not byday:
+        day = onset.day
+    else:
+        ordinal, weekday = _split_byday(byday[0])
+        day = _nth_weekday_of_month(year, month, weekday, ordinal or 1)
+        if day is None:
+            return None
+    return onset.replace(year=year, month=month, day=day)
+
+_WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+def _split_byday(value):
+    """Split a BYDAY entry like '-1SU' into (ordinal or None, weekday index)"""
+    return (int(value[:-2]) if len(value) > 2 else None), _WEEKDAYS[value[-2:].upper()]
+
+def _nth_weekday_of_month(year, month, weekday, ordinal):
+    """Day of month of the ordinal-th weekday (negative counts from the end)"""
+    import calendar
+    days_in_month = calendar.monthrange(year, month)[1]
+    if ordinal > 0:
+        first = date(year, month, 1).weekday()
+        day = 1 + (weekday - first) % 7 + (ordinal - 1) * 7
+    else:
+        last = date(year, month, days_in_month).weekday()
+        day = days_in_month - (last - weekday) % 7 + (ordinal + 1) * 7
+    return day if 1 <= day <= days_in_month else None
+
+def parse_rrule(value):
+    """Parse an RRULE value into a dict of upper-case keys to value lists"""
+    rule = {}
+    for part in value.split(';'):
+        key, _, part_value = part.partition('=')
+        if key:
+            rule[key.upper()] = part_value.split(',')
+    return rule
+
+_timezone_cache = {}
+
+def resolve_ical_timezone(tzid, timezones):
+    """Return a tzinfo for a TZID, preferring IANA zones over VTIMEZONE data"""
+    if tzid in _timezone_cache:
+        return _timezone_cache[tzid]
+    tz = None
+    try:
+        import zoneinfo
+        # Some clients prefix IANA names, e.g. /mozilla.org/20050126_1/Europe/Berlin
+        candidates = [tzid.strip('/')]
+        parts = candidates[0].split('/')
+        if len(parts) > 2:
+            candidates.append('/'.join(parts[-2:]))
+        for candidate in candidates:
+            try:
+                tz = zoneinfo.ZoneInfo(candidate)
+                break
+            except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+                continue
+    except ImportError:
+        pass
+    if tz is None and tzid in timezones:
+        tz = VTimezone(timezones[tzid])
+    if tz is not None:
+        _timezone_cache[tzid] = tz
+    return tz
+
+def parse_ical_local_datetime(params, value, timezones):
+    """Parse a DATE or DATE-TIME value into (wall-clock value, tzinfo).
+
+    The value is a date for all-day values and a naive datetime otherwise;
+    tzinfo is None for dates, floating times and unknown TZIDs.
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8])), None
+
+    dt = datetime(int(value[:4]), int(value[4:6]), int(value[6:8]),
+                  int(value[9:11]), int(value[11:13]), int(value[13:15] or 0))
+    if value.endswith('Z'):
+        return dt, timezone.utc
+    tzid = params.get('TZID')
+    return dt, (resolve_ical_timezone(tzid, timezones) if tzid else None)
+
+def to_utc(value, tz):
+    """Normalize a wall-clock value from parse_ical_local_datetime.
+
+    Dates are returned unchanged; floating times are taken as local time.
+    """
+    if not isinstance(value, datetime):
+        return value
+    if tz is None:
+        return value.astimezone(timezone.utc)
+    return value.replace(tzinfo=tz).astimezone(timezone.utc)
+
+def parse_ical_datetime(params, value, timezones):
+    """Parse a DATE or DATE-TIME value.
+
+    Returns a date for all-day values and an aware UTC datetime otherwise.
+    Floating times (no Z and no TZID) are taken as the local time zone.
+    """
+    return to_utc(*parse_ical_local_datetime(params, value, timezones))
+
+def format_event_time(value):
+    """Format a normalized start/end as ISO 8601 (date or UTC date-time)"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat(timespec='seconds') + 'Z'
+    return value.isoformat()
+
+def event_time_ms(value):
+    """Milliseconds since the epoch for a normalized start/end.
+
+    All-day dates are taken at local midnight, like JavaScript's
+    new Date(year, month, day), so the widget can use them directly.
+    """
+    return int(as_aware_datetime(value).timestamp() * 1000)
+
+def as_aware_datetime(value):
+    """Aware datetime for a normalized start/end, all-day dates at local midnight"""
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day).astimezone()
+
+def ical_event_times(vevent, timezones):
+    """Return the normalized (start, end) of a VEVENT, or None without DTSTART"""
+    dtstart = vevent.get('DTSTART')
+    if not dtstart:
+        return None
+    start = parse_ical_datetime(dtstart[0], dtstart[1], timezones)
+    
+    dtend = vevent.get('DTEND')
+    if dtend:
+        end = parse_ical_datetime(dtend[0], dtend[1], timezones)
+    elif vevent.value('DURATION'):
+        end = start + (parse_ical_duration(vevent.value('DURATION')) or timedelta(0))
+    elif isinstance(start, datetime):
+        end = start
+    else:
+        # An all-day event without DTEND lasts one day
+        end = start + timedelta(days=1)
+    return start, end
+
+_RRULE_STEP_SECONDS = {'HOURLY': 3600, 'MINUTELY': 60, 'SECONDLY': 1}
+
+def _rrule_ints(rule, key):
+    values = rule.get(key)
+    return [int(v) for v in values if v.strip()] if values else None
+
+def _month_days(year, month, bymonthday, byday, default_day):
+    """Candidate days of a month for BYMONTHDAY/BYDAY (month scope)"""
+    import calendar
+    days_in_month = calendar.monthrange(year, month)[1]
+    days = None
+    if bymonthday:
+        days = {d if d > 0 else days_in_month + d + 1 for d in bymonthday}
+        days = {d for d in days if 1 <= d <= days_in_month}
+    if byday:
+        matches = set()
+        for ordinal, weekday in byday:
+            if ordinal:
+                day = _nth_weekday_of_month(year, month, weekday, ordinal)
+                if day:
+                    matches.add(day)
+            else:
+                first = 1 + (weekday - date(year, month, 1).weekday()) % 7
+                matches.update(range(first, days_in_month + 1, 7))
+        days = matches if days is None else days & matches
+    if days is None:
+        days = {default_day} if default_day <= days_in_month else set()
+    return sorted(days)
+
+def _year_days(year, byday, byyearday):
+    """Candidate dates for BYDAY/BYYEARDAY in year scope (e.g. 20MO, -1FR)"""
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    days = set()
+    for ordinal, weekday in byday or ():
+        if ordinal is None or ordinal > 0:
+            day = first + timedelta(days=(weekday - first.weekday()) % 7)
+            if ordinal is None:
+                while day <= last:
+                    days.add(day)
+                    day += timedelta(days=7)
+                continue
+            day += timedelta(weeks=ordinal - 1)
+        else:
+            day = last - timedelta(days=(last.weekday() - weekday) % 7) + timedelta(weeks=ordinal + 1)
+        if first <= day <= last:
+            days.add(day)
+    for yearday in byyearday or ():
+        day = first + timedelta(days=yearday - 1) if yearday > 0 else last + timedelta(days=yearday + 1)
+        if first <= day <= last:
+            days.add(day)
+    return sorted(days)
+
+def _rrule_day_matches(day, bymonth, bymonthday, weekdays):
+    """Whether a day passes the BY* filters of a DAILY or sub-daily rule"""
+    if bymonth and day.month not in bymonth:
+        return False
+    if weekdays is not None and day.weekday() not in weekdays:
+        return False
+    if bymonthday:
+        return day.day in _month_days(day.year, day.month, bymonthday, None, day.day)
+    return True
+
+def iter_rrule(dtstart, rule, limit, until=None, skip_to=None):
+    """Yield the starts of a recurrence rule as naive wall-clock datetimes.
+
+    dtstart is always the first occurrence. Expansion is lazy and stops at
+    COUNT, at UNTIL (given in dtstart's wall-clock time) or once past limit,
+    so unbounded rules are safe. Occurrences before skip_to are not
+    yielded; without COUNT, whole periods before it are jumped over instead
+    of being enumerated, which keeps old daily series cheap.
+    """
+    freq = rule.get('FREQ', ['DAILY'])[0].upper()
+    interval = max(int(rule.get('INTERVAL', ['1'])[0] or 1), 1)
+    count = int(rule['COUNT'][0]) if rule.get('COUNT') else None
+    bymonth = _rrule_ints(rule, 'BYMONTH')
+    bymonthday = _rrule_ints(rule, 'BYMONTHDAY')
+    byyearday = _rrule_ints(rule, 'BYYEARDAY')
+    bysetpos = _rrule_ints(rule, 'BYSETPOS')
+    byday = [_split_byday(d.strip()) for d in rule['BYDAY'] if d.strip()] if rule.get('BYDAY') else None
+    weekdays = {weekday for _, weekday in byday} if byday else None
+    times = sorted({(hour, minute) for hour in (_rrule_ints(rule, 'BYHOUR') or [dtstart.hour])
+                    for minute in (_rrule_ints(rule, 'BYMINUTE') or [dtstart.minute])})
+    first_day = dtstart.date()
+    week_start = first_day - timedelta(days=(first_day.weekday() - _WEEKDAYS.get(
+        rule.get('WKST', ['MO'])[0].upper(), 0)) % 7)
+    if until is not None:
+        limit = min(limit, until)
+
+    period = 0
+    if count is None and skip_to is not None and skip_to > dtstart:
+        if freq == 'DAILY':
+            period = (skip_to.date() - first_day).days // interval
+        elif freq == 'WEEKLY':
+            period = (skip_to.date() - week_start).days // (7 * interval)
+        elif freq == 'MONTHLY':
+            period = ((skip_to.year - dtstart.year) * 12 + skip_to.month - dtstart.month) // interval
+        elif freq == 'YEARLY':
+            period = (skip_to.year - dtstart.year) // interval
+        elif freq in _RRULE_STEP_SECONDS:
+            period = int((skip_to - dtstart).total_seconds()) // (_RRULE_STEP_SECONDS[freq] * interval)
+        # Step back one period so nothing straddling skip_to is lost
+        period = max(period - 1, 0)
+
+    emitted = 0
+    if period == 0:
+        if skip_to is None or dtstart >= skip_to:
+            yield dtstart
+        emitted = 1
+    limit_day = limit.date()
+    while count is None or emitted < count:
+        if freq == 'DAILY':
+            day = first_day + timedelta(days=period * interval)
+            period_start = day
+            days = [day] if _rrule_day_matches(day, bymonth, bymonthday, weekdays) else []
+        elif freq == 'WEEKLY':
+            period_start = week_start + timedelta(weeks=period * interval)
+            wanted = weekdays if weekdays is not None else {first_day.weekday()}
+            days = [period_start + timedelta(days=i) for i in range(7)]
+            days = [d for d in days if d.weekday() in wanted and (not bymonth or d.month in bymonth)]
+        elif freq == 'MONTHLY':
+            months = dtstart.month - 1 + period * interval
+            year, month = dtstart.year + months // 12, months % 12 + 1
+            period_start = date(year, month, 1)
+            days = [] if bymonth and month not in bymonth else [
+                date(year, month, d) for d in _month_days(year, month, bymonthday, byday, dtstart.day)]
+        elif freq == 'YEARLY':
+            year = dtstart.year + period * interval
+            period_start = date(year, 1, 1)
+            if bymonth or bymonthday:
+                # BYMONTHDAY without BYMONTH applies to every month
+                days = [date(year, month, d) for month in (bymonth or range(1, 13))
+                        for d in _month_days(year, month, bymonthday, byday, dtstart.day)]
+            elif byday or byyearday:
+                days = _year_days(year, byday, byyearday)
+            else:
+                days = [date(year, dtstart.month, d)
+                        for d in _month_days(year, dtstart.month, None, None, dtstart.day)]
+        elif freq in _RRULE_STEP_SECONDS:
+            candidate = dtstart + timedelta(seconds=period * interval * _RRULE_STEP_SECONDS[freq])
+            period_start = candidate.date()
+            days = None
+        else:
+            return
+        if period_start > limit_day:
+            return
+
+        if days is None:
+            candidates = [candidate] if _rrule_day_matches(candidate.date(), bymonth, bymonthday, weekdays) else []
+        else:
+            candidates = [datetime(d.year, d.month, d.day, hour, minute, dtstart.second)
+                          for d in days for hour, minute in times]
+        if bysetpos and candidates:
+            candidates = sorted({candidates[p - 1 if p > 0 else p] for p in bysetpos
+                                 if -len(candidates) <= p <= len(candidates) and p})
+
+        for occurrence in candidates:
+            if occurrence <= dtstart:
+                continue
+            if occurrence > limit:
+                return
+            if skip_to is None or occurrence >= skip_to:
+                yield occurrence
+            # Occurrences before skip_to still count towards COUNT
+            emitted += 1
+            if count is not None and emitted >= count:
+                return
+        period += 1
+
+def _recurrence_dates(vevent, name, timezones):
+    """Normalized values of every EXDATE or RDATE line of a VEVENT"""
+    values = []
+    for params, value in vevent.get_all(name):
+        for part in value.split(','):
+            # RDATE;VALUE=PERIOD carries "start/end" - only the start matters here
+            part = part.split('/')[0].strip()
+            if part:
+                values.append(parse_ical_datetime(params, part, timezones))
+    return values
+
+def _overlaps(start, end, window_start, window_end):
+    start, end = as_aware_datetime(start), as_aware_datetime(end)
+    return start < window_end and (end > window_start or start >= window_start)
+
+def iter_event_occurrences(vevent, timezones, window_start, window_end):
+    """Yield the normalized (start, end) of each occurrence of a VEVENT in a window.
+
+    Occurrences come from DTSTART, RRULE and RDATE minus EXDATE. They are
+    expanded in the event's own time zone, so a weekly 09:00 meeting stays
+    at 09:00 across DST changes, and only those overlapping
+    [window_start, window_end) (aware datetimes) are produced, in order.
+    """
+    dtstart = vevent.get('DTSTART')
+    if not dtstart:
+        return
+    import heapq
+    local_start, tz = parse_ical_local_datetime(dtstart[0], dtstart[1], timezones)
+    start, end = ical_event_times(vevent, timezones)
+    duration = end - start
+    all_day = not isinstance(local_start, datetime)
+
+    def to_wall_clock(dt):
+        return dt.astimezone(tz if tz is not None and not all_day else None).replace(tzinfo=None)
+
+    def normalize(local):
+        return local.date() if all_day else to_utc(local, tz)
+
+    rrule_value = vevent.value('RRULE')
+    if rrule_value:
+        rule = parse_rrule(rrule_value)
+        until = None
+        if rule.get('UNTIL'):
+            until_value = rule['UNTIL'][0].strip()
+            if len(until_value) == 8:
+                # A date UNTIL includes the whole day
+                until = datetime(int(until_value[:4]), int(until_value[4:6]), int(until_value[6:8]), 23, 59, 59)
+            else:
+                until, until_tz = parse_ical_local_datetime({}, until_value, timezones)
+                if until_tz is not None:
+                    until = to_wall_clock(until.replace(tzinfo=until_tz))
+        if all_day:
+            local_start = datetime(local_start.year, local_start.month, local_start.day)
+        # A day of slack on both sides covers time zone offsets and all-day dates
+        slack = timedelta(days=1)
+        starts = (normalize(local) for local in iter_rrule(
+            local_start, rule, to_wall_clock(window_end) + slack, until=until,
+            skip_to=to_wall_clock(window_start) - abs(duration) - slack))
+    else:
+        starts = iter([start])
+
+    rdates = sorted(_recurrence_dates(vevent, 'RDATE', timezones), key=as_aware_datetime)
+    exdates = set(_recurrence_dates(vevent, 'EXDATE', timezones))
+    seen = set()
+    for occurrence in heapq.merge(starts, rdates, key=as_aware_datetime):
+        if occurrence in exdates or occurrence in seen:
+            continue
+        if as_aware_datetime(occurrence) >= window_end:
+            return
+        seen.add(occurrence)
+        occurrence_end = occurrence + duration
+        if _overlaps(occurrence, occurrence_end, window_start, window_end):
+            yield occurrence, occurrence_end
+
+def ical_event_to_dict(vevent, start, end, recurrence_id=None):
+    """Build the event dict sent to the widget from a VEVENT and its times.
+
+    recurrence_id (the original start of an occurrence of a recurring
+    event) tells occurrences sharing a UID apart.
+    """
+    all_day = not isinstance(start, datetime)
+    event = {
+        'uid': vevent.value('UID', ''),
+        'summary': unescape_ical_text(vevent.value('SUMMARY', '')) or 'No Title',
+        'location': unescape_ical_text(vevent.value('LOCATION', '')),
+        'start': format_event_time(start),
+        'end': format_event_time(end),
+        'start_ms': event_time_ms(start),
+        'end_ms': event_time_ms(end),
+        'all_day': all_day,
+    }
+    description = vevent.value('DESCRIPTION')
+    if description:
+        event['description'] = unescape_ical_text(description)
+    status = vevent.value('STATUS')
+    if status:
+        event['status'] = status.upper()
+    dtstart_params = vevent.get('DTSTART')[0]
+    if 'TZID' in dtstart_params:
+        event['tzid'] = dtstart_params['TZID']
+    if recurrence_id is not None:
+        event['recurrence_id'] = format_event_time(recurrence_id)
+    return event
+
+def move_event(event, start, end, recurrence_id=None):
+    """Copy an event dict with new normalized times, e.g. for another occurrence"""
+    event = dict(event)
+    event['start'] = format_event_time(start)
+    event['end'] = format_event_time(end)
+    event['start_ms'] = event_time_ms(start)
+    event['end_ms'] = event_time_ms(end)
+    if recurrence_id is not None:
+        event['recurrence_id'] = format_event_time(recurrence_id)
+    return event
+
+def iter_ical_events(ical_content, window_start=None, window_end=None):
+    """Yield the VEVENTs of an iCalendar object as normalized event dicts.
+
+    Given a window (aware datetimes), only events overlapping it are
+    produced and recurring events are expanded into their occurrences
+    within it: RRULE and RDATE instances minus EXDATE, with instances that
+    have their own RECURRENCE-ID VEVENT replaced by it. Without a window
+    every VEVENT is returned as it is stored.
+    """
+    return iter_calendar_events(parse_ical(ical_content), window_start, window_end)
+
+def iter_calendar_events(calendars, window_start=None, window_end=None):
+    """Like iter_ical_events, for VCALENDARs already parsed by parse_ical"""
+    for calendar in calendars:
+        timezones = {tz.value('TZID'): tz for tz in calendar.walk('VTIMEZONE')}
+        vevents = list(calendar.walk('VEVENT'))
+        overridden = set()
+        if window_start is not None:
+            for vevent in vevents:
+                recurrence_id = vevent.get('RECURRENCE-ID')
+                if recurrence_id:
+                    try:
+                        overridden.add((vevent.value('UID', ''), parse_ical_datetime(
+                            recurrence_id[0], recurrence_id[1], timezones)))
+                    except (ValueError, IndexError):
+                        pass
+        for vevent in vevents:
+            try:
+                times = ical_event_times(vevent, timezones)
+                if not times:
+                    continue
+                if window_start is None:
+                    yield ical_event_to_dict(vevent, *times)
+                    continue
+                recurrence_id = vevent.get('RECURRENCE-ID')
+                if recurrence_id:
+                    # A cancelled override removes its occurrence
+                    if vevent.value('STATUS', '').upper() != 'CANCELLED' and _overlaps(
+                            *times, window_start, window_end):
+                        yield ical_event_to_dict(vevent, *times, parse_ical_datetime(
+                            recurrence_id[0], recurrence_id[1], timezones))
+                elif 'RRULE' in vevent.properties or 'RDATE' in vevent.properties:
+                    uid = vevent.value('UID', '')
+                    event = None
+                    for start, end in iter_event_occurrences(vevent, timezones, window_start, window_end):
+                        if (uid, start) in overridden:
+                            continue
+                        # Text fields are decoded once per series, not per occurrence
+                        event = (ical_event_to_dict(vevent, start, end, start) if event is None
+                                 else move_event(event, start, end, start))
+                        yield event
+                elif _overlaps(*times, window_start, window_end):
+                    yield ical_event_to_dict(vevent, *times)
+            except (ValueError, IndexError, KeyError, OverflowError):
+                log_warning("Skipping event with invalid dates: %s", vevent.value('UID', ''))
+
+def parse_ical_events(ical_content, window_start=None, window_end=None):
+    """Parse the VEVENTs of an iCalendar object into a list of event dicts"""
+    return list(iter_ical_events(ical_content, window_start, window_end))
+
+def parse_iso_datetime(value):
+    """Parse an ISO 8601 timestamp (as sent by the widget) into an aware UTC datetime"""
+    value = value.replace('Z', '+00:00')
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        # Fallback: parse manually
+        value = value.replace('+00:00', 'Z')
+        try:
+            dt = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+        except ValueError:
+            dt = datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+CALDAV_DISCOVERY_BODY = '''<?xml version="1.0" encoding="utf-8" ?>
+<d:propfind xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">
+<d:prop><d:current-user-principal/><c:calendar-home-set/></d:prop></d:propfind>'''
+CALDAV_COLLECTION_TAGS_BODY = '''<?xml version="1.0" encoding="utf-8" ?>
+<d:propfind xmlns:d="DAV:" xmlns:cs="http://calendarserver.org/ns/">
+<d:prop><d:resourcetype/><cs:getctag/><d:sync-token/></d:prop></d:propfind>'''
+CALDAV_CALENDARS_BODY = '''<?xml version="1.0" encoding="utf-8" ?>
+<d:propfind xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav" xmlns:cs="http://calendarserver.org/ns/"
+ xmlns:ic="http://apple.com/ns/ical/" xmlns:oc="http://owncloud.org/ns">
+<d:prop><d:displayname/><c:calendar-description/><d:resourcetype/><cs:getctag/><d:sync-token/>
+<ic:calendar-color/><c:supported-calendar-component-set/><d:current-user-privilege-set/><oc:read-only/>
+</d:prop></d:propfind>'''
+# Privileges that allow changing the objects of a calendar
+CALDAV_WRITE_PRIVILEGES = {'{DAV:}all', '{DAV:}write', '{DAV:}write-content'}
+
+_discovery_lock = threading.Lock()
+
+
+def caldav_propfind(session, url, access_token, body, depth='0'):
+    """Send a PROPFIND and return its responses as (href, status, props) tuples"""
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/xml; charset=utf-8',
+        'Depth': depth
+    }
+    response = session.request('PROPFIND', url, headers=headers, data=body, stream=True)
+    with response:
+        if response.status_code not in [200, 207]:
+            raise CalDAVRequestError(f"PROPFIND failed with status {response.status_code}", response.status_code)
+        return list(iter_multistatus_responses(response.iter_content(chunk_size=65536)))
+
+def _first_href(responses, name):
+    for _, _, props in responses:
+        value = props.get(name)
+        if isinstance(value, list) and value and value[0]:
+            return value[0]
+    return None
+
+def fetch_nextcloud_username(session, server_url, access_token):
+    """Ask Nextcloud's OCS API for the user ID, or return None"""
+    headers = {'Authorization': f'Bearer {access_token}', 'Accept': 'application/json', 'OCS-APIRequest': 'true'}
+    user_response = session.get(f"{server_url}/ocs/v2.php/cloud/user", headers=headers)
+    if user_response.status_code == 200:
+        user_data = user_response.json()
+        if 'ocs' in user_data and 'data' in user_data['ocs']:
+            return user_data['ocs']['data'].get('id')
+    return None
+
+def discover_caldav_account(session, server_url, access_token):
+    """Return the CalDAV principal and calendar home of a server, discovering them once.
+
+    Discovery asks the DAV root for current-user-principal and the principal
+    for calendar-home-set (RFC 5397, RFC 4791), falling back to Nextcloud's
+    OCS user API. The result ({"principal", "calendar_home", "username"},
+    absolute URLs) is cached in discovery.json until forget_caldav_account()
+    drops it, so steady-state refreshes skip these round trips.
+    """
+    with _discovery_lock:
+        accounts = read_cache_file(caldav_discovery_file) or {}
+        if server_url in accounts:
+            return accounts[server_url]
+        
+        log_debug("Discovering CalDAV principal for %s", server_url)
+        dav_root = f"{server_url}/remote.php/dav/"
+        account = {}
+        try:
+            principal = _first_href(caldav_propfind(session, dav_root, access_token, CALDAV_DISCOVERY_BODY),
+                                    '{DAV:}current-user-principal')
+            if principal:
+                principal = urllib.parse.urljoin(dav_root, principal)
+                home = _first_href(caldav_propfind(session, principal, access_token, CALDAV_DISCOVERY_BODY),
+                                   '{urn:ietf:params:xml:ns:caldav}calendar-home-set')
+                if home:
+                    account = {'principal': principal, 'calendar_home': urllib.parse.urljoin(principal, home)}
+        except CalDAVRequestError as e:
+            if e.status_code == 401:
+                raise
+            log_debug("Principal discovery failed (%s), asking the OCS API", e)
+        
+        if not account:
+            username = fetch_nextcloud_username(session, server_url, access_token)
+            if not username:
+                raise HelperError("Could not discover the CalDAV calendar home")
+            account = {'principal': f"{server_url}/remote.php/dav/principals/users/{username}/",
+                       'calendar_home': f"{server_url}/remote.php/dav/calendars/{username}/"}
+        account['username'] = urllib.parse.unquote(account['calendar_home'].rstrip('/').rsplit('/', 1)[-1])
+        log_debug("CalDAV calendar home: %s", account['calendar_home'])
+        
+        accounts = dict(accounts)
+        accounts[server_url] = account
+        write_cache_file(caldav_discovery_file, accounts)
+        return account
+
+def forget_caldav_account(server_url):
+    """Drop the discovered principal of a server, e.g. after a 401 or 404"""
+    with _discovery_lock:
+        accounts = read_cache_file(caldav_discovery_file) or {}
+        if server_url in accounts:
+            accounts = {url: account for url, account in accounts.items() if url != server_url}
+            write_cache_file(caldav_discovery_file, accounts)
+
+def resolve_caldav_url(session, server_url, calendar_id, access_token):
+    """Return (collection URL, discovered) for a calendar ID.
+
+    IDs of the form "username/calendar" map straight to Nextcloud's
+    calendar path; bare calendar names are looked up in the discovered
+    calendar home.
+    """
+    if '/' in calendar_id:
+        return f"{server_url}/remote.php/dav/calendars/{calendar_id.strip('/')}/", False
+    account = discover_caldav_account(session, server_url, access_token)
+    return urllib.parse.urljoin(account['calendar_home'], urllib.parse.quote(calendar_id) + '/'), True
+
+def _text_property(props, name):
+    """Text of a property from iter_multistatus_responses, or '' if missing or not text"""
+    value = props.get(name, '')
+    return value.strip() if isinstance(value, str) else ''
+
+def list_caldav_collections(session, home_url, access_token, body=CALDAV_CALENDARS_BODY):
+    """Return {calendar URL: calendar} for the calendars in a calendar home.
+
+    One Depth: 1 PROPFIND; its responses are parsed one at a time as they
+    arrive (see iter_multistatus_responses), so properties are matched to
+    their calendar by href, whatever namespace prefixes the server uses
+    and whichever properties a calendar lacks. Each calendar is {"id"
+    (last path segment), "displayname", "description", "color", "ctag",
+    "sync_token", "components" (e.g. ["VEVENT"], empty if not reported)
+    and "read_only"}. URLs are absolute and unquoted; collections that are
+    not calendars, such as the scheduling inbox, are left out.
+    """
+    calendars = {}
+    for href, _, props in caldav_propfind(session, home_url, access_token, body, depth='1'):
+        if '{urn:ietf:params:xml:ns:caldav}calendar' not in props.get('{DAV:}resourcetype', ()):
+            continue
+        url = urllib.parse.urljoin(home_url, href)
+        privileges = props.get('{DAV:}current-user-privilege-set')
+        color = _text_property(props, '{http://apple.com/ns/ical/}calendar-color')
+        calendars[url] = {
+            'id': url.rstrip('/').rsplit('/', 1)[-1],
+            'displayname': _text_property(props, '{DAV:}displayname'),
+            'description': _text_property(props, '{urn:ietf:params:xml:ns:caldav}calendar-description'),
+            # Nextcloud appends an alpha channel: #RRGGBBAA
+            'color': color[:7] if len(color) == 9 and color.startswith('#') else color,
+            'ctag': _text_property(props, '{http://calendarserver.org/ns/}getctag') or None,
+            'sync_token': _text_property(props, '{DAV:}sync-token') or None,
+            'components': list(props.get('{urn:ietf:params:xml:ns:caldav}supported-calendar-component-set') or ()),
+            'read_only': (_text_property(props, '{http://owncloud.org/ns}read-only') in ('1', 'true')
+                          or isinstance(privileges, list) and not CALDAV_WRITE_PRIVILEGES & set(privileges)),
+        }
+    return calendars
+
+def fetch_collection_tags(session, home_url, access_token):
+    """Return {calendar URL: {"sync_token", "ctag"}} for every calendar in a calendar home.
+
+    One Depth: 1 PROPFIND asks for the sync-token and CalendarServer
+    getctag of all calendars at once; either changes whenever anything
+    in the calendar does. URLs are absolute and unquoted.
+    """
+    return {url: {'sync_token': calendar['sync_token'], 'ctag': calendar['ctag']}
+            for url, calendar in list_caldav_collections(session, home_url, access_token,
+                                                         CALDAV_COLLECTION_TAGS_BODY).items()
+            if calendar['sync_token'] or calendar['ctag']}
+
+def iter_caldav_events(server_url, calendar_id, access_token, time_min, time_max, collection_tags=None):
+    """Fetch calendar events using CalDAV REPORT, yielding them as they arrive.
+
+    Calendars are mirrored in an on-disk cache kept current with
+    sync-collection (see sync_caldav_collection), so a refresh only
+    transfers what changed. Servers without sync support are cached too:
+    their ETags are compared and only changed objects are downloaded with
+    calendar-multiget (see refresh_caldav_objects). collection_tags (see
+    fetch_collection_tags) tells which collections are unchanged, which
+    then cost no request. If the cached paths fail, a time-range
+    calendar-query is streamed through an incremental XML parser and each
+    <d:response> is parsed and discarded as soon as it is complete, so
+    large calendars are never held in memory as a whole.
+    """
+    if not requests_available():
+        raise HelperError("requests library not available")
+    
+    session = get_http_session(server_url)
+    window_start = parse_iso_datetime(time_min)
+    window_end = parse_iso_datetime(time_max)
+    
+    collection_tags = collection_tags or {}
+    caldav_url, discovered = resolve_caldav_url(session, server_url, calendar_id, access_token)
+    try:
+        yield from iter_caldav_collection_events(session, caldav_url, access_token, window_start, window_end,
+                                                 collection_tags.get(urllib.parse.unquote(caldav_url)))
+    except CalDAVRequestError as e:
+        if not discovered or e.status_code not in [401, 404]:
+            raise
+        # The cached calendar home may be stale (moved, or another user): rediscover once
+        log_debug("%s, rediscovering the calendar home", e)
+        forget_caldav_account(server_url)
+        caldav_url, _ = resolve_caldav_url(session, server_url, calendar_id, access_token)
+        yield from iter_caldav_collection_events(session, caldav_url, access_token, window_start, window_end,
+                                                 collection_tags.get(urllib.parse.unquote(caldav_url)))
+
+def iter_caldav_collection_events(session, caldav_url, access_token, window_start, window_end, tags=None):
+    """Yield the events of one CalDAV collection within a window (see iter_caldav_events)"""
+    log_debug("CalDAV URL: %s", caldav_url)
+    
+    try:
+        with trace_phase('sync'):
+            try:
+                cache = sync_caldav_collection(session, caldav_url, access_token, tags)
+            except CalDAVSyncUnsupported as e:
+                log_debug("%s, comparing ETags", e)
+                cache = refresh_caldav_objects(session, caldav_url, access_token, window_start, window_end, tags)
+    except CalDAVRequestError as e:
+        if e.status_code in [401, 404]:
+            raise
+        log_debug("%s, using calendar-query", e)
+    else:
+        with trace_phase('parse'):
+            yield from iter_calendar_events(iter_cached_calendars(cache), window_start, window_end)
+        return
+    
+    # Format dates for CalDAV (YYYYMMDDTHHMMSSZ)
+    caldav_start = window_start.strftime('%Y%m%dT%H%M%SZ')
+    caldav_end = window_end.strftime('%Y%m%dT%H%M%SZ')
+    
+    # CalDAV REPORT request body
+    report_body = f'''<?xml version="1.0" encoding="utf-8" ?>
+<c:calendar-query xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">
+<d:prop><d:getetag/><c:calendar-data/></d:prop>
+<c:filter><c:comp-filter name="VCALENDAR">
+<c:comp-filter name="VEVENT">
+<c:time-range start="{caldav_start}" end="{caldav_end}"/>
+</c:comp-filter></c:comp-filter></c:filter></c:calendar-query>'''
+    
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/xml; charset=utf-8',
+        'Depth': '1'
+    }
+    
+    response = session.request('REPORT', caldav_url, headers=headers, data=report_body, stream=True)
+    with response:
+        if response.status_code not in [200, 207]:
+            log_debug("CalDAV REPORT response: %s", mask_secrets(response.text[:500]))
+            raise CalDAVRequestError(f"CalDAV REPORT failed with status {response.status_code}",
+                                     response.status_code)
+        
+        for ical_content in iter_multistatus_calendar_data(response.iter_content(chunk_size=65536)):
+            # The server only filters on time-range; recurring events still
+            # arrive as a master plus overrides and are expanded here
+            yield from iter_ical_events(ical_content, window_start, window_end)
+
+def load_caldav_events(server_url, calendar_id, access_token, time_min, time_max, collection_tags=None):
+    """Fetch calendar events using CalDAV REPORT and return them as a list"""
+    return list(iter_caldav_events(server_url, calendar_id, access_token, time_min, time_max, collection_tags))
+
+def iter_multistatus_calendar_data(chunks):
+    """Yield the calendar-data text of each <d:response> in a streamed 207 body"""
+    for _, _, props in iter_multistatus_responses(chunks):
+        calendar_data = props.get(CALDAV_CALENDAR_DATA)
+        if calendar_data:
+            yield calendar_data
+
+def _property_child(child):
+    """The list entry of iter_multistatus_responses for a child element of a property.
+
+    That is the text of a <d:href>, the name attribute of e.g. <c:comp
+    name="VEVENT"/>, the element wrapped by e.g. <d:privilege><d:read/>
+    </d:privilege>, or else the element's own name.
+    """
+    if child.tag == '{DAV:}href':
+        return (child.text or '').strip()
+    if 'name' in child.attrib:
+        return child.attrib['name']
+    if len(child) == 1:
+        return child[0].tag
+    return child.tag
+
+def iter_multistatus_responses(chunks, extra=None):
+    """Yield (href, status, props) for each <d:response> in a streamed 207 body.
+
+    href is unquoted. status is the response-level <d:status> (e.g.
+    "HTTP/1.1 404 Not Found" for a member removed since a sync-token) or
+    None, and props maps the Clark-notation names ("{DAV:}getetag") of the
+    properties found with a 2xx status to their text. Properties with
+    child elements map to a list with one entry per child (see
+    _property_child), e.g. ['/remote.php/dav/principals/users/alice/'],
+    ['{DAV:}collection', '{urn:ietf:params:xml:ns:caldav}calendar'] or
+    ['VEVENT', 'VTODO']. Names are matched by namespace, never by prefix.
+    When extra is a dict, the text of top-level elements other than
+    responses, such as <d:sync-token>, is stored in it.
+    """
+    import xml.etree.ElementTree as ET
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    depth = 0
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if elem.tag == '{DAV:}response':
+                props = {}
+                for propstat in elem.iterfind('{DAV:}propstat'):
+                    if ' 2' not in (propstat.findtext('{DAV:}status') or ' 200'):
+                        continue
+                    for prop in propstat.iterfind('{DAV:}prop/*'):
+                        if len(prop):
+                            props[prop.tag] = [_property_child(child) for child in prop]
+                        else:
+                            props[prop.tag] = prop.text or ''
+                yield (urllib.parse.unquote(elem.findtext('{DAV:}href', '').strip()),
+                       elem.findtext('{DAV:}status'), props)
+                # Drop the finished response so the tree never grows
+                if root is not None and elem is not root:
+                    root.remove(elem)
+            elif depth == 1 and extra is not None:
+                extra[elem.tag] = (elem.text or '').strip()
+    parser.close()
+
+CALDAV_CALENDAR_DATA = '{urn:ietf:params:xml:ns:caldav}calendar-data'
+CALDAV_CACHE_VERSION = 1
+# Most objects fetched by one calendar-multiget REPORT
+CALDAV_MULTIGET_BATCH = 100
+
+# Parsed calendar objects kept between refreshes in --serve mode, per
+# collection URL: {href: (etag, [VCALENDAR, ...])}
+_parsed_caldav_objects = {}
+# Cache files already loaded by this process: {path: (mtime, data)}
+_loaded_cache_files = {}
+
+
+class CalDAVSyncUnsupported(HelperError):
+    """The server does not support sync-collection for a calendar"""
+
+
+class CalDAVRequestError(HelperError):
+    """A CalDAV request failed with an HTTP error status"""
+    
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def caldav_cache_file(caldav_url):
+    """Path of the on-disk cache of a calendar collection"""
+    import hashlib
+    return caldav_cache_dir / (hashlib.sha1(caldav_url.encode('utf-8')).hexdigest() + '.json')
+
+def copy_json(value):
+    """Deep copy of decoded JSON; strings and numbers are immutable and shared"""
+    if type(value) is dict:
+        return {key: copy_json(item) for key, item in value.items()}
+    if type(value) is list:
+        return [copy_json(item) for item in value]
+    return value
+
+def read_cache_file(path):
+    """Load a JSON cache file, or return None if it is missing or unreadable.
+
+    Files already loaded by this process are reused while their mtime is
+    unchanged, so the long-lived helper does not re-read them on every
+    refresh. Each caller gets its own copy, which it may change and save
+    with write_cache_file, so concurrent refreshes never share one.
+    """
+    try:
+        mtime = path.stat().st_mtime_ns
+        loaded = _loaded_cache_files.get(path)
+        if loaded and loaded[0] == mtime:
+            return copy_json(loaded[1])
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _loaded_cache_files[path] = (mtime, copy_json(data))
+    return data
+
+def write_cache_file(path, data):
+    """Write a JSON cache file atomically; caches can be rebuilt, so no fsync.
+
+    The copy kept for read_cache_file is taken once the write succeeded, so
+    later changes by the caller, or a failed write, do not leak into it.
+    """
+    write_json_file(path, data, sync=False, separators=(',', ':'))
+    _loaded_cache_files[path] = (path.stat().st_mtime_ns, copy_json(data))
+
+SNAPSHOT_VERSION = 2
+
+def load_snapshot(path, key):
+    """Return the last result saved under key (see save_snapshot), or None"""
+    snapshot = read_cache_file(path)
+    if snapshot and snapshot.get('version') == SNAPSHOT_VERSION and snapshot.get('key') == key:
+        return snapshot
+    return None
+
+def save_snapshot(path, key, result):
+    """Save a fetch result to be served while offline, and return it stamped.
+
+    Only the latest result is kept; key (provider and calendar ids) tells
+    the widget, which reads the file at startup, whether it is its own.
+    """
+    result = dict(result, fetched_at=int(time.time()), stale=False)
+    write_cache_file(path, dict(result, version=SNAPSHOT_VERSION, key=key))
+    return result
+
+def forget_snapshots():
+    """Remove the saved results, e.g. when another account logs in"""
+    for path in (events_snapshot_file, tasks_snapshot_file):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+def load_caldav_cache(caldav_url):
+    """Load the cache of a calendar collection, or return an empty one.
+
+    The cache holds the collection's sync-token, its getctag when known,
+    and {href: {etag, data}} for every calendar object in it.
+    """
+    cache = read_cache_file(caldav_cache_file(caldav_url))
+    if cache and cache.get('version') == CALDAV_CACHE_VERSION and cache.get('url') == caldav_url:
+        return cache
+    return {'version': CALDAV_CACHE_VERSION, 'url': caldav_url, 'sync_token': None, 'objects': {}}
+
+def save_caldav_cache(cache):
+    """Write the cache of a calendar collection"""
+    write_cache_file(caldav_cache_file(cache['url']), cache)
+
+def sync_caldav_collection(session, caldav_url, access_token, tags=None):
+    """Bring the cache of a calendar collection up to date and return it.
+
+    Sends an RFC 6578 sync-collection REPORT with the stored sync-token,
+    so an unchanged calendar costs one small round trip and only objects
+    changed since the last refresh are downloaded. An expired token starts
+    a full resync. Raises CalDAVSyncUnsupported if the server cannot do
+    sync-collection at all.
+    
+    tags is the collection's current {"sync_token", "ctag"} from
+    fetch_collection_tags; if they match the cache, the cache is returned
+    without a request.
+    """
+    from xml.sax.saxutils import escape
+    cache = load_caldav_cache(caldav_url)
+    if cache.get('sync_unsupported'):
+        raise CalDAVSyncUnsupported("sync-collection not supported")
+    if tags and cache['sync_token'] and (tags['sync_token'] == cache['sync_token']
+                                         or tags['ctag'] and tags['ctag'] == cache.get('ctag')):
+        log_debug("CalDAV collection unchanged, skipping sync")
+        trace_count('unchanged_collections')
+        return cache
+    objects = cache['objects']
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/xml; charset=utf-8',
+    }
+    
+    while True:
+        sync_token = cache['sync_token'] or ''
+        sync_body = f'''<?xml version="1.0" encoding="utf-8" ?>
+<d:sync-collection xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">
+<d:sync-token>{escape(sync_token)}</d:sync-token><d:sync-level>1</d:sync-level>
+<d:prop><d:getetag/><c:calendar-data/></d:prop></d:sync-collection>'''
+        response = session.request('REPORT', caldav_url, headers=headers, data=sync_body, stream=True)
+        with response:
+            if response.status_code in [401, 404]:
+                # Not a sync problem: bad credentials, or no such calendar
+                raise CalDAVRequestError(f"CalDAV sync failed with status {response.status_code}",
+                                         response.status_code)
+            if response.status_code not in [200, 207]:
+                if sync_token and 400 <= response.status_code < 500:
+                    # The server no longer knows our token (valid-sync-token)
+                    log_debug("sync-token rejected (%s), doing a full resync", response.status_code)
+                    cache['sync_token'] = None
+                    objects.clear()
+                    continue
+                if not sync_token and response.status_code in [400, 403, 405, 415, 501]:
+                    cache['sync_unsupported'] = True
+                    save_caldav_cache(cache)
+                    raise CalDAVSyncUnsupported(f"sync-collection failed with status {response.status_code}")
+                raise CalDAVRequestError(f"CalDAV sync failed with status {response.status_code}",
+                                         response.status_code)
+            
+            extra = {}
+            truncated = False
+            changed = 0
+            for href, status, props in iter_multistatus_responses(
+                    response.iter_content(chunk_size=65536), extra):
+                if status and ' 507' in status:
+                    # The server truncated the result set; ask again from the new token
+                    truncated = True
+                elif status and ' 404' in status:
+                    objects.pop(href, None)
+                    changed += 1
+                elif CALDAV_CALENDAR_DATA in props:
+                    objects[href] = {'etag': props.get('{DAV:}getetag'), 'data': props[CALDAV_CALENDAR_DATA]}
+                    changed += 1
+        cache['sync_token'] = extra.get('{DAV:}sync-token') or cache['sync_token']
+        log_debug("CalDAV sync: %s changed, %s cached objects", changed, len(objects))
+        if tags and tags['ctag'] != cache.get('ctag'):
+            # Read before this sync, so at worst the next refresh syncs once more
+            cache['ctag'] = tags['ctag']
+            changed += 1
+        if changed or not sync_token:
+            save_caldav_cache(cache)
+        if not truncated:
+            return cache
+
+def caldav_report(session, caldav_url, access_token, body):
+    """Send a Depth: 1 REPORT and yield its responses as (href, status, props) tuples"""
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/xml; charset=utf-8',
+        'Depth': '1'
+    }
+    response = session.request('REPORT', caldav_url, headers=headers, data=body, stream=True)
+    with response:
+        if response.status_code not in [200, 207]:
+            raise CalDAVRequestError(f"CalDAV REPORT failed with status {response.status_code}",
+                                     response.status_code)
+        yield from iter_multistatus_responses(response.iter_content(chunk_size=65536))
+
+def query_caldav_objects(session, caldav_url, access_token, window_start, window_end, calendar_data=False):
+    """Yield (href, etag, calendar data or None) of the objects of a collection in a window.
+
+    Without calendar_data, the time-range calendar-query costs a few dozen
+    bytes per object, however large the objects are.
+    """
+    body = f'''<?xml version="1.0" encoding="utf-8" ?>
+<c:calendar-query xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">
+<d:prop><d:getetag/>{'<c:calendar-data/>' if calendar_data else ''}</d:prop>
+<c:filter><c:comp-filter name="VCALENDAR">
+<c:comp-filter name="VEVENT">
+<c:time-range start="{window_start.strftime('%Y%m%dT%H%M%SZ')}" end="{window_end.strftime('%Y%m%dT%H%M%SZ')}"/>
+</c:comp-filter></c:comp-filter></c:filter></c:calendar-query>'''
+    for href, status, props in caldav_report(session, caldav_url, access_token, body):
+        if href and not (status and ' 404' in status):
+            yield href, props.get('{DAV:}getetag'), props.get(CALDAV_CALENDAR_DATA)
+
+def multiget_caldav_objects(session, caldav_url, access_token, hrefs):
+    """Yield (href, etag, calendar data) of the given objects of a collection.
+
+    Objects are fetched with calendar-multiget REPORTs of at most
+    CALDAV_MULTIGET_BATCH hrefs each, so no single response grows with the
+    size of the calendar. Yielded hrefs are the requested ones, whatever
+    quoting the server uses in its responses.
+    """
+    from xml.sax.saxutils import escape
+    for start in range(0, len(hrefs), CALDAV_MULTIGET_BATCH):
+        batch = {urllib.parse.unquote(href): href for href in hrefs[start:start + CALDAV_MULTIGET_BATCH]}
+        body = ('<?xml version="1.0" encoding="utf-8" ?>\n'
+                '<c:calendar-multiget xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">\n'
+                '<d:prop><d:getetag/><c:calendar-data/></d:prop>\n'
+                + ''.join(f'<d:href>{escape(urllib.parse.quote(href))}</d:href>' for href in batch.values())
+                + '</c:calendar-multiget>')
+        for href, _, props in caldav_report(session, caldav_url, access_token, body):
+            href = batch.get(urllib.parse.unquote(href or ''))
+            if href and CALDAV_CALENDAR_DATA in props:
+                yield href, props.get('{DAV:}getetag'), props[CALDAV_CALENDAR_DATA]
+
+def refresh_caldav_objects(session, caldav_url, access_token, window_start, window_end, tags=None):
+    """Bring the cache of a collection without sync-collection up to date and return it.
+
+    The hrefs and ETags of the objects in the window are compared with the
+    cache, and only new or changed objects are downloaded, with
+    calendar-multiget (see multiget_caldav_objects); objects no longer
+    listed are dropped, so the cache holds the window's objects. An empty
+    cache is filled by one calendar-query with calendar-data. If tags
+    (see fetch_collection_tags) show the same getctag as the last refresh
+    and its window covers this one, the cache is returned without a
+    request.
+    
+    The window is widened to whole UTC days, as the widget's starts at the
+    current time and so moves on every refresh; the caller still filters
+    the events by the exact window.
+    """
+    cache = load_caldav_cache(caldav_url)
+    objects = cache['objects']
+    window_start = window_start.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window_end.time() != datetime.min.time():
+        window_end = window_end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    window = [window_start.isoformat(), window_end.isoformat()]
+    cached_window = cache.get('window')
+    covered = bool(cached_window) and cached_window[0] <= window[0] and window[1] <= cached_window[1]
+    if covered and tags and tags['ctag'] and tags['ctag'] == cache.get('ctag'):
+        log_debug("CalDAV collection unchanged, skipping ETag check")
+        trace_count('unchanged_collections')
+        return cache
+    
+    fetched, removed = 0, []
+    if not objects:
+        for href, etag, data in query_caldav_objects(session, caldav_url, access_token, window_start, window_end,
+                                                     calendar_data=True):
+            if data is not None:
+                objects[href] = {'etag': etag, 'data': data}
+                fetched += 1
+    else:
+        etags = {href: etag for href, etag, _ in
+                 query_caldav_objects(session, caldav_url, access_token, window_start, window_end)}
+        removed = [href for href in objects if href not in etags]
+        for href in removed:
+            del objects[href]
+        # Objects without an ETag cannot be compared, so they are always fetched
+        wanted = [href for href, etag in etags.items()
+                  if etag is None or href not in objects or objects[href]['etag'] != etag]
+        for href, etag, data in multiget_caldav_objects(session, caldav_url, access_token, wanted):
+            objects[href] = {'etag': etag, 'data': data}
+            fetched += 1
+    log_debug("CalDAV ETag check: %s fetched, %s removed, %s cached objects", fetched, len(removed), len(objects))
+    
+    changed = fetched or removed or cached_window != window
+    if tags and tags['ctag'] != cache.get('ctag'):
+        # Read before this refresh, so at worst the next one checks once more
+        cache['ctag'] = tags['ctag']
+        changed = True
+    cache['window'] = window
+    if changed:
+        save_caldav_cache(cache)
+    return cache
+
+def iter_cached_calendars(cache):
+    """Yield the parsed VCALENDARs of every object in a collection cache.
+
+    Objects are parsed once per ETag and kept in memory, so a long-lived
+    helper only parses what changed since the previous refresh.
+    """
+    previous = _parsed_caldav_objects.get(cache['url'], {})
+    parsed = {}
+    for href, obj in cache['objects'].items():
+        entry = previous.get(href)
+        if entry is None or entry[0] != obj['etag'] or obj['etag'] is None:
+            entry = (obj['etag'], parse_ical(obj['data']))
+            trace_count('parsed_objects')
+        parsed[href] = entry
+        yield from entry[1]
+    _parsed_caldav_objects[cache['url']] = parsed
+
+GOOGLE_EVENTS_URL = "https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events"
+GOOGLE_STORE_VERSION = 1
+# Fields of a Google event kept in the local store
+GOOGLE_EVENT_FIELDS = ('id', 'etag', 'status', 'summary', 'location', 'description', 'start', 'end',
+                       'recurrence', 'recurringEventId', 'originalStartTime', 'iCalUID')
+
+# VEVENTs built from stored Google events, kept between refreshes in
+# --serve mode: {calendar_id: {event id: (etag, VEVENT)}}
+_google_vevents = {}
+
+
+def google_store_file(calendar_id):
+    """Path of the local event store of a Google calendar"""
+    import hashlib
+    return google_cache_dir / (hashlib.sha1(calendar_id.encode('utf-8')).hexdigest() + '.json')
+
+def load_google_store(calendar_id):
+    """Load the event store of a Google calendar, or return an empty one.
+
+    The store holds the calendar's nextSyncToken and {event id: event} for
+    every event, with recurring events unexpanded.
+    """
+    store = read_cache_file(google_store_file(calendar_id))
+    if store and store.get('version') == GOOGLE_STORE_VERSION and store.get('calendar_id') == calendar_id:
+        return store
+    return {'version': GOOGLE_STORE_VERSION, 'calendar_id': calendar_id, 'sync_token': None, 'events': {}}
+
+def sync_google_events(session, calendar_id, access_token):
+    """Bring the event store of a Google calendar up to date and return it.
+
+    The first sync pages through the whole calendar; later ones pass the
+    stored nextSyncToken and only receive what changed since, so a repeat
+    refresh is one small request. A 410 Gone means the token expired and
+    starts a full sync again.
+    """
+    store = load_google_store(calendar_id)
+    events = store['events']
+    url = GOOGLE_EVENTS_URL.format(calendar_id=urllib.parse.quote(calendar_id, safe=''))
+    headers = {'Authorization': f'Bearer {access_token}'}
+    params = {
+        'maxResults': 2500,
+        # Recurring events are expanded locally, for any window
+        'singleEvents': 'false',
+        'fields': 'nextPageToken,nextSyncToken,items(' + ','.join(GOOGLE_EVENT_FIELDS) + ')',
+    }
+    if store['sync_token']:
+        params['syncToken'] = store['sync_token']
+    
+    changed = 0
+    page_token = None
+    while True:
+        page_params = dict(params, pageToken=page_token) if page_token else params
+        response = session.get(url, headers=headers, params=page_params)
+        if response.status_code == 410 and 'syncToken' in params:
+            log_debug("Google sync token expired, doing a full sync")
+            del params['syncToken']
+            events.clear()
+            page_token = None
+            continue
+        if response.status_code == 401:
+            raise HelperError("Google Calendar returned 401: access token expired")
+        if response.status_code != 200:
+            raise HelperError(f"Google Calendar request failed with status {response.status_code}: "
+                              f"{mask_secrets(response.text[:200])}")
+        
+        data = response.json()
+        for item in data.get('items', []):
+            changed += 1
+            if item.get('status') == 'cancelled' and not item.get('recurringEventId'):
+                # A deleted event; its modified instances go with it
+                events.pop(item['id'], None)
+                for event_id in [i for i, e in events.items() if e.get('recurringEventId') == item['id']]:
+                    del events[event_id]
+            else:
+                # Cancelled instances of recurring events are kept: they hide an occurrence
+                events[item['id']] = item
+        page_token = data.get('nextPageToken')
+        if not page_token:
+            store['sync_token'] = data.get('nextSyncToken')
+            break
+    
+    log_debug("Google sync: %s changed, %s stored events", changed, len(events))
+    if changed or 'syncToken' not in params:
+        write_cache_file(google_store_file(calendar_id), store)
+    return store
+
+def _google_time_property(value, default_tzid=None):
+    """iCalendar property remainder for a Google start/end/originalStartTime"""
+    if 'date' in value:
+        return ';VALUE=DATE:' + value['date'].replace('-', '')
+    dt = parse_iso_datetime(value['dateTime'])
+    tzid = value.get('timeZone') or default_tzid
+    tz = resolve_ical_timezone(tzid, {}) if tzid else None
+    if tz is None:
+        return ':' + dt.strftime('%Y%m%dT%H%M%SZ')
+    if any(c in tzid for c in ':;,'):
+        tzid = f'"{tzid}"'
+    return f';TZID={tzid}:' + dt.astimezone(tz).strftime('%Y%m%dT%H%M%S')
+
+def google_event_to_vevent(item, uid=None):
+    """Build a VEVENT from a Google Calendar event.
+
+    Google events then share the iCalendar pipeline: recurrence expansion,
+    overrides (recurringEventId/originalStartTime become RECURRENCE-ID) and
+    normalized output. uid overrides the event's iCalUID, which cancelled
+    instances do not carry.
+    """
+    vevent = ICalComponent('VEVENT')
+    properties = vevent.properties
+    properties['UID'] = [':' + (uid or item.get('iCalUID') or item['id'])]
+    for key, name in (('summary', 'SUMMARY'), ('location', 'LOCATION'), ('description', 'DESCRIPTION')):
+        if item.get(key):
+            properties[name] = [':' + escape_ical_text(item[key])]
+    if item.get('status'):
+        properties['STATUS'] = [':' + item['status'].upper()]
+    start_tzid = None
+    if item.get('start'):
+        start_tzid = item['start'].get('timeZone')
+        properties['DTSTART'] = [_google_time_property(item['start'])]
+    if item.get('end'):
+        properties['DTEND'] = [_google_time_property(item['end'], start_tzid)]
+    if item.get('originalStartTime'):
+        properties['RECURRENCE-ID'] = [_google_time_property(item['originalStartTime'], start_tzid)]
+    for line in item.get('recurrence', ()):
+        # e.g. "RRULE:FREQ=WEEKLY;BYDAY=MO" or "EXDATE;TZID=Europe/Berlin:20260105T090000"
+        cut = min(i for i in (line.find(';'), line.find(':'), len(line)) if i >= 0)
+        properties.setdefault(line[:cut].upper(), []).append(line[cut:])
+    return vevent
+
+def load_google_events(calendar_id, access_token, time_min, time_max):
+    """Sync a Google calendar and return its events in a window, sorted by start"""
+    with trace_phase('sync'):
+        store = sync_google_events(get_http_session(GOOGLE_EVENTS_URL), calendar_id, access_token)
+    
+    with trace_phase('parse'):
+        return expand_google_events(calendar_id, store, time_min, time_max)
+
+def expand_google_events(calendar_id, store, time_min, time_max):
+    """Convert the events of a Google calendar store and expand them in a window"""
+    previous = _google_vevents.get(calendar_id, {})
+    vevents = {}
+    for event_id, item in store['events'].items():
+        entry = previous.get(event_id)
+        if entry is None or entry[0] != item.get('etag') or entry[0] is None:
+            # Instances must share the UID of their recurring event
+            master = store['events'].get(item.get('recurringEventId'), {})
+            entry = (item.get('etag'), google_event_to_vevent(item, master.get('iCalUID')))
+        vevents[event_id] = entry
+    _google_vevents[calendar_id] = vevents
+    
+    calendar = ICalComponent('VCALENDAR')
+    calendar.components = [entry[1] for entry in vevents.values()]
+    events = iter_calendar_events([calendar], parse_iso_datetime(time_min), parse_iso_datetime(time_max))
+    return sorted(events, key=lambda event: event['start_ms'])
+
+def fetch_google_events(calendar_id, access_token, time_min, time_max):
+    """Sync a Google calendar and print its events in a window as JSON"""
+    try:
+        events = load_google_events(calendar_id, access_token, time_min, time_max)
+    except HelperError as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        sys.exit(1)
+    except Exception as e:
+        sys.stderr.write(f"ERROR: Google Calendar request failed: {e}\n")
+        sys.exit(1)
+    print(dump_json({'items': events}))
+
+def load_calendar_events(calendar, time_min, time_max, collection_tags=None):
+    """Fetch one calendar of a multi-calendar request, sorted by start.
+
+    calendar is {"provider", "calendar_id", "access_token"}, plus
+    "server_url" for Nextcloud.
+    """
+    if calendar.get('provider', 'google') == 'google':
+        events = load_google_events(calendar['calendar_id'], calendar['access_token'], time_min, time_max)
+    else:
+        events = load_caldav_events(calendar['server_url'], calendar['calendar_id'], calendar['access_token'],
+                                    time_min, time_max, collection_tags)
+        events.sort(key=lambda event: event['start_ms'])
+    for event in events:
+        event['calendar_id'] = calendar['calendar_id']
+    trace_count('events', len(events))
+    return events
+
+def load_collection_tags(calendars):
+    """Fetch the collection tags of the Nextcloud calendars of a multi-calendar request.
+
+    Calendars in the same calendar home are checked with one PROPFIND on
+    the home (see fetch_collection_tags), so a refresh in which nothing
+    changed is one request instead of one per calendar. Calendars not
+    cached yet are checked too, so the tags their first sync stores let
+    the next refresh skip them. A calendar alone in its home is only
+    checked if its server lacks sync-collection, where the PROPFIND saves
+    an ETag listing. Returns {unquoted collection URL: tags}; on any error
+    the calendars are left to sync one by one.
+    """
+    homes = {}
+    for calendar in calendars:
+        if calendar.get('provider', 'google') == 'google':
+            continue
+        try:
+            session = get_http_session(calendar['server_url'])
+            caldav_url, _ = resolve_caldav_url(session, calendar['server_url'], calendar['calendar_id'],
+                                               calendar['access_token'])
+        except Exception as e:
+            log_debug("Could not resolve calendar %s: %s", calendar['calendar_id'], e)
+            continue
+        home_url = caldav_url.rstrip('/').rsplit('/', 1)[0] + '/'
+        homes.setdefault(home_url, (session, calendar['access_token'], []))[2].append(load_caldav_cache(caldav_url))
+    
+    collection_tags = {}
+    for home_url, (session, access_token, caches) in homes.items():
+        if len(caches) < 2 and not caches[0].get('window'):
+            # One sync-collection REPORT is as cheap as the PROPFIND
+            continue
+        try:
+            with trace_phase('sync'):
+                collection_tags.update(fetch_collection_tags(session, home_url, access_token))
+        except Exception as e:
+            log_debug("Checking the collections of %s failed: %s", home_url, e)
+    return collection_tags
+
+def load_calendars_events(calendars, time_min, time_max, max_workers=8):
+    """Fetch several calendars concurrently and merge their events.
+
+    Each calendar is fetched on its own thread, so the total latency is
+    close to that of the slowest calendar rather than the sum. The sorted
+    per-calendar lists are merged with a k-way heap merge, and an event
+    present in several calendars (e.g. a meeting in a shared calendar) is
+    kept once. Returns (events sorted by start, {calendar_id: error}).
+    """
+    import heapq
+    from concurrent.futures import ThreadPoolExecutor
+    if not calendars:
+        return [], {}
+    collection_tags = load_collection_tags(calendars)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calendars))) as pool:
+        # copy_context() carries the trace of this call into the threads
+        futures = [pool.submit(contextvars.copy_context().run, load_calendar_events, calendar, time_min, time_max,
+                               collection_tags)
+                   for calendar in calendars]
+    
+    results, errors = [], {}
+    for calendar, future in zip(calendars, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            # One unreachable calendar should not hide all the others
+            log_warning("Fetching calendar %s failed: %s", calendar.get('calendar_id'), e)
+            errors[calendar.get('calendar_id', '')] = str(e)
+    
+    events, seen = [], set()
+    for event in heapq.merge(*results, key=lambda event: event['start_ms']):
+        key = (event['uid'] or event['summary'], event.get('recurrence_id') or event['start'])
+        if key not in seen:
+            seen.add(key)
+            events.append(event)
+    return events, errors
+
+def load_calendar_list_events(calendars_json, time_min, time_max):
+    """Fetch the calendars of a command line JSON list; exits if the list is bad or all of them fail"""
+    try:
+        calendars = json.loads(calendars_json)
+        events, errors = load_calendars_events(calendars, time_min, time_max)
+    except (ValueError, KeyError, TypeError) as e:
+        sys.stderr.write(f"ERROR: Invalid calendar list: {e}\n")
+        sys.exit(1)
+    if calendars and len(errors) == len(calendars):
+        sys.stderr.write(f"ERROR: All calendars failed: {'; '.join(errors.values())}\n")
+        sys.exit(1)
+    return events, errors
+
+def fetch_calendars_events(calendars_json, time_min, time_max):
+    """Fetch several calendars concurrently and print the merged events as JSON"""
+    events, errors = load_calendar_list_events(calendars_json, time_min, time_max)
+    print(dump_json({'items': events, 'errors': errors}))
+
+def event_view_row(event):
+    """The row the widget shows for an event, with its date and times pre-formatted.
+
+    Times are formatted in the local timezone, like the widget would. id
+    (UID plus recurrence-id or start) is stable across refreshes.
+    """
+    row = {
+        'id': f"{event['uid'] or event['summary']}/{event.get('recurrence_id') or event['start']}",
+        'title': event['summary'] or 'No Title',
+        'location': event.get('location', ''),
+        'all_day': event['all_day'],
+        'start_ms': event['start_ms'],
+        'end_ms': event['end_ms'],
+    }
+    if event['all_day']:
+        row['date'] = event['start']
+        row['time'] = 'All day'
+    else:
+        start = datetime.fromtimestamp(event['start_ms'] / 1000)
+        end = datetime.fromtimestamp(event['end_ms'] / 1000)
+        row['date'] = start.strftime('%Y-%m-%d')
+        row['time'] = f"{start:%H:%M} - {end:%H:%M}"
+    if 'calendar_id' in event:
+        row['calendar_id'] = event['calendar_id']
+    return row
+
+def build_event_view(events):
+    """Group events sorted by start into [{date, events: [row]}], one entry per day.
+
+    The widget appends each day's rows to its model in one call, instead of
+    parsing and formatting every event on the GUI thread.
+    """
+    days, ids = [], set()
+    for event in events:
+        row = event_view_row(event)
+        if row['id'] in ids:
+            # Keep ids unique, e.g. for copies of an event without a UID
+            row['id'] += f"#{len(ids)}"
+        ids.add(row['id'])
+        if not days or days[-1]['date'] != row['date']:
+            days.append({'date': row['date'], 'events': []})
+        days[-1]['events'].append(row)
+    return days
+
+def diff_view_rows(old_rows, new_rows):
+    """List the model operations that turn old_rows into new_rows, matched by id.
+
+    The widget applies them in order to its ListModel, so unchanged rows
+    keep their delegates and the scroll position stays put. Operations:
+    {"op": "remove", "index", "count"}, {"op": "insert", "index", "rows"},
+    {"op": "move", "from", "to"} (one row) and {"op": "set", "index", "row"}.
+    """
+    new_ids = {row['id'] for row in new_rows}
+    ops = []
+    # Removals go from the end so the indices of earlier rows stay valid
+    index = len(old_rows) - 1
+    while index >= 0:
+        end = index
+        while index >= 0 and old_rows[index]['id'] not in new_ids:
+            index -= 1
+        if index < end:
+            ops.append({'op': 'remove', 'index': index + 1, 'count': end - index})
+        index -= 1
+    current = [row for row in old_rows if row['id'] in new_ids]
+    kept = {row['id'] for row in current}
+    
+    for index, row in enumerate(new_rows):
+        if index < len(current) and current[index]['id'] == row['id']:
+            if current[index] != row:
+                ops.append({'op': 'set', 'index': index, 'row': row})
+                current[index] = row
+        elif row['id'] in kept:
+            # Rows before index are settled, so the row is further down
+            source = next(i for i in range(index + 1, len(current)) if current[i]['id'] == row['id'])
+            ops.append({'op': 'move', 'from': source, 'to': index})
+            current.insert(index, current.pop(source))
+            if current[index] != row:
+                ops.append({'op': 'set', 'index': index, 'row': row})
+                current[index] = row
+        else:
+            previous = ops[-1] if ops else None
+            if previous and previous['op'] == 'insert' and previous['index'] + len(previous['rows']) == index:
+                previous['rows'].append(row)
+            else:
+                ops.append({'op': 'insert', 'index': index, 'rows': [row]})
+            current.insert(index, row)
+    return ops
+
+class EventIndex:
+    """Interval index over the events of a fetch, for overlap and free time queries.
+
+    Events are half-open [start_ms, end_ms) intervals. Cancelled and
+    all-day events are left out, as they keep no one busy. Events are
+    sorted by start, so those starting in a range are found by bisection;
+    those already running at a point in time come from a centered
+    interval tree whose nodes hold the events containing their center,
+    sorted by start and by end. Both take O(log n + k) for k results.
+    The busy time of all events is also merged into sorted, disjoint
+    intervals for free time queries.
+    """
+    
+    def __init__(self, events):
+        import bisect
+        self._bisect = bisect
+        self.events = sorted((event for event in events
+                              if not event['all_day'] and event.get('status') != 'CANCELLED'),
+                             key=lambda event: (event['start_ms'], event['end_ms']))
+        self.starts = [event['start_ms'] for event in self.events]
+        self.ends = [event['end_ms'] for event in self.events]
+        # Empty intervals contain no point in time, and would never leave the tree
+        self.tree = self._build([i for i in range(len(self.events)) if self.ends[i] > self.starts[i]])
+        
+        self.busy = []
+        for start, end in zip(self.starts, self.ends):
+            if self.busy and start <= self.busy[-1][1]:
+                self.busy[-1][1] = max(self.busy[-1][1], end)
+            elif end > start:
+                self.busy.append([start, end])
+        self.busy_starts = [start for start, _ in self.busy]
+    
+    def _build(self, indices):
+        """Build the tree node of events given by index, in start order"""
+        if not indices:
+            return None
+        # The middle event by start contains the center, so every node holds one
+        center = self.starts[indices[len(indices) // 2]]
+        here, left, right = [], [], []
+        for i in indices:
+            if self.ends[i] <= center:
+                left.append(i)
+            elif self.starts[i] > center:
+                right.append(i)
+            else:
+                here.append(i)
+        by_end = sorted(here, key=lambda i: self.ends[i], reverse=True)
+        return (center, here, by_end, self._build(left), self._build(right))
+    
+    def running_at(self, time_ms):
+        """Indices of the events with start <= time_ms < end"""
+        found = []
+        node = self.tree
+        while node:
+            center, by_start, by_end, left, right = node
+            if time_ms < center:
+                # Every event here ends after the center, so after time_ms
+                for i in by_start:
+                    if self.starts[i] > time_ms:
+                        break
+                    found.append(i)
+                node = left
+            else:
+                # Every event here starts at or before the center
+                for i in by_end:
+                    if self.ends[i] <= time_ms:
+                        break
+                    found.append(i)
+                node = right
+        return found
+    
+    def overlapping(self, start_ms, end_ms):
+        """Events overlapping [start_ms, end_ms), sorted by start"""
+        if end_ms <= start_ms:
+            indices = self.running_at(start_ms)
+        else:
+            indices = [i for i in self.running_at(start_ms) if self.starts[i] < start_ms]
+            indices.extend(range(self._bisect.bisect_left(self.starts, start_ms),
+                                 self._bisect.bisect_left(self.starts, end_ms)))
+        return [self.events[i] for i in sorted(indices)]
+    
+    def conflicts(self):
+        """Yield (first, second, overlap start, overlap end) for every pair of overlapping events.
+
+        The events overlapping one are those starting before it ends, so a
+        sweep in start order finds each pair once, in O(n log n + k).
+        """
+        for i, event in enumerate(self.events):
+            end = self.ends[i]
+            if end <= self.starts[i]:
+                continue
+            for j in range(i + 1, self._bisect.bisect_left(self.starts, end, i + 1)):
+                if self.ends[j] > self.starts[j]:
+                    yield event, self.events[j], self.starts[j], min(end, self.ends[j])
+    
+    def free_slots(self, start_ms, end_ms, duration_ms):
+        """Yield (start, end) of the gaps of at least duration_ms between busy times in a window.
+
+        Starts by bisection at the busy interval around start_ms, so asking
+        for the next free slot only looks at the intervals before it.
+        """
+        cursor = start_ms
+        index = max(self._bisect.bisect_right(self.busy_starts, start_ms) - 1, 0)
+        for busy_start, busy_end in self.busy[index:]:
+            if busy_start >= end_ms:
+                break
+            if busy_start - cursor >= duration_ms:
+                yield cursor, busy_start
+            cursor = max(cursor, busy_end)
+        if end_ms - cursor >= duration_ms:
+            yield cursor, end_ms
+
+def parse_working_hours(value):
+    """Parse "9-17" into (9, 17), local hours within which free slots are looked for"""
+    start, _, end = value.partition('-')
+    hours = (int(start), int(end))
+    if not 0 <= hours[0] < hours[1] <= 24:
+        raise ValueError(f"Invalid working hours: {value}")
+    return hours
+
+def within_working_hours(slots, duration_ms, hours):
+    """Cut free slots to local working hours, keeping the parts still long enough"""
+    for start_ms, end_ms in slots:
+        day = datetime.fromtimestamp(start_ms / 1000).date()
+        while True:
+            midnight = datetime.combine(day, datetime.min.time())
+            day_start = int((midnight + timedelta(hours=hours[0])).timestamp() * 1000)
+            if day_start >= end_ms:
+                break
+            day_end = int((midnight + timedelta(hours=hours[1])).timestamp() * 1000)
+            start, end = max(start_ms, day_start), min(end_ms, day_end)
+            if end - start >= duration_ms:
+                yield start, end
+            day += timedelta(days=1)
+
+def time_range_dict(start_ms, end_ms):
+    """A conflict or free slot as sent to the widget: ISO 8601 UTC and milliseconds"""
+    return {
+        'start': format_event_time(datetime.fromtimestamp(start_ms / 1000, timezone.utc)),
+        'end': format_event_time(datetime.fromtimestamp(end_ms / 1000, timezone.utc)),
+        'start_ms': start_ms,
+        'end_ms': end_ms,
+    }
+
+def find_conflicts(events):
+    """Return the overlapping pairs among events, as [{start, end, start_ms, end_ms, events: [row, row]}]"""
+    return [dict(time_range_dict(start_ms, end_ms), events=[event_view_row(first), event_view_row(second)])
+            for first, second, start_ms, end_ms in EventIndex(events).conflicts()]
+
+def find_free_slots(events, time_min, time_max, minutes, hours=None):
+    """Return the free slots of at least minutes in a window, as [{start, end, start_ms, end_ms}].
+
+    hours (see parse_working_hours) limits the slots to working hours.
+    """
+    duration_ms = int(minutes * 60000)
+    slots = EventIndex(events).free_slots(event_time_ms(parse_iso_datetime(time_min)),
+                                          event_time_ms(parse_iso_datetime(time_max)), duration_ms)
+    if hours:
+        slots = within_working_hours(slots, duration_ms, hours)
+    return [time_range_dict(start_ms, end_ms) for start_ms, end_ms in slots]
+
+def fetch_conflicts(calendars_json, time_min, time_max):
+    """Fetch several calendars and print their overlapping events as JSON"""
+    events, errors = load_calendar_list_events(calendars_json, time_min, time_max)
+    print(dump_json({'conflicts': find_conflicts(events), 'errors': errors}))
+
+def fetch_free_slots(calendars_json, time_min, time_max, minutes, hours=None):
+    """Fetch several calendars and print the free slots between their events as JSON"""
+    try:
+        minutes = float(minutes)
+        hours = parse_working_hours(hours) if hours else None
+    except ValueError as e:
+        sys.stderr.write(f"ERROR: Invalid free slot query: {e}\n")
+        sys.exit(1)
+    events, errors = load_calendar_list_events(calendars_json, time_min, time_max)
+    print(dump_json({'slots': find_free_slots(events, time_min, time_max, minutes, hours), 'errors': errors}))
+
+GOOGLE_TASKS_URL = "https://www.googleapis.com/tasks/v1"
+GOOGLE_TASKS_STORE_VERSION = 1
+# Fields of a Google task kept in the local store
+GOOGLE_TASK_FIELDS = ('id', 'title', 'notes', 'status', 'due', 'completed', 'updated', 'position', 'parent')
+# Tasks changed this long (seconds) before the last sync are fetched again,
+# so a skew between our clock and Google's cannot lose an update
+GOOGLE_TASKS_SKEW = 300
+
+def google_tasks_store_file(list_id):
+    """Path of the local store of a Google task list"""
+    import hashlib
+    return google_cache_dir / ('tasks-' + hashlib.sha1(list_id.encode('utf-8')).hexdigest() + '.json')
+
+def load_google_tasks_store(list_id):
+    """Load the store of a Google task list, or return an empty one.
+
+    The store holds {task id: task} and the time of the last sync, which
+    the next sync passes as updatedMin.
+    """
+    store = read_cache_file(google_tasks_store_file(list_id))
+    if store and store.get('version') == GOOGLE_TASKS_STORE_VERSION and store.get('list_id') == list_id:
+        return store
+    return {'version': GOOGLE_TASKS_STORE_VERSION, 'list_id': list_id, 'updated_min': None, 'tasks': {}}
+
+def google_tasks_get(session, path, access_token, params=None):
+    """GET every page of a Google Tasks collection and return all items"""
+    url = f"{GOOGLE_TASKS_URL}/{path}"
+    headers = {'Authorization': f'Bearer {access_token}'}
+    params = dict(params or {}, maxResults=100)
+    items = []
+    while True:
+        response = session.get(url, headers=headers, params=params)
+        if response.status_code == 401:
+            raise HelperError("Google Tasks returned 401: access token expired")
+        if response.status_code != 200:
+            raise HelperError(f"Google Tasks request failed with status {response.status_code}: "
+                              f"{mask_secrets(response.text[:200])}")
+        data = response.json()
+        items.extend(data.get('items', []))
+        if not data.get('nextPageToken'):
+            return items
+        params['pageToken'] = data['nextPageToken']
+
+def sync_google_tasks(session, list_id, access_token):
+    """Bring the store of a Google task list up to date and return it.
+
+    The first sync pages through the whole list. Later ones ask only for
+    tasks updated since the previous sync (updatedMin), including deleted
+    and hidden ones so they can be dropped from the store.
+    """
+    store = load_google_tasks_store(list_id)
+    tasks = store['tasks']
+    params = {'fields': 'nextPageToken,items(' + ','.join(GOOGLE_TASK_FIELDS + ('deleted', 'hidden')) + ')'}
+    if store['updated_min']:
+        params.update(updatedMin=store['updated_min'], showDeleted='true', showHidden='true')
+    
+    started = datetime.now(timezone.utc)
+    items = google_tasks_get(session, f"lists/{urllib.parse.quote(list_id, safe='')}/tasks",
+                             access_token, params)
+    for item in items:
+        if item.get('deleted') or item.get('hidden'):
+            tasks.pop(item['id'], None)
+        else:
+            tasks[item['id']] = {key: item[key] for key in GOOGLE_TASK_FIELDS if key in item}
+    # Edits not sent yet stay applied over what Google returned
+    for op in load_task_queue()['ops']:
+        if op['list_id'] == list_id:
+            apply_task_op(tasks, op)
+    
+    log_debug("Google Tasks sync of %s: %s changed, %s stored tasks", list_id, len(items), len(tasks))
+    store['updated_min'] = (started - timedelta(seconds=GOOGLE_TASKS_SKEW)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    write_cache_file(google_tasks_store_file(list_id), store)
+    return store
+
+GOOGLE_TASKS_BATCH_URL = "https://www.googleapis.com/batch/tasks/v1"
+# Task edits are sent this long (seconds) after the last one, so a burst of
+# edits goes out as one batch request of at most TASKS_BATCH_SIZE edits
+TASKS_FLUSH_DELAY = 2
+TASKS_BATCH_SIZE = 100
+# Backoff of a failed flush: TASKS_RETRY_BASE * 2^attempts, capped
+TASKS_RETRY_BASE = 15
+TASKS_RETRY_MAX = 3600
+# Statuses after which a task edit can never succeed, unless the error
+# reason is one of GOOGLE_QUOTA_REASONS; any other error is retried
+TASKS_PERMANENT_STATUSES = (400, 404, 409, 410)
+# Google reports exhausted quotas as 403 (or 429) with one of these reasons
+GOOGLE_QUOTA_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded', 'dailyLimitExceeded'}
+
+# Serializes queue updates and flushes within the process; locked_file()
+# does the same across processes
+_task_queue_lock = threading.RLock()
+_task_flush_timer = None
+
+def load_task_queue():
+    """Load the pending task edits, or return an empty queue.
+
+    The queue holds "ops" ({op, list_id, task_id, fields}, at most one per
+    task), "id_map" from the temporary ids of inserted tasks to the ids
+    Google gave them, and the backoff state of the last failed flush.
+    """
+    try:
+        with open(google_tasks_queue_file, 'r') as f:
+            queue = json.load(f)
+        if queue.get('version') == GOOGLE_TASKS_STORE_VERSION:
+            return queue
+    except (OSError, ValueError):
+        pass
+    return {'version': GOOGLE_TASKS_STORE_VERSION, 'ops': [], 'id_map': {}, 'attempts': 0, 'next_attempt': 0}
+
+def coalesce_task_op(ops, op):
+    """Add op to the pending ops, merging it with a pending edit of the same task"""
+    for i, pending in enumerate(ops):
+        if pending['list_id'] != op['list_id'] or pending['task_id'] != op['task_id']:
+            continue
+        if op['op'] == 'delete':
+            if pending['op'] == 'insert':
+                # The task never reached Google
+                del ops[i]
+            else:
+                ops[i] = op
+        elif pending['op'] != 'delete':
+            pending['fields'].update(op['fields'])
+        return
+    ops.append(op)
+
+def apply_task_op(tasks, op):
+    """Apply an edit to a task list store ahead of Google (optimistic update)"""
+    if op['op'] == 'delete':
+        tasks.pop(op['task_id'], None)
+        return
+    # Google puts new tasks first
+    task = tasks.setdefault(op['task_id'], {'id': op['task_id'], 'status': 'needsAction', 'position': ''})
+    for key, value in op['fields'].items():
+        if value is None:
+            task.pop(key, None)
+        else:
+            task[key] = value
+
+def list_tasks(list_id, tasks):
+    """Tasks of a list in position order, each carrying its list_id"""
+    return [dict(task, list_id=list_id) for task in sorted(tasks.values(), key=lambda task: task.get('position', ''))]
+
+def queue_task_op(params):
+    """Queue a task edit and apply it to the local store right away.
+
+    params holds op ("insert", "update" or "delete"), list_id, task_id
+    (a temporary one is made up for inserts) and fields, e.g. {"status":
+    "completed"}. Returns the list's tasks with the edit applied and the
+    number of edits waiting for flush_task_queue().
+    """
+    import secrets
+    if params.get('op') not in ('insert', 'update', 'delete'):
+        raise HelperError(f"Unknown task operation: {params.get('op')}")
+    list_id = params['list_id']
+    op = {'op': params['op'], 'list_id': list_id, 'fields': dict(params.get('fields') or {}),
+          'task_id': params.get('task_id') or 'local-' + secrets.token_hex(8)}
+    
+    with _task_queue_lock, locked_file(google_tasks_queue_file):
+        queue = load_task_queue()
+        # The widget may still know an inserted task by its temporary id
+        op['task_id'] = queue['id_map'].get(op['task_id'], op['task_id'])
+        coalesce_task_op(queue['ops'], op)
+        write_json_file(google_tasks_queue_file, queue)
+        
+        store = load_google_tasks_store(list_id)
+        apply_task_op(store['tasks'], op)
+        write_cache_file(google_tasks_store_file(list_id), store)
+    return {'items': list_tasks(list_id, store['tasks']), 'pending': len(queue['ops'])}
+
+def send_task_batch(session, access_token, ops):
+    """Send task edits as one multipart/mixed batch request.
+
+    Returns a (status, body) pair per op, in order.
+    """
+    import secrets
+    boundary = 'kagenda_' + secrets.token_hex(8)
+    parts = []
+    for i, op in enumerate(ops):
+        path = f"/tasks/v1/lists/{urllib.parse.quote(op['list_id'], safe='')}/tasks"
+        if op['op'] == 'insert':
+            method, body = 'POST', op['fields']
+        else:
+            path += '/' + urllib.parse.quote(op['task_id'], safe='')
+            method, body = ('PATCH', op['fields']) if op['op'] == 'update' else ('DELETE', None)
+        part = [f"--{boundary}", "Content-Type: application/http", f"Content-ID: <item{i}>", "",
+                f"{method} {path} HTTP/1.1"]
+        if body is not None:
+            part += ["Content-Type: application/json", "", json.dumps(body, separators=(',', ':'))]
+        else:
+            part += [""]
+        parts.append("\r\n".join(part))
+    payload = "\r\n".join(parts) + f"\r\n--{boundary}--\r\n"
+    
+    response = session.post(GOOGLE_TASKS_BATCH_URL, data=payload.encode('utf-8'), headers={
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': f'multipart/mixed; boundary={boundary}',
+    })
+    if response.status_code == 401:
+        raise HelperError("Google Tasks returned 401: access token expired")
+    if response.status_code != 200:
+        raise HelperError(f"Google Tasks batch request failed with status {response.status_code}: "
+                          f"{mask_secrets(response.text[:200])}")
+    return parse_batch_response(response.headers.get('Content-Type', ''), response.content, len(ops))
+
+def parse_batch_response(content_type, content, count):
+    """Split a multipart/mixed batch response into (status, body) per request.
+
+    Parts are matched to the requests by their Content-ID; a request left
+    without an answer gets status 0, so it is retried.
+    """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise HelperError("Google Tasks batch response has no boundary")
+    results = [(0, None)] * count
+    for part in content.split(b'--' + match.group(1).encode()):
+        head, sep, rest = part.replace(b'\r\n', b'\n').partition(b'\n\n')
+        content_id = re.search(rb'content-id:\s*<response-item(\d+)>', head, re.IGNORECASE)
+        if not sep or not content_id or int(content_id.group(1)) >= count:
+            continue
+        # The part holds a whole HTTP response: status line, headers, body
+        status_line, _, rest = rest.lstrip(b'\n').partition(b'\n')
+        _, _, body = rest.partition(b'\n\n')
+        fields = status_line.split()
+        try:
+            body = json.loads(body) if body.strip() else None
+        except ValueError:
+            body = None
+        status = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 0
+        results[int(content_id.group(1))] = (status, body)
+    return results
+
+def google_error_reasons(body):
+    """Return the set of error reasons in a Google API error body, e.g. {"rateLimitExceeded"}"""
+    error = body.get('error') if isinstance(body, dict) else None
+    if not isinstance(error, dict):
+        return set()
+    return {item.get('reason') for item in error.get('errors') or () if isinstance(item, dict)} - {None}
+
+def flush_task_queue(access_token=None, force=False):
+    """Send the pending task edits to Google in batch requests.
+
+    Edits that succeed, or can never succeed (e.g. the task was deleted
+    elsewhere, see TASKS_PERMANENT_STATUSES), leave the queue. On any other
+    error, including a network error and an exhausted quota, the remaining
+    edits stay queued, on disk, and the next attempt is backed off
+    exponentially unless force is set. Returns the number of pending edits.
+    """
+    with _task_queue_lock, locked_file(google_tasks_queue_file):
+        queue = load_task_queue()
+        if not queue['ops'] or (not force and time.time() < queue['next_attempt']):
+            return len(queue['ops'])
+        
+        token = current_access_token(access_token or read_config().get('access_token', ''))
+        session = get_http_session(GOOGLE_TASKS_BATCH_URL)
+        stores = {}
+        try:
+            while queue['ops']:
+                ops = queue['ops'][:TASKS_BATCH_SIZE]
+                results = send_task_batch(session, token, ops)
+                retry = []
+                for op, (status, body) in zip(ops, results):
+                    permanent = (status in TASKS_PERMANENT_STATUSES
+                                 and not google_error_reasons(body) & GOOGLE_QUOTA_REASONS)
+                    if (status == 0 or status >= 400) and not permanent:
+                        retry.append(op)
+                        continue
+                    store = stores.get(op['list_id']) or stores.setdefault(
+                        op['list_id'], load_google_tasks_store(op['list_id']))
+                    if permanent:
+                        # Undo the optimistic edit: the next sync fetches the
+                        # whole list again and restores what Google has
+                        log_warning("Dropping task %s of %s: status %s", op['op'], op['task_id'], status)
+                        store['tasks'].pop(op['task_id'], None)
+                        store['updated_min'] = None
+                        continue
+                    if op['op'] == 'insert' and body:
+                        queue['id_map'][op['task_id']] = body['id']
+                        store['tasks'].pop(op['task_id'], None)
+                    if op['op'] != 'delete' and body:
+                        store['tasks'][body['id']] = {key: body[key] for key in GOOGLE_TASK_FIELDS if key in body}
+                queue['ops'] = retry + queue['ops'][len(ops):]
+                if retry:
+                    raise HelperError(f"{len(retry)} task edits have to be retried")
+            queue['attempts'], queue['next_attempt'] = 0, 0
+        except Exception as e:
+            queue['attempts'] += 1
+            queue['next_attempt'] = time.time() + min(TASKS_RETRY_BASE * 2 ** queue['attempts'], TASKS_RETRY_MAX)
+            log_warning("Sending task edits failed (attempt %s): %s", queue['attempts'], e)
+        finally:
+            # Only the latest temporary ids can still be in use by the widget
+            queue['id_map'] = dict(list(queue['id_map'].items())[-200:])
+            write_json_file(google_tasks_queue_file, queue)
+            for list_id, store in stores.items():
+                write_cache_file(google_tasks_store_file(list_id), store)
+        return len(queue['ops'])
+
+def schedule_task_flush(delay, access_token=None):
+    """Flush the task queue after delay seconds, replacing an earlier schedule.
+
+    Used by --serve, where edits that could not be sent are retried when
+    their backoff expires.
+    """
+    global _task_flush_timer
+    
+    def run():
+        if flush_task_queue(access_token):
+            schedule_task_flush(max(load_task_queue()['next_attempt'] - time.time(), TASKS_FLUSH_DELAY), access_token)
+    
+    with _task_queue_lock:
+        if _task_flush_timer is not None:
+            _task_flush_timer.cancel()
+        _task_flush_timer = threading.Timer(delay, run)
+        _task_flush_timer.daemon = True
+        _task_flush_timer.start()
+
+def load_google_tasks(access_token, max_workers=8):
+    """Fetch all Google task lists and their tasks in one go.
+
+    The lists are fetched first, then every list is synced on its own
+    thread. Returns {"lists": [...], "items": [...], "errors": {...}}:
+    the lists in Google's order, and the tasks of all lists, each carrying
+    its list_id, in list order and by position within a list.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    # Send pending edits first, so the sync already sees them
+    flush_task_queue(access_token)
+    session = get_http_session(GOOGLE_TASKS_URL)
+    lists = google_tasks_get(session, 'users/@me/lists', access_token, {'fields': 'nextPageToken,items(id,title,updated)'})
+    
+    results, errors = {}, {}
+    if lists:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(lists))) as pool:
+            # copy_context() carries the trace of this call into the threads
+            futures = [(task_list, pool.submit(contextvars.copy_context().run, sync_google_tasks,
+                                               session, task_list['id'], access_token))
+                       for task_list in lists]
+        for task_list, future in futures:
+            try:
+                results[task_list['id']] = future.result()['tasks']
+                trace_count('tasks', len(results[task_list['id']]))
+            except Exception as e:
+                log_warning("Fetching task list %s failed: %s", task_list.get('title'), e)
+                errors[task_list['id']] = str(e)
+        if len(errors) == len(lists):
+            raise HelperError(f"All task lists failed: {'; '.join(errors.values())}")
+    
+    items = []
+    for task_list in lists:
+        items.extend(list_tasks(task_list['id'], results.get(task_list['id'], {})))
+    return {'lists': lists, 'items': items, 'errors': errors}
+
+def fetch_google_tasks(access_token):
+    """Fetch all Google task lists and their tasks and print them as JSON"""
+    try:
+        result = load_google_tasks(access_token)
+    except HelperError as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        sys.exit(1)
+    except Exception as e:
+        sys.stderr.write(f"ERROR: Google Tasks request failed: {e}\n")
+        sys.exit(1)
+    print(dump_json(result))
+
+def queue_google_task_op(op_json):
+    """Queue a task edit, send the queue right away and print the list as JSON"""
+    try:
+        result = queue_task_op(json.loads(op_json))
+        result['pending'] = flush_task_queue(force=True)
+    except (ValueError, KeyError, TypeError) as e:
+        sys.stderr.write(f"ERROR: Invalid task operation: {e}\n")
+        sys.exit(1)
+    except HelperError as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        sys.exit(1)
+    print(dump_json(result))
+
+def fetch_caldav_events(server_url, calendar_id, access_token, time_min, time_max, stream=False):
+    """Fetch calendar events using CalDAV REPORT and print them as JSON.
+
+    With stream set, each event is printed as one line of JSON (NDJSON) as
+    soon as it has been parsed, while the rest of the response downloads.
+    """
+    try:
+        if stream:
+            for event in iter_caldav_events(server_url, calendar_id, access_token, time_min, time_max):
+                sys.stdout.write(json.dumps(event, indent=None, separators=(',', ':')) + '\n')
+                sys.stdout.flush()
+            return
+        events = load_caldav_events(server_url, calendar_id, access_token, time_min, time_max)
+    except HelperError as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        sys.exit(1)
+    except Exception as e:
+        sys.stderr.write(f"ERROR: CalDAV request failed: {e}\n")
+        sys.exit(1)
+    
+    # Convert to JSON format
+    result = {'items': events}
+    print(dump_json(result))
+
+# Access tokens replaced by a refresh, mapped to their replacement
+_replaced_tokens = {}
+
+def helper_refresh_token(params):
+    """Return a fresh access token for the configured provider.
+
+    The stored token is returned as is while it stays valid for more than
+    TOKEN_REFRESH_MARGIN, unless force is set or it is the rejected_token a
+    server has just answered 401 to. Otherwise it is refreshed and saved to
+    config, and requests still carrying the old token are given the new one
+    (see current_access_token()).
+    """
+    provider = params.get('provider', 'google')
+    # Refreshes are serialized across threads and processes: Nextcloud rotates
+    # refresh tokens, so a concurrent refresh would use an already spent one
+    with trace_phase('token'), locked_file(token_file if provider == 'google' else nextcloud_token_file):
+        token_data, access_token, expires_at = load_stored_token(provider)
+        if (access_token and not params.get('force') and access_token != params.get('rejected_token')
+                and expires_at and expires_at > time.time() + TOKEN_REFRESH_MARGIN):
+            return {'access_token': access_token, 'expires_at': expires_at, 'refreshed': False}
+        
+        if provider == 'google':
+            refresh_google_token(token_data)
+        else:
+            # The login saves the client credentials with the token; the widget
+            # may pass its configured ones, and tokens saved by older versions
+            # fall back to nextcloud_credentials.json
+            nc_creds = {}
+            if nextcloud_credentials_file.exists():
+                try:
+                    with open(nextcloud_credentials_file, 'r') as f:
+                        nc_creds = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    pass
+            
+            def credential(name):
+                return params.get(name) or token_data.get(name) or nc_creds.get(name)
+            
+            server_url = credential('server_url') or ''
+            token_endpoint = credential('token_endpoint') or f"{server_url.rstrip('/')}/index.php/apps/oauth2/api/v1/token"
+            client_id = credential('client_id')
+            client_secret = credential('client_secret')
+            
+            if not (token_data.get('refresh_token') and client_id and client_secret):
+                raise HelperError("Cannot refresh Nextcloud token without refresh token and client credentials")
+            if not refresh_nextcloud_token(token_endpoint, client_id, client_secret, token_data['refresh_token']):
+                raise HelperError("Nextcloud token refresh failed, please authenticate")
+        
+        _, new_token, expires_at = load_stored_token(provider)
+        if access_token and access_token != new_token:
+            _replaced_tokens[access_token] = new_token
+        update_config({'access_token': new_token})
+    return {'access_token': new_token, 'expires_at': expires_at, 'refreshed': True}
+
+def current_access_token(access_token):
+    """Return the token that replaced access_token in a refresh, or itself"""
+    while access_token in _replaced_tokens:
+        access_token = _replaced_tokens[access_token]
+    return access_token
+
+def refresh_access_token(provider, force=False):
+    """Print a valid access token for provider as JSON, refreshing it if needed"""
+    try:
+        result = helper_refresh_token({'provider': provider, 'force': force})
+    except HelperError as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        sys.exit(1)
+    except Exception as e:
+        sys.stderr.write(f"ERROR: Token refresh failed: {e}\n")
+        sys.exit(1)
+    print(dump_json(result))
+
+def run_token_scheduler():
+    """Refresh the configured provider's token shortly before it expires.
+
+    Runs on a daemon thread of the --serve helper, so the widget's fetches
+    find a valid token instead of running into a 401 and a re-authentication.
+    """
+    failures = 0
+    while True:
+        delay = TOKEN_CHECK_INTERVAL
+        try:
+            provider = read_config().get('provider') or 'google'
+            _, _, expires_at = load_stored_token(provider)
+            if expires_at is not None:
+                delay = expires_at - TOKEN_REFRESH_MARGIN - time.time()
+            if delay <= 0:
+                helper_refresh_token({'provider': provider})
+                # Look again soon, without spinning on tokens that expire quickly
+                delay = 60
+            failures = 0
+        except Exception as e:
+            failures += 1
+            log_warning("Scheduled token refresh failed: %s", e)
+            delay = 60 * 2 ** failures
+        time.sleep(min(delay, TOKEN_CHECK_INTERVAL))
+
+def helper_list_calendars(params):
+    """Return the calendar list of the configured provider"""
+    if params.get('provider', 'google') == 'google':
+        return list_google_calendars(load_google_credentials())
+    return list_nextcloud_calendars(params['server_url'].rstrip('/'), params['access_token'])
+
+def with_current_token(result, access_token):
+    """Add the token that replaced access_token, if any, so the widget adopts it"""
+    token = current_access_token(access_token)
+    if token != access_token:
+        result['access_token'] = token
+    return result
+
+# A revalidation finished this recently (seconds) still answers the widget's
+# follow-up request for fresh data instead of fetching again
+REVALIDATION_REUSE = 30
+
+# Background revalidations by snapshot key: {key: {done, result, error, finished}}
+_revalidations = {}
+_revalidations_lock = threading.Lock()
+
+def revalidate_snapshot(path, key, fetch, revalidation):
+    """Run fetch() for a revalidation and save its result as the snapshot"""
+    trace = start_trace(f"revalidate {key}")
+    try:
+        revalidation['result'] = save_snapshot(path, key, fetch())
+    except Exception as e:
+        log_warning("Revalidating %s failed: %s", key, e)
+        revalidation['error'] = e
+    finally:
+        finish_trace(trace)
+    revalidation['finished'] = time.time()
+    revalidation['done'].set()
+
+def fetch_with_snapshot(path, key, fetch, stale_ok=False, select=None):
+    """Answer a fetch from the saved snapshot and revalidate it (stale-while-revalidate).
+
+    With stale_ok, a snapshot saved under key is returned at once, marked
+    "stale" and filtered through select(), and fetch() runs on a thread.
+    The widget then asks again without stale_ok, which waits for that
+    revalidation rather than fetching a second time. Every result carries
+    "fetched_at" (epoch seconds of the fetch it comes from).
+    """
+    with _revalidations_lock:
+        revalidation = _revalidations.get(key)
+        if revalidation and revalidation['done'].is_set() \
+                and time.time() - revalidation['finished'] > REVALIDATION_REUSE:
+            del _revalidations[key]
+            revalidation = None
+        snapshot = load_snapshot(path, key) if stale_ok else None
+        if snapshot:
+            if revalidation is None:
+                revalidation = {'done': threading.Event(), 'result': None, 'error': None, 'finished': 0}
+                _revalidations[key] = revalidation
+                threading.Thread(target=revalidate_snapshot, args=(path, key, fetch, revalidation),
+                                 daemon=True).start()
+            result = {name: value for name, value in snapshot.items() if name not in ('version', 'key')}
+            result['stale'] = True
+            return select(result) if select else result
+        if revalidation is not None:
+            _revalidations.pop(key)
+    
+    if revalidation is None:
+        return save_snapshot(path, key, fetch())
+    revalidation['done'].wait()
+    if revalidation['error'] is not None:
+        raise revalidation['error']
+    return revalidation['result']
+
+def events_in_window(result, time_min, time_max):
+    """Keep the events of a saved result that overlap the requested window"""
+    start_ms = int(parse_iso_datetime(time_min).timestamp() * 1000)
+    end_ms = int(parse_iso_datetime(time_max).timestamp() * 1000)
+    days = []
+    for day in result['days']:
+        rows = [row for row in day['events'] if row['end_ms'] > start_ms and row['start_ms'] < end_ms]
+        if rows:
+            days.append({'date': day['date'], 'events': rows})
+    result['days'] = days
+    return result
+
+# Number of views kept per snapshot key for diff_served_view()
+SERVED_VIEWS_KEPT = 4
+
+# Views recently served to the widget: {key: {revision: rows}}
+_served_views = {}
+_served_views_lock = threading.Lock()
+
+def diff_served_view(result, key, base_revision=None):
+    """Stamp a view with its revision and, if possible, replace it with a diff.
+
+    When base_revision is a view of key served recently (the one the
+    widget shows), "days" is replaced with the "ops" that turn it into this
+    one (see diff_view_rows).
+    """
+    import hashlib
+    rows = [row for day in result['days'] for row in day['events']]
+    revision = hashlib.sha1(json.dumps(rows, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+    with _served_views_lock:
+        served = _served_views.setdefault(key, {})
+        base = served.get(base_revision) if base_revision else None
+        served.pop(revision, None)
+        served[revision] = rows
+        while len(served) > SERVED_VIEWS_KEPT:
+            del served[next(iter(served))]
+    
+    result['revision'] = revision
+    if base is not None:
+        result['ops'] = diff_view_rows(base, rows)
+        del result['days']
+    return result
+
+def fetch_events_with_snapshot(params, key, fetch):
+    """fetch_with_snapshot() for the event methods, params as sent by the widget"""
+    result = fetch_with_snapshot(events_snapshot_file, key, fetch, params.get('stale_ok', False),
+                                 lambda result: events_in_window(result, params['time_min'], params['time_max']))
+    result = diff_served_view(dict(result), key, params.get('base_revision'))
+    return with_current_token(result, params['access_token'])
+
+def helper_fetch_events(params):
+    """Return CalDAV events like --fetch-events, as a day-grouped view (see build_event_view)"""
+    def fetch():
+        events = load_caldav_events(params['server_url'], params['calendar_id'],
+                                    current_access_token(params['access_token']),
+                                    params['time_min'], params['time_max'])
+        events.sort(key=lambda event: event['start_ms'])
+        return {'days': build_event_view(events)}
+    return fetch_events_with_snapshot(params, f"nextcloud:{params['calendar_id']}", fetch)
+
+def helper_fetch_google_events(params):
+    """Return Google Calendar events like --fetch-google-events, as a day-grouped view"""
+    def fetch():
+        return {'days': build_event_view(load_google_events(
+            params['calendar_id'], current_access_token(params['access_token']),
+            params['time_min'], params['time_max']))}
+    return fetch_events_with_snapshot(params, f"google:{params['calendar_id']}", fetch)
+
+def helper_fetch_tasks(params):
+    """Return all Google task lists and their tasks, like --fetch-tasks"""
+    result = fetch_with_snapshot(tasks_snapshot_file, 'google',
+                                 lambda: load_google_tasks(current_access_token(params['access_token'])),
+                                 params.get('stale_ok', False))
+    return with_current_token(result, params['access_token'])
+
+def helper_queue_task_op(params):
+    """Queue a task edit, like --queue-task-op, and send it with the next batch"""
+    result = queue_task_op(params)
+    schedule_task_flush(TASKS_FLUSH_DELAY, params.get('access_token'))
+    return result
+
+def load_helper_calendars(params):
+    """Fetch the calendars of a helper request with current tokens; raises if all of them fail"""
+    calendars = [dict(calendar, access_token=current_access_token(calendar['access_token']))
+                 for calendar in params['calendars']]
+    events, errors = load_calendars_events(calendars, params['time_min'], params['time_max'])
+    if errors and len(errors) == len(calendars):
+        raise HelperError(f"All calendars failed: {'; '.join(errors.values())}")
+    return events, errors
+
+def helper_fetch_calendars(params):
+    """Return the merged events of several calendars like --fetch-calendars, as a day-grouped view"""
+    def fetch():
+        events, errors = load_helper_calendars(params)
+        return {'days': build_event_view(events), 'errors': errors}
+    
+    if not params['calendars']:
+        return {'days': [], 'errors': {}}
+    first = params['calendars'][0]
+    key = first.get('provider', 'google') + ':' + ','.join(calendar['calendar_id'] for calendar in params['calendars'])
+    return fetch_events_with_snapshot(dict(params, access_token=first['access_token']), key, fetch)
+
+def helper_conflicts(params):
+    """Return the overlapping events of several calendars like --conflicts"""
+    if not params['calendars']:
+        return {'conflicts': [], 'errors': {}}
+    events, errors = load_helper_calendars(params)
+    return with_current_token({'conflicts': find_conflicts(events), 'errors': errors},
+                              params['calendars'][0]['access_token'])
+
+def helper_free_slots(params):
+    """Return the free slots between the events of several calendars like --free-slots"""
+    if not params['calendars']:
+        return {'slots': [], 'errors': {}}
+    hours = parse_working_hours(params['hours']) if params.get('hours') else None
+    events, errors = load_helper_calendars(params)
+    slots = find_free_slots(events, params['time_min'], params['time_max'], float(params['minutes']), hours)
+    return with_current_token({'slots': slots, 'errors': errors}, params['calendars'][0]['access_token'])
+
+# Woken by watch_config_file() whenever config.json is replaced
+_config_changed = threading.Condition()
+# Longest a watch_config request is held open, and how often config.json is
+# checked where inotify is unavailable
+CONFIG_WATCH_TIMEOUT = 300
+CONFIG_POLL_INTERVAL = 1
+
+def open_inotify(directory, mask):
+    """Return an inotify descriptor watching directory, or None if unavailable.
+
+    inotify is reached through libc with ctypes, so the standard library is
+    all that is needed.
+    """
+    import ctypes
+    import ctypes.util
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def watch_config_file():
+    """Wake watch_config requests whenever config.json changes.
+
+    Runs on a daemon thread of the --serve helper. config.json is replaced
+    by a rename (see write_json_file()), so an inotify watch on its
+    directory sees every write as one IN_MOVED_TO event; without inotify
+    the file's mtime is polled instead.
+    """
+    import struct
+    IN_CLOSE_WRITE, IN_MOVED_TO, IN_DELETE = 0x8, 0x80, 0x200
+    fd = open_inotify(config_dir, IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE)
+    name = os.fsencode(config_file.name)
+    last_mtime = None
+    while True:
+        if fd is not None:
+            buf = os.read(fd, 4096)
+            changed, offset = False, 0
+            while offset + 16 <= len(buf):
+                # struct inotify_event: wd, mask, cookie, len, then the name
+                _, _, _, length = struct.unpack_from('iIII', buf, offset)
+                changed = changed or buf[offset + 16:offset + 16 + length].rstrip(b'\0') == name
+                offset += 16 + length
+        else:
+            time.sleep(CONFIG_POLL_INTERVAL)
+            try:
+                mtime = config_file.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+            changed, last_mtime = mtime != last_mtime, mtime
+        if changed:
+            with _config_changed:
+                _config_changed.notify_all()
+
+def helper_watch_config(params):
+    """Return config.json once its version differs from params["version"].
+
+    Long poll for the widget: the request is held until the config changes
+    or params["timeout"] seconds pass, so token and provider changes reach
+    the widget as they happen instead of by polling the file. Returns
+    {"changed": true, "config": {...}} or {"changed": false}.
+    """
+    since = params.get('version', 0)
+    deadline = time.monotonic() + min(params.get('timeout', 60), CONFIG_WATCH_TIMEOUT)
+    with _config_changed:
+        while True:
+            config = read_config()
+            if config.get('version', 0) != since:
+                return {'changed': True, 'config': config}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {'changed': False}
+            _config_changed.wait(remaining)
+
+# Methods available to the widget over the --serve channel
+HELPER_METHODS = {
+    'ping': lambda params: {'pid': os.getpid()},
+    'fetch_events': helper_fetch_events,
+    'fetch_google_events': helper_fetch_google_events,
+    'fetch_calendars': helper_fetch_calendars,
+    'conflicts': helper_conflicts,
+    'free_slots': helper_free_slots,
+    'fetch_tasks': helper_fetch_tasks,
+    'queue_task_op': helper_queue_task_op,
+    'list_calendars': helper_list_calendars,
+    'refresh_token': helper_refresh_token,
+    'watch_config': helper_watch_config,
+}
+
+
+def create_helper_server():
+    """Create the loopback server used by --serve on a random free port"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    
+    class HelperRequestHandler(BaseHTTPRequestHandler):
+        """JSON request handler for the long-lived helper started with --serve.
+
+        Requests are POSTed as {"method": ..., "params": {...}} and answered with
+        {"result": ...} or {"error": "..."}. Every request must carry the token
+        from helper.json in the X-KAgenda-Token header.
+        """
+        protocol_version = 'HTTP/1.1'
+    
+        def do_POST(self):
+            import secrets
+            if not secrets.compare_digest(self.headers.get('X-KAgenda-Token', ''), self.server.auth_token):
+                self.send_json(403, {'error': 'Invalid helper token'})
+                return
+        
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                method = request.get('method')
+                params = request.get('params') or {}
+            except (ValueError, AttributeError) as e:
+                self.send_json(400, {'error': f'Invalid request: {e}'})
+                return
+        
+            if method == 'shutdown':
+                self.send_json(200, {'result': True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+        
+            handler = HELPER_METHODS.get(method)
+            if handler is None:
+                self.send_json(400, {'error': f'Unknown method: {method}'})
+                return
+        
+            trace = start_trace(method)
+            try:
+                self.send_json(200, {'result': handler(params)})
+            except HelperError as e:
+                self.send_json(200, {'error': str(e)})
+            except KeyError as e:
+                self.send_json(400, {'error': f'Missing parameter: {e}'})
+            except Exception as e:
+                sys.stderr.write(f"ERROR: Helper method {method} failed: {e}\n")
+                self.send_json(200, {'error': f'{method} failed: {e}'})
+            finally:
+                finish_trace(trace)
+    
+        def send_json(self, status, payload):
+            body = dump_json(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+        def log_message(self, format, *args):
+            pass  # Suppress logging
+    
+    class HelperHTTPServer(ThreadingHTTPServer):
+        """Loopback server for the long-lived helper"""
+        daemon_threads = True
+        auth_token = ''
+    
+    return HelperHTTPServer(('127.0.0.1', 0), HelperRequestHandler)
+
+
+def read_running_helper():
+    """Return the state of an already running helper, or None"""
+    try:
+        with open(helper_state_file, 'r') as f:
+            state = json.load(f)
+        os.kill(state['pid'], 0)
+        with socket.create_connection(('127.0.0.1', state['port']), timeout=1):
+            pass
+        return state
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def serve_helper(foreground=False):
+    """Run the helper as a long-lived loopback JSON server.
+
+    Keeps the interpreter, imports, HTTP connections and API clients warm so
+    a widget refresh costs one local request instead of a process spawn.
+    Prints {"port", "token", "pid"} and, unless foreground is set, detaches
+    so the widget's executable DataSource returns immediately. If a helper is
+    already running its state is printed instead of starting a second one.
+    """
+    state = read_running_helper()
+    if state:
+        print(json.dumps(state, indent=None, separators=(',', ':')))
+        return
+    
+    import secrets
+    server = create_helper_server()
+    server.auth_token = secrets.token_urlsafe(24)
+    state = {'port': server.server_address[1], 'token': server.auth_token, 'pid': os.getpid()}
+    
+    if not foreground:
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid > 0:
+            state['pid'] = pid
+            write_helper_state(state)
+            print(json.dumps(state, indent=None, separators=(',', ':')))
+            sys.stdout.flush()
+            os._exit(0)
+        
+        # Detach from the widget's process and release its stdout/stderr
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.close(devnull)
+    else:
+        write_helper_state(state)
+        print(json.dumps(state, indent=None, separators=(',', ':')))
+        sys.stdout.flush()
+    
+    # Pay for the slow imports once, before the first request arrives
+    requests_available()
+    google_available()
+    
+    # Threads do not survive the fork, so they start here
+    threading.Thread(target=run_token_scheduler, daemon=True).start()
+    threading.Thread(target=watch_config_file, daemon=True).start()
+    # Replay task edits left over from an earlier run or an offline period
+    schedule_task_flush(TASKS_FLUSH_DELAY)
+    
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            with open(helper_state_file, 'r') as f:
+                if json.load(f).get('pid') == os.getpid():
+                    helper_state_file.unlink()
+        except (OSError, ValueError):
+            pass
+
+def write_helper_state(state):
+    """Save the helper port and token, readable only by the user"""
+    write_json_file(helper_state_file, state)
+
+def main():
+    """Dispatch the command line to the requested subcommand"""
+    global TRACE_TARGET
+    tune_gc()
+    if '--profile' in sys.argv[1:]:
+        # Print the phase timings of this command to stderr when it exits
+        sys.argv.remove('--profile')
+        TRACE_TARGET = TRACE_TARGET or 'stderr'
+    if TRACE_TARGET and sys.argv[1:2] != ['--serve']:
+        import atexit
+        atexit.register(finish_trace, start_trace(sys.argv[1] if len(sys.argv) > 1 else 'authenticate'))
+    
+    # Check if we're just finding a port
+    if len(sys.argv) > 1 and sys.argv[1] == '--find-port':
+        port = find_free_port(8080, 20)
+        if port:
+            print(port)
+            sys.exit(0)
+        else:
+            sys.stderr.write("ERROR: Could not find a free port\n")
+            sys.exit(1)
+    elif len(sys.argv) > 1 and sys.argv[1] == '--fetch-events':
+        # Fetch events via CalDAV
+        if len(sys.argv) < 7:
+            sys.stderr.write("ERROR: Usage: --fetch-events server_url calendar_id access_token time_min time_max [--stream]\n")
+            sys.exit(1)
+        fetch_caldav_events(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6],
+                            stream='--stream' in sys.argv[7:])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--fetch-google-events':
+        # Fetch events via the Google Calendar API with incremental sync
+        if len(sys.argv) < 6:
+            sys.stderr.write("ERROR: Usage: --fetch-google-events calendar_id access_token time_min time_max\n")
+            sys.exit(1)
+        fetch_google_events(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--fetch-calendars':
+        # Fetch several calendars concurrently into one merged list
+        if len(sys.argv) < 5:
+            sys.stderr.write("ERROR: Usage: --fetch-calendars calendars_json time_min time_max\n")
+            sys.exit(1)
+        fetch_calendars_events(sys.argv[2], sys.argv[3], sys.argv[4])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--conflicts':
+        # Fetch several calendars and list their overlapping events
+        if len(sys.argv) < 5:
+            sys.stderr.write("ERROR: Usage: --conflicts calendars_json time_min time_max\n")
+            sys.exit(1)
+        fetch_conflicts(sys.argv[2], sys.argv[3], sys.argv[4])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--free-slots':
+        # Fetch several calendars and list the free time between their events
+        if len(sys.argv) < 6:
+            sys.stderr.write("ERROR: Usage: --free-slots calendars_json time_min time_max minutes [from-to hours]\n")
+            sys.exit(1)
+        fetch_free_slots(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6] if len(sys.argv) > 6 else None)
+    elif len(sys.argv) > 1 and sys.argv[1] == '--fetch-tasks':
+        # Fetch all Google task lists and their tasks in one payload
+        if len(sys.argv) < 3:
+            sys.stderr.write("ERROR: Usage: --fetch-tasks access_token\n")
+            sys.exit(1)
+        fetch_google_tasks(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--queue-task-op':
+        # Queue a task edit and send all pending edits in one batch
+        if len(sys.argv) < 3:
+            sys.stderr.write("ERROR: Usage: --queue-task-op op_json\n")
+            sys.exit(1)
+        queue_google_task_op(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--refresh-token':
+        # Refresh the access token without running the authentication flow
+        args = [arg for arg in sys.argv[2:] if arg != '--force']
+        provider = args[0].lower() if args else read_config().get('provider') or 'google'
+        refresh_access_token(provider, force='--force' in sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        # Long-lived helper for the widget
+        serve_helper(foreground='--foreground' in sys.argv[2:])
+    else:
+        authenticate()
+
+if __name__ == '__main__':
+    main()
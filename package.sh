@@ -24,6 +24,7 @@ cp "$SCRIPT_DIR/metadata.desktop" "$PACKAGE_DIR/" 2>/dev/null || true
 cp "$SCRIPT_DIR/LICENSE" "$PACKAGE_DIR/" 2>/dev/null || true
 cp "$SCRIPT_DIR/README.md" "$PACKAGE_DIR/" 2>/dev/null || true
 cp "$SCRIPT_DIR/oauth-helper.py" "$PACKAGE_DIR/" 2>/dev/null || true
+cp "$SCRIPT_DIR/kagenda_helper.py" "$PACKAGE_DIR/" 2>/dev/null || true
 
 # Copy QML files
 if [ -d "$SCRIPT_DIR/ui" ]; then
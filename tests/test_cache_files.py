@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Cache file tests for kagenda_helper
+
+Checks that the cache files the helper keeps loaded in memory are never
+shared between callers.
+
+Usage: python3 -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import kagenda_helper
+
+
+class CacheFileTest(unittest.TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.path = Path(cache_dir.name) / 'cache.json'
+        kagenda_helper.write_cache_file(self.path, {'objects': {'a.ics': {'etag': '"1"', 'data': 'A'}}})
+
+    def test_callers_get_their_own_copy(self):
+        first = kagenda_helper.read_cache_file(self.path)
+        first['objects']['a.ics']['etag'] = '"2"'
+        first['objects']['b.ics'] = {'etag': '"1"', 'data': 'B'}
+
+        second = kagenda_helper.read_cache_file(self.path)
+        self.assertEqual(second, {'objects': {'a.ics': {'etag': '"1"', 'data': 'A'}}})
+        self.assertIsNot(second, kagenda_helper.read_cache_file(self.path))
+
+    def test_changes_after_a_write_stay_with_the_caller(self):
+        data = kagenda_helper.read_cache_file(self.path)
+        data['objects']['b.ics'] = {'etag': '"1"', 'data': 'B'}
+        kagenda_helper.write_cache_file(self.path, data)
+        data['objects'].clear()
+
+        self.assertEqual(sorted(kagenda_helper.read_cache_file(self.path)['objects']), ['a.ics', 'b.ics'])
+
+    def test_failed_write_leaves_the_loaded_copy(self):
+        data = kagenda_helper.read_cache_file(self.path)
+        data['objects'].clear()
+        with mock.patch.object(kagenda_helper, 'write_json_file', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                kagenda_helper.write_cache_file(self.path, data)
+
+        self.assertEqual(sorted(kagenda_helper.read_cache_file(self.path)['objects']), ['a.ics'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+CalDAV cache tests for kagenda_helper
+
+Syncs calendars of the stand-in Nextcloud server from benchmarks/
+mock_servers.py into a temporary cache and checks which refreshes cost
+a request.
+
+Usage: python3 -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+import kagenda_helper
+from mock_servers import MockCalDAVServer
+
+TOKEN = 'test-token'
+TIME_MAX = '2025-01-01T00:00:00Z'
+
+
+class CalDAVCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockCalDAVServer({'personal': 20, 'legacy': 20, 'archive': 20},
+                                       user='test', no_sync=['legacy', 'archive']).start()
+        self.addCleanup(self.server.stop)
+
+        # Keep the caches out of the real ~/.cache/kagenda
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        for name in ('caldav_cache_dir', 'caldav_discovery_file'):
+            patcher = mock.patch.object(kagenda_helper, name, Path(cache_dir.name) / getattr(kagenda_helper, name).name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fetch(self, names, time_min, time_max=TIME_MAX):
+        """Fetch calendars like the widget and return (events, errors, requests)"""
+        self.server.reset_counters()
+        calendars = [{'provider': 'nextcloud', 'server_url': self.server.url, 'calendar_id': f"test/{name}",
+                      'access_token': TOKEN} for name in names]
+        events, errors = kagenda_helper.load_calendars_events(calendars, time_min, time_max)
+        return events, errors, self.server.counters()['requests']
+
+    def warm_up(self, names):
+        """Fill the cache; the calendar home is checked first, so the getctags are recorded"""
+        events, errors, _ = self.fetch(names, '2024-01-01T08:00:00Z')
+        self.assertEqual(errors, {})
+        return events
+
+    def test_unchanged_calendars_without_sync_skip_the_etag_check(self):
+        events = self.warm_up(['legacy', 'archive'])
+
+        # The widget's window starts at the current time, so it moves on every refresh
+        for time_min in ('2024-01-01T08:05:00Z', '2024-01-01T08:10:00.123Z'):
+            refreshed, errors, requests = self.fetch(['legacy', 'archive'], time_min)
+            self.assertEqual(errors, {})
+            self.assertEqual(requests, 1, "only the PROPFIND of the calendar home")
+            self.assertEqual(len(refreshed), len(events))
+
+    def test_changed_calendar_without_sync_is_refreshed(self):
+        self.warm_up(['legacy', 'archive'])
+        self.server.change('legacy', 2)
+
+        events, errors, requests = self.fetch(['legacy', 'archive'], '2024-01-01T08:05:00Z')
+        self.assertEqual(errors, {})
+        # PROPFIND, then the ETag listing and multiget of the changed calendar only
+        self.assertEqual(requests, 3)
+        self.assertEqual(sum(1 for event in events if event['summary'].startswith('Moved ')), 2)
+
+    def test_window_beyond_the_cached_one_lists_etags_again(self):
+        self.warm_up(['legacy', 'archive'])
+
+        _, errors, requests = self.fetch(['legacy', 'archive'], '2024-01-02T08:00:00Z', '2025-01-02T08:00:00Z')
+        self.assertEqual(errors, {})
+        self.assertEqual(requests, 3)
+
+    def test_sync_collection_downloads_only_changes(self):
+        events = self.warm_up(['personal'])
+        self.server.change('personal', 3)
+        self.server.reset_counters()
+
+        refreshed = kagenda_helper.load_caldav_events(self.server.url, 'test/personal', TOKEN,
+                                                      '2024-01-01T08:05:00Z', TIME_MAX)
+        counters = self.server.counters()
+        self.assertEqual(counters['requests'], 1)
+        self.assertEqual(len(refreshed), len(events))
+        self.assertEqual(sum(1 for event in refreshed if event['summary'].startswith('Moved ')), 3)
+
+        cache = kagenda_helper.load_caldav_cache(kagenda_helper.resolve_caldav_url(
+            kagenda_helper.get_http_session(self.server.url), self.server.url, 'test/personal', TOKEN)[0])
+        self.assertEqual(cache['sync_token'], self.server.sync_token('personal'))
+
+    def test_unchanged_synced_calendar_costs_one_request(self):
+        self.fetch(['personal'], '2024-01-01T08:00:00Z')
+
+        _, errors, requests = self.fetch(['personal'], '2024-01-01T08:05:00Z')
+        self.assertEqual(errors, {})
+        self.assertEqual(requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Event view and interval index tests for kagenda_helper
+
+diff_view_rows is checked by applying its operations the way the
+widget's ListModel does; EventIndex queries are checked against a
+linear scan.
+
+Usage: python3 -m unittest discover tests
+"""
+
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import kagenda_helper
+
+HOUR_MS = 3600 * 1000
+
+
+def apply_ops(rows, ops):
+    """Apply diff_view_rows operations like ListModel remove/insert/move/set"""
+    rows = list(rows)
+    for op in ops:
+        if op['op'] == 'remove':
+            del rows[op['index']:op['index'] + op['count']]
+        elif op['op'] == 'insert':
+            rows[op['index']:op['index']] = op['rows']
+        elif op['op'] == 'move':
+            rows.insert(op['to'], rows.pop(op['from']))
+        else:
+            rows[op['index']] = op['row']
+    return rows
+
+
+def event(start_hour, hours, **fields):
+    return dict({'uid': f"event-{start_hour}-{hours}", 'summary': '', 'all_day': False,
+                 'start_ms': start_hour * HOUR_MS, 'end_ms': (start_hour + hours) * HOUR_MS}, **fields)
+
+
+class DiffViewRowsTest(unittest.TestCase):
+
+    def test_unchanged_rows_need_no_operations(self):
+        rows = [{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}]
+        self.assertEqual(kagenda_helper.diff_view_rows(rows, [dict(row) for row in rows]), [])
+
+    def test_edit_insert_and_remove(self):
+        old = [{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}, {'id': 'c', 'title': 'C'}]
+        new = [{'id': 'a', 'title': 'A'}, {'id': 'x', 'title': 'X'}, {'id': 'c', 'title': 'C moved'}]
+        ops = kagenda_helper.diff_view_rows(old, new)
+
+        self.assertEqual([op['op'] for op in ops], ['remove', 'insert', 'set'])
+        self.assertEqual(apply_ops(old, ops), new)
+
+    def test_random_changes(self):
+        rng = random.Random(3)
+        for _ in range(300):
+            old = [{'id': str(i), 'title': str(i)} for i in rng.sample(range(30), rng.randrange(15))]
+            new = [{'id': str(i), 'title': str(i) + rng.choice(('', '', '*'))}
+                   for i in rng.sample(range(30), rng.randrange(15))]
+            self.assertEqual(apply_ops(old, kagenda_helper.diff_view_rows(old, new)), new)
+
+
+class EventIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(5)
+        self.events = [event(rng.randrange(200), rng.choice((0, 1, 1, 2, 3, 8)), uid=f"random-{i}")
+                       for i in range(300)]
+        self.events += [event(10, 24, uid='all-day', all_day=True),
+                        event(10, 24, uid='cancelled', status='CANCELLED')]
+        self.index = kagenda_helper.EventIndex(self.events)
+        self.busy = [e for e in self.events if not e['all_day'] and e.get('status') != 'CANCELLED']
+
+    def test_overlapping_matches_a_linear_scan(self):
+        for start in range(0, 210 * HOUR_MS, HOUR_MS // 2):
+            # Events without duration are found when they start within the range
+            expected = sorted(e['uid'] for e in self.busy if e['start_ms'] < start + HOUR_MS
+                              and (e['end_ms'] > start or e['end_ms'] == e['start_ms'] >= start))
+            self.assertEqual(sorted(e['uid'] for e in self.index.overlapping(start, start + HOUR_MS)), expected)
+
+    def test_conflicts_match_a_linear_scan(self):
+        # Events without duration keep no one busy, so they conflict with nothing
+        timed = [e for e in self.busy if e['end_ms'] > e['start_ms']]
+        expected = {frozenset((a['uid'], b['uid'])) for i, a in enumerate(timed) for b in timed[i + 1:]
+                    if a['start_ms'] < b['end_ms'] and b['start_ms'] < a['end_ms']}
+        found = [frozenset((a['uid'], b['uid'])) for a, b, _, _ in self.index.conflicts()]
+
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(set(found), expected)
+
+    def busy_during(self, start, end):
+        return [e for e in self.index.overlapping(start, end) if e['end_ms'] > e['start_ms']]
+
+    def test_free_slots_are_free_and_complete(self):
+        slots = list(self.index.free_slots(0, 210 * HOUR_MS, HOUR_MS))
+        for start, end in slots:
+            self.assertGreaterEqual(end - start, HOUR_MS)
+            self.assertEqual(self.busy_during(start, end), [])
+        # Every free whole hour lies in a slot
+        for hour in range(210):
+            if not self.busy_during(hour * HOUR_MS, (hour + 1) * HOUR_MS):
+                self.assertTrue(any(start <= hour * HOUR_MS and (hour + 1) * HOUR_MS <= end for start, end in slots))
+
+    def test_all_day_and_cancelled_events_are_not_busy(self):
+        index = kagenda_helper.EventIndex([event(10, 24, all_day=True), event(10, 24, status='CANCELLED')])
+        self.assertEqual(list(index.free_slots(0, 48 * HOUR_MS, HOUR_MS)), [(0, 48 * HOUR_MS)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+iCalendar parser and recurrence tests for kagenda_helper
+
+Usage: python3 -m unittest discover tests
+"""
+
+import sys
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import kagenda_helper
+
+WINDOW = (datetime(2024, 3, 1, tzinfo=timezone.utc), datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+
+def calendar(*lines):
+    """A VCALENDAR with the given content lines, CRLF-terminated like servers send them"""
+    return ''.join(line + '\r\n' for line in ('BEGIN:VCALENDAR',) + lines + ('END:VCALENDAR',))
+
+
+def starts(ical, window=WINDOW):
+    return [event['start'] for event in kagenda_helper.parse_ical_events(ical, *window)]
+
+
+class ParseICalTest(unittest.TestCase):
+
+    def test_folded_lines_and_escaped_text(self):
+        [event] = kagenda_helper.parse_ical_events(calendar(
+            'BEGIN:VEVENT', 'UID:folded', 'SUMMARY:Quarterly plan', ' ning review',
+            'LOCATION:Room 1\\, second floor\\nBuilding A', 'DTSTART:20240305T090000Z',
+            'DTEND:20240305T100000Z', 'END:VEVENT'))
+
+        self.assertEqual(event['summary'], 'Quarterly planning review')
+        self.assertEqual(event['location'], 'Room 1, second floor\nBuilding A')
+        self.assertEqual((event['start'], event['end']), ('2024-03-05T09:00:00Z', '2024-03-05T10:00:00Z'))
+        self.assertEqual(event['end_ms'] - event['start_ms'], 3600 * 1000)
+        self.assertFalse(event['all_day'])
+
+    def test_quoted_parameters(self):
+        component = kagenda_helper.parse_ical(calendar(
+            'BEGIN:VEVENT', 'ORGANIZER;CN="Doe; Jane: PM";ROLE=CHAIR:mailto:jane@example.org', 'END:VEVENT'))[0]
+        params, value = component.components[0].get('ORGANIZER')
+
+        self.assertEqual(params, {'CN': 'Doe; Jane: PM', 'ROLE': 'CHAIR'})
+        self.assertEqual(value, 'mailto:jane@example.org')
+
+    def test_tzid_is_converted_to_utc(self):
+        [event] = kagenda_helper.parse_ical_events(calendar(
+            'BEGIN:VEVENT', 'UID:berlin', 'SUMMARY:Standup', 'DTSTART;TZID=Europe/Berlin:20240710T090000',
+            'DURATION:PT15M', 'END:VEVENT'))
+
+        self.assertEqual((event['start'], event['end']), ('2024-07-10T07:00:00Z', '2024-07-10T07:15:00Z'))
+
+    def test_vtimezone_of_the_calendar(self):
+        [event] = kagenda_helper.parse_ical_events(calendar(
+            'BEGIN:VTIMEZONE', 'TZID:Custom Standard Time',
+            'BEGIN:STANDARD', 'DTSTART:16010101T000000', 'TZOFFSETFROM:-0300', 'TZOFFSETTO:-0300', 'END:STANDARD',
+            'END:VTIMEZONE',
+            'BEGIN:VEVENT', 'UID:custom', 'SUMMARY:Call', 'DTSTART;TZID=Custom Standard Time:20240310T090000',
+            'DTEND;TZID=Custom Standard Time:20240310T100000', 'END:VEVENT'))
+
+        self.assertEqual(event['start'], '2024-03-10T12:00:00Z')
+
+    def test_all_day_event(self):
+        [event] = kagenda_helper.parse_ical_events(calendar(
+            'BEGIN:VEVENT', 'UID:holiday', 'SUMMARY:Holiday', 'DTSTART;VALUE=DATE:20240401',
+            'DTEND;VALUE=DATE:20240402', 'END:VEVENT'))
+
+        self.assertTrue(event['all_day'])
+        self.assertEqual((event['start'], event['end']), ('2024-04-01', '2024-04-02'))
+
+    def test_window_leaves_out_other_events(self):
+        ical = calendar('BEGIN:VEVENT', 'UID:old', 'DTSTART:20230101T090000Z', 'DTEND:20230101T100000Z',
+                        'END:VEVENT', 'BEGIN:VEVENT', 'UID:new', 'DTSTART:20240301T090000Z',
+                        'DTEND:20240301T100000Z', 'END:VEVENT')
+
+        self.assertEqual(starts(ical), ['2024-03-01T09:00:00Z'])
+
+
+class RecurrenceTest(unittest.TestCase):
+
+    def test_series_keeps_its_wall_clock_time_across_dst(self):
+        ical = calendar('BEGIN:VEVENT', 'UID:weekly', 'SUMMARY:Team', 'DTSTART;TZID=Europe/Berlin:20240318T090000',
+                        'DTEND;TZID=Europe/Berlin:20240318T100000', 'RRULE:FREQ=WEEKLY;COUNT=3', 'END:VEVENT')
+
+        # Berlin switches to summer time on 2024-03-31
+        self.assertEqual(starts(ical), ['2024-03-18T08:00:00Z', '2024-03-25T08:00:00Z', '2024-04-01T07:00:00Z'])
+
+    def test_exdate_rdate_and_modified_instance(self):
+        events = kagenda_helper.parse_ical_events(calendar(
+            'BEGIN:VEVENT', 'UID:series', 'SUMMARY:Review', 'DTSTART:20240304T090000Z', 'DTEND:20240304T100000Z',
+            'RRULE:FREQ=WEEKLY;COUNT=4', 'EXDATE:20240311T090000Z', 'RDATE:20240401T090000Z', 'END:VEVENT',
+            'BEGIN:VEVENT', 'UID:series', 'RECURRENCE-ID:20240318T090000Z', 'SUMMARY:Review (moved)',
+            'DTSTART:20240319T140000Z', 'DTEND:20240319T150000Z', 'END:VEVENT'), *WINDOW)
+
+        self.assertEqual(sorted((event['start'], event['summary']) for event in events), [
+            ('2024-03-04T09:00:00Z', 'Review'),
+            ('2024-03-19T14:00:00Z', 'Review (moved)'),
+            ('2024-03-25T09:00:00Z', 'Review'),
+            ('2024-04-01T09:00:00Z', 'Review'),
+        ])
+        moved = next(event for event in events if event['summary'] == 'Review (moved)')
+        self.assertEqual(moved['recurrence_id'], '2024-03-18T09:00:00Z')
+
+    def rrule(self, dtstart, rule, limit, **options):
+        return [start.isoformat() for start in
+                kagenda_helper.iter_rrule(dtstart, kagenda_helper.parse_rrule(rule), limit, **options)]
+
+    def test_last_weekday_of_month(self):
+        self.assertEqual(self.rrule(datetime(2024, 1, 26, 9), 'FREQ=MONTHLY;BYDAY=-1FR;COUNT=3', datetime(2030, 1, 1)),
+                         ['2024-01-26T09:00:00', '2024-02-23T09:00:00', '2024-03-29T09:00:00'])
+
+    def test_bysetpos(self):
+        self.assertEqual(self.rrule(datetime(2024, 1, 31, 9), 'FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1',
+                                    datetime(2024, 4, 1)),
+                         ['2024-01-31T09:00:00', '2024-02-29T09:00:00', '2024-03-29T09:00:00'])
+
+    def test_missing_days_are_skipped(self):
+        self.assertEqual(self.rrule(datetime(2024, 1, 31, 9), 'FREQ=MONTHLY', datetime(2024, 6, 1)),
+                         ['2024-01-31T09:00:00', '2024-03-31T09:00:00', '2024-05-31T09:00:00'])
+        self.assertEqual(self.rrule(datetime(2024, 2, 29, 9), 'FREQ=YEARLY', datetime(2033, 1, 1)),
+                         ['2024-02-29T09:00:00', '2028-02-29T09:00:00', '2032-02-29T09:00:00'])
+
+    def test_until(self):
+        self.assertEqual(self.rrule(datetime(2024, 1, 1, 9), 'FREQ=WEEKLY;BYDAY=MO,WE', datetime(2030, 1, 1),
+                                    until=datetime(2024, 1, 10, 9)),
+                         ['2024-01-01T09:00:00', '2024-01-03T09:00:00', '2024-01-08T09:00:00',
+                          '2024-01-10T09:00:00'])
+
+    def test_skip_to_keeps_the_interval_phase(self):
+        self.assertEqual(self.rrule(datetime(2020, 1, 1, 9), 'FREQ=DAILY;INTERVAL=2', datetime(2024, 1, 8),
+                                    skip_to=datetime(2024, 1, 1)),
+                         ['2024-01-02T09:00:00', '2024-01-04T09:00:00', '2024-01-06T09:00:00'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Task write-back queue tests for kagenda_helper
+
+Queues task edits in a temporary cache and answers the Google batch
+request with the statuses under test.
+
+Usage: python3 -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import kagenda_helper
+
+TOKEN = 'test-token'
+
+
+def google_error(status, reason):
+    """A Google API error body"""
+    return {'error': {'code': status, 'message': reason, 'errors': [{'domain': 'usageLimits', 'reason': reason}]}}
+
+
+class TaskQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        # Keep the queue and the task stores out of the real ~/.cache/kagenda
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        google_cache_dir = Path(cache_dir.name) / 'google'
+        for name, path in (('google_cache_dir', google_cache_dir),
+                           ('google_tasks_queue_file', google_cache_dir / 'tasks-queue.json')):
+            patcher = mock.patch.object(kagenda_helper, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        kagenda_helper.queue_task_op({'op': 'update', 'list_id': 'list', 'task_id': 'task',
+                                      'fields': {'title': 'Edited', 'status': 'completed'}})
+
+    def flush(self, status, body):
+        """Flush the queue with every edit answered by status and body"""
+        with mock.patch.object(kagenda_helper, 'send_task_batch',
+                               side_effect=lambda session, token, ops: [(status, body)] * len(ops)):
+            return kagenda_helper.flush_task_queue(TOKEN, force=True)
+
+    def stored_task(self):
+        return kagenda_helper.load_google_tasks_store('list')['tasks'].get('task')
+
+    def test_rate_limited_edit_stays_queued(self):
+        pending = self.flush(403, google_error(403, 'rateLimitExceeded'))
+
+        self.assertEqual(pending, 1)
+        queue = kagenda_helper.load_task_queue()
+        self.assertEqual([op['task_id'] for op in queue['ops']], ['task'])
+        self.assertGreater(queue['next_attempt'], time.time())
+        self.assertEqual(self.stored_task()['title'], 'Edited')
+
+    def test_user_rate_limited_edit_stays_queued_on_404(self):
+        # A quota reason wins over a status that is otherwise permanent
+        self.assertEqual(self.flush(404, google_error(404, 'userRateLimitExceeded')), 1)
+        self.assertEqual(self.stored_task()['title'], 'Edited')
+
+    def test_forbidden_edit_stays_queued(self):
+        self.assertEqual(self.flush(403, google_error(403, 'insufficientPermissions')), 1)
+        self.assertEqual(self.stored_task()['title'], 'Edited')
+
+    def test_edit_of_deleted_task_is_dropped_and_undone(self):
+        self.assertEqual(self.flush(404, google_error(404, 'notFound')), 0)
+        self.assertIsNone(self.stored_task())
+        self.assertIsNone(kagenda_helper.load_google_tasks_store('list')['updated_min'])
+
+    def test_sent_edit_leaves_the_queue(self):
+        task = {'id': 'task', 'title': 'Edited', 'status': 'completed', 'position': '0'}
+        self.assertEqual(self.flush(200, task), 0)
+        self.assertEqual(kagenda_helper.load_task_queue()['ops'], [])
+        self.assertEqual(self.stored_task()['status'], 'completed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Token refresh tests for kagenda_helper
+
+Refreshes a Nextcloud token saved by the login against a local stand-in
+for the OAuth token endpoint, with no nextcloud_credentials.json and no
+credentials passed by the widget.
+
+Usage: python3 -m unittest discover tests
+"""
+
+import json
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import kagenda_helper
+
+
+class TokenEndpoint(BaseHTTPRequestHandler):
+    """Nextcloud's token endpoint: rotates the refresh token on every grant"""
+
+    def do_POST(self):
+        form = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        self.server.grants.append({key: values[0] for key, values in form.items()})
+        grant = len(self.server.grants)
+        body = json.dumps({'access_token': f"access-{grant}", 'refresh_token': f"refresh-{grant}",
+                           'expires_in': 3600}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class NextcloudTokenRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TokenEndpoint)
+        self.server.grants = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.token_endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/index.php/apps/oauth2/api/v1/token"
+
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # Keep the files the helper writes out of the real ~/.config/kagenda
+        config_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(config_dir.cleanup)
+        for name in ('config_file', 'nextcloud_token_file', 'nextcloud_credentials_file'):
+            patcher = mock.patch.object(kagenda_helper, name, Path(config_dir.name) / getattr(kagenda_helper, name).name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def save_login_token(self):
+        # What authenticate_nextcloud() saves after the code exchange
+        kagenda_helper.write_json_file(kagenda_helper.nextcloud_token_file, {
+            'access_token': 'access-0', 'refresh_token': 'refresh-0', 'expires_at': 0,
+            'server_url': 'https://cloud.example.org', 'token_endpoint': self.token_endpoint,
+            'client_id': 'client-id', 'client_secret': 'client-secret'})
+
+    def test_refresh_without_credentials_file(self):
+        self.save_login_token()
+        self.assertFalse(kagenda_helper.nextcloud_credentials_file.exists())
+
+        result = kagenda_helper.helper_refresh_token({'provider': 'nextcloud', 'rejected_token': 'access-0'})
+
+        self.assertEqual(result['access_token'], 'access-1')
+        self.assertTrue(result['refreshed'])
+        self.assertEqual(self.server.grants, [{'grant_type': 'refresh_token', 'refresh_token': 'refresh-0',
+                                               'client_id': 'client-id', 'client_secret': 'client-secret'}])
+        self.assertEqual(kagenda_helper.read_config()['access_token'], 'access-1')
+
+    def test_refresh_again_after_rotation(self):
+        # The scheduler passes only the provider
+        self.save_login_token()
+        kagenda_helper.helper_refresh_token({'provider': 'nextcloud', 'force': True})
+        result = kagenda_helper.helper_refresh_token({'provider': 'nextcloud', 'force': True})
+
+        self.assertEqual(result['access_token'], 'access-2')
+        self.assertEqual(self.server.grants[1]['refresh_token'], 'refresh-1')
+        self.assertEqual(self.server.grants[1]['client_secret'], 'client-secret')
+
+    def test_widget_credentials_take_precedence(self):
+        self.save_login_token()
+        kagenda_helper.helper_refresh_token({'provider': 'nextcloud', 'force': True, 'client_id': 'configured-id',
+                                             'client_secret': 'configured-secret'})
+
+        self.assertEqual(self.server.grants[0]['client_id'], 'configured-id')
+        self.assertEqual(self.server.grants[0]['client_secret'], 'configured-secret')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -79,7 +79,7 @@ Kirigami.FormLayout {
     QQC2.TextField {
         id: calendarIdField
         Kirigami.FormData.label: "Calendar ID:"
-        placeholderText: providerCombo.currentText === "google" ? "Enter calendar ID (e.g., primary)" : "Enter calendar ID"
+        placeholderText: providerCombo.currentText === "google" ? "Enter calendar ID (e.g., primary), separate several with commas" : "Enter calendar ID, separate several with commas"
         text: plasmoid.configuration.calendarId || ""
         onTextChanged: {
             plasmoid.configuration.calendarId = text
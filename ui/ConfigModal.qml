@@ -581,8 +581,8 @@ Item {
                     // Clear the loading flag before parsing
                     calendarsLoading = false
                     parseCalendarList(stdout)
-                    // Wait a bit then load token
-                    tokenLoadTimer.start()
+                    // The script saved the token to the config file before exiting
+                    loadAccessTokenFromConfig()
                 } else {
                     calendarsLoading = false
                     authStatusText = "Authentication completed but no calendar data received."
@@ -695,15 +695,6 @@ Item {
         }
     }
     
-    Timer {
-        id: tokenLoadTimer
-        interval: 500
-        repeat: false
-        onTriggered: {
-            loadAccessTokenFromConfig()
-        }
-    }
-    
     // Semi-transparent background overlay
     Rectangle {
         anchors.fill: parent
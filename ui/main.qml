@@ -68,6 +68,10 @@ PlasmoidItem {
     }
     
     onCfg_accessTokenChanged: {
+        // A token adopted from a helper reply came with current events already
+        if (cfg_accessToken === adoptedAccessToken) {
+            return
+        }
         if (cfg_calendarId && cfg_accessToken) {
             refreshEvents()
             refreshTodos()
@@ -85,25 +89,37 @@ PlasmoidItem {
     property var calendarListModel: ListModel { id: calendarListModel }
     property var todoModel: ListModel { id: todoModel }
     property var todoListModel: ListModel { id: todoListModel }
+    // Tasks of every task list from the last helper fetch: {list id: [task]}
+    property var tasksByList: ({})
+    property string currentTaskListId: ""
+    // Emitted once applyHelperTasks() has reconciled todoListModel
+    signal taskListsApplied()
+    // Epoch seconds of the fetch the shown events come from, 0 if none yet
+    property double eventsFetchedAt: 0
+    // Helper view revision shown in calendarModel, see applyHelperEvents()
+    property string eventsRevision: ""
     
     // Use cfg_ properties for configuration
     property string accessToken: cfg_accessToken
     property string calendarId: cfg_calendarId
     
-    function runOAuthHelper() {
-        // For Plasma 6, we'll use a file-based approach since direct process execution is limited
-        // The button will trigger the script execution via a helper mechanism
-        statusText = "Preparing authentication..."
-        
-        // We'll use a workaround: create a trigger file that a background process can watch
-        // Or use QML's limited process execution capabilities
-        // For now, we'll instruct the system to run the script
-        // In a real implementation, this would use PlasmaCore.DataSource or a QML extension
-        
-        // Start monitoring for completion
-        oauthOutputTimer.start()
-        statusText = "Opening browser for authentication... Please complete the login."
-    }
+    // Long-lived oauth-helper.py (--serve) connection, see startHelper()
+    property int helperPort: 0
+    property string helperToken: ""
+    // Set until helperLauncher reports whether the helper started
+    property bool helperStarting: false
+    // A refreshEvents() call that waits for the helper to start
+    property bool refreshAfterHelperStart: false
+    
+    // Set while reading config.json right after authentication
+    property bool configLoadAfterAuth: false
+    // Version of config.json last applied, see watchConfig()
+    property int configVersion: 0
+    property bool configWatchActive: false
+    
+    // Token refresh state, see refreshAccessToken()
+    property double tokenRefreshedAt: 0
+    property string adoptedAccessToken: ""
     
     function getHomeDir() {
         // Get home directory by using the known plasmoid path structure
@@ -147,6 +163,7 @@ PlasmoidItem {
         // Clear models
         calendarListModel.clear()
         calendarModel.clear()
+        eventsRevision = ""
         
         // Close popup if open
         if (showConfigModal) {
@@ -156,9 +173,10 @@ PlasmoidItem {
         root.statusText = "Logged out. Please authenticate again."
     }
     
-    function loadAccessTokenFromConfig() {
+    function loadAccessTokenFromConfig(afterAuth) {
         // Read config file using P5Support.DataSource (executable engine) to read the file
         // This works around XMLHttpRequest file reading restrictions
+        configLoadAfterAuth = afterAuth === true
         var homeDir = getHomeDir()
         var configPath = homeDir + "/.config/kagenda/config.json"
         
@@ -166,6 +184,180 @@ PlasmoidItem {
         configReader.connectSource("cat '" + configPath + "' 2>/dev/null || echo '{}'")
     }
     
+    function applyConfigFile(config) {
+        // The helper replaces config.json atomically, so this single read is
+        // complete: no need to wait for Python to finish writing it
+        var afterAuth = configLoadAfterAuth
+        configLoadAfterAuth = false
+        
+        var tokenChanged = adoptConfig(config)
+        if (config.access_token) {
+            console.log("Access token loaded and saved to configuration:", config.access_token.substring(0, 20) + "...")
+        } else {
+            console.log("No access_token found in config file")
+        }
+        
+        // Use plasmoid.configuration directly to avoid timing issues with property bindings
+        var hasToken = plasmoid.configuration.accessToken && plasmoid.configuration.accessToken.length > 0
+        var hasCalendar = plasmoid.configuration.calendarId && plasmoid.configuration.calendarId.length > 0
+        console.log("Config loaded: hasToken:", hasToken, "hasCalendar:", hasCalendar)
+        
+        if (afterAuth) {
+            root.statusText = "Authentication successful! " + calendarListModel.count + " calendar(s) loaded."
+        }
+        if (hasToken && hasCalendar) {
+            // A new token reloads the events through onCfg_accessTokenChanged
+            if (!tokenChanged) {
+                statusText = "Loading events..."
+                refreshEvents()
+                refreshTodos()
+            }
+        } else {
+            if (!afterAuth) {
+                statusText = hasToken ? "Please select a calendar" : "Please configure the widget"
+            }
+            // Open configuration popup so a calendar can be selected (or authentication started)
+            Qt.callLater(function() {
+                root.showConfigModal = true
+            })
+        }
+    }
+    
+    function adoptConfig(config) {
+        // Save the values from config.json to the plasmoid configuration and
+        // return whether the token changed (which reloads the events)
+        if (config.version) {
+            configVersion = config.version
+        }
+        if (!config.access_token) {
+            return false
+        }
+        var tokenChanged = config.access_token !== plasmoid.configuration.accessToken
+        plasmoid.configuration.accessToken = config.access_token
+        if (config.provider) {
+            plasmoid.configuration.provider = config.provider
+        }
+        if (config.nextcloud_server) {
+            plasmoid.configuration.nextcloudServer = config.nextcloud_server
+        }
+        return tokenChanged
+    }
+    
+    function watchConfig() {
+        // Long-poll the helper for config.json changes (a new token after an
+        // authentication or a refresh, another provider) instead of polling
+        // the file. Each reply re-arms the watch.
+        if (configWatchActive || helperPort <= 0) {
+            return
+        }
+        configWatchActive = true
+        callHelper("watch_config", {version: configVersion, timeout: 300}, function(result, error) {
+            configWatchActive = false
+            if (!result) {
+                // A restarted helper starts a new watch once it is up
+                console.log("Config watch failed:", error)
+                if (helperPort > 0) {
+                    configWatchRetryTimer.start()
+                }
+                return
+            }
+            if (result.changed) {
+                console.log("config.json changed, version", result.config.version)
+                adoptConfig(result.config)
+            }
+            watchConfig()
+        })
+    }
+    
+    function getHelperScriptPath() {
+        return getHomeDir() + "/.local/share/plasma/plasmoids/com.github.kagenda/oauth-helper.py"
+    }
+    
+    function startHelper() {
+        // Start (or attach to) the long-lived helper. It detaches itself and
+        // prints its port and token, so the DataSource returns immediately.
+        helperStarting = true
+        helperLauncher.connectSource("python3 '" + getHelperScriptPath() + "' --serve")
+    }
+    
+    function callHelper(method, params, callback) {
+        // Call a method on the long-lived helper: callback(result, error)
+        if (helperPort <= 0) {
+            callback(null, "Helper not running")
+            return
+        }
+        
+        var request = new XMLHttpRequest()
+        request.open("POST", "http://127.0.0.1:" + helperPort + "/")
+        request.setRequestHeader("Content-Type", "application/json")
+        request.setRequestHeader("X-KAgenda-Token", helperToken)
+        
+        request.onreadystatechange = function() {
+            if (request.readyState === XMLHttpRequest.DONE) {
+                if (request.status === 0) {
+                    // Helper went away - forget it and restart it for next time
+                    console.log("Helper not reachable, restarting it")
+                    helperPort = 0
+                    startHelper()
+                    callback(null, "Helper not reachable")
+                    return
+                }
+                try {
+                    var reply = JSON.parse(request.responseText)
+                    callback(reply.error ? null : reply.result, reply.error || "")
+                } catch(e) {
+                    callback(null, "Invalid helper reply: " + e.toString())
+                }
+            }
+        }
+        
+        request.send(JSON.stringify({method: method, params: params || {}}))
+    }
+    
+    function refreshAccessToken(rejectedToken) {
+        // Refresh the access token the server rejected without a full login.
+        // A token rejected again right after a refresh needs the OAuth flow.
+        if (Date.now() - tokenRefreshedAt < 60000) {
+            executeOAuthScript()
+            return
+        }
+        tokenRefreshedAt = Date.now()
+        statusText = "Authentication expired. Refreshing token..."
+        
+        var provider = cfg_provider || "google"
+        var params = {provider: provider, rejected_token: rejectedToken}
+        if (provider === "nextcloud") {
+            // The helper also finds these next to the token saved at login
+            params.server_url = cfg_nextcloudServer
+            params.token_endpoint = plasmoid.configuration.nextcloudTokenEndpoint || ""
+            params.client_id = plasmoid.configuration.nextcloudClientId || ""
+            params.client_secret = plasmoid.configuration.nextcloudClientSecret || ""
+        }
+        callHelper("refresh_token", params, function(result, error) {
+            if (result) {
+                adoptAccessToken(result.access_token)
+                return
+            }
+            if (helperPort > 0) {
+                // The helper is running but could not refresh: log in again
+                console.log("Token refresh failed (" + error + "), running OAuth helper")
+                executeOAuthScript()
+                return
+            }
+            console.log("Helper token refresh failed (" + error + "), spawning Python helper...")
+            tokenRefresher.connectSource("python3 '" + getHelperScriptPath() + "' --refresh-token " + provider + " --force")
+        })
+    }
+    
+    function adoptAccessToken(token) {
+        if (!token || token === cfg_accessToken) {
+            refreshEvents()
+            return
+        }
+        // onCfg_accessTokenChanged reloads the events with the new token
+        plasmoid.configuration.accessToken = token
+    }
+    
     function parseCalendarList(jsonString) {
         try {
             // Clean the JSON string - remove any non-JSON content
@@ -217,8 +409,9 @@ PlasmoidItem {
         }
     }
     
-    function refreshEvents() {
-        // Use cfg_ properties directly
+    function refreshEvents(direct) {
+        // Use cfg_ properties directly. Google calendars go through the
+        // helper's incremental sync unless direct is set (helper unavailable)
         var token = cfg_accessToken || ""
         var calId = cfg_calendarId || ""
         var provider = cfg_provider || ""
@@ -236,22 +429,40 @@ PlasmoidItem {
         
         statusText = "Loading events..."
         
+        if (helperStarting && !direct) {
+            // Fetch through the helper once it is up, see helperLauncher
+            refreshAfterHelperStart = true
+            return
+        }
+        
         var now = new Date()
         var days = cfg_daysToShow || 0
         var later = new Date(now.getTime() + days * 24 * 60 * 60 * 1000)
         var timeMin = now.toISOString()
         var timeMax = later.toISOString()
         
+        // Several calendars (comma-separated IDs) are fetched together by the helper
+        var calIds = calId.split(",").map(function(id) { return id.trim() }).filter(function(id) { return id.length > 0 })
+        if (calIds.length > 1) {
+            fetchCalendars(calIds, provider, token, timeMin, timeMax)
+            return
+        }
+        
         var url = ""
         var request = new XMLHttpRequest()
         
         if (provider === "google") {
+            if (!direct) {
+                fetchGoogleEvents(calId, token, timeMin, timeMax)
+                return
+            }
+            
             // Google Calendar API
             url = "https://www.googleapis.com/calendar/v3/calendars/" + 
                   encodeURIComponent(calId) + 
                   "/events?timeMin=" + encodeURIComponent(timeMin) + 
                   "&timeMax=" + encodeURIComponent(timeMax) + 
-                  "&maxResults=50&singleEvents=true&orderBy=startTime"
+                  "&maxResults=2500&singleEvents=true&orderBy=startTime"
             
             request.open("GET", url)
             request.setRequestHeader("Authorization", "Bearer " + token)
@@ -266,6 +477,12 @@ PlasmoidItem {
             // Normalize server URL
             serverUrl = serverUrl.replace(/\/$/, "")
             
+            if (helperPort > 0) {
+                // The helper speaks CalDAV, no need to probe the REST API first
+                fetchCaldavEvents(serverUrl, calId, token, timeMin, timeMax)
+                return
+            }
+            
             // Nextcloud Calendar API - try multiple endpoint formats
             // Nextcloud Calendar app may use different endpoint formats depending on version
             // Try: /apps/calendar/api/v1/calendars/{id}/events (Calendar app API)
@@ -296,6 +513,8 @@ PlasmoidItem {
                         var response = JSON.parse(request.responseText)
                         console.log("Event fetch response (first 500 chars):", JSON.stringify(response).substring(0, 500))
                         calendarModel.clear()
+                        eventsFetchedAt = Date.now() / 1000
+                        eventsRevision = ""
                         
                         var events = []
                         
@@ -390,26 +609,13 @@ PlasmoidItem {
                     }
                 } else if (request.status === 401) {
                     console.log("Authentication expired (401)")
-                    statusText = "Authentication expired. Refreshing token..."
-                    // Token expired - try to refresh by running OAuth helper
-                    // The Python script will automatically refresh if refresh_token exists
-                    executeOAuthScript()
+                    refreshAccessToken(token)
                 } else if (request.status === 404) {
                     console.log("404 Not Found - REST API not available, trying CalDAV via Python helper...")
                     console.log("Calendar ID:", calId)
                     
                     // XMLHttpRequest doesn't support REPORT method, use Python helper instead
-                    var homeDir = getHomeDir()
-                    var scriptPath = homeDir + "/.local/share/plasma/plasmoids/com.github.kagenda/oauth-helper.py"
-                    var command = "python3 '" + scriptPath + "' --fetch-events '" + 
-                                  serverUrl + "' '" + 
-                                  calId + "' '" + 
-                                  token + "' '" + 
-                                  timeMin + "' '" + 
-                                  timeMax + "'"
-                    
-                    console.log("Calling Python helper for CalDAV events...")
-                    caldavEventFetcher.connectSource(command)
+                    fetchCaldavEvents(serverUrl, calId, token, timeMin, timeMax)
                     return // Don't show error message yet, wait for Python response
                 } else {
                     console.log("Error loading events - Status:", request.status)
@@ -422,6 +628,246 @@ PlasmoidItem {
         request.send()
     }
     
+    function fetchCaldavEvents(serverUrl, calId, token, timeMin, timeMax) {
+        // Prefer the long-lived helper: one local request, no process spawn
+        var params = {
+            server_url: serverUrl,
+            calendar_id: calId,
+            access_token: token,
+            time_min: timeMin,
+            time_max: timeMax,
+            stale_ok: true,
+            base_revision: eventsRevision
+        }
+        callHelper("fetch_events", params, function handle(result, error) {
+            if (result) {
+                try {
+                    applyHelperEvents(result)
+                } catch(e) {
+                    console.log("Error parsing CalDAV events:", e)
+                    statusText = "Error parsing CalDAV events: " + e.toString()
+                }
+                if (result.stale) {
+                    // Shown from the helper's saved copy, now wait for fresh events
+                    params.stale_ok = false
+                    params.base_revision = eventsRevision
+                    callHelper("fetch_events", params, handle)
+                }
+                return
+            }
+            
+            if (error.indexOf("401") >= 0) {
+                console.log("Authentication expired (401)")
+                refreshAccessToken(token)
+                return
+            }
+            
+            console.log("Helper fetch failed (" + error + "), spawning Python helper for CalDAV events...")
+            var command = "python3 '" + getHelperScriptPath() + "' --fetch-events '" + 
+                          serverUrl + "' '" + 
+                          calId + "' '" + 
+                          token + "' '" + 
+                          timeMin + "' '" + 
+                          timeMax + "'"
+            caldavEventFetcher.connectSource(command)
+        })
+    }
+    
+    function fetchGoogleEvents(calId, token, timeMin, timeMax) {
+        // The helper keeps a synced copy of the calendar, so a refresh only
+        // transfers what changed and is never cut off at a page size
+        var params = {
+            calendar_id: calId,
+            access_token: token,
+            time_min: timeMin,
+            time_max: timeMax,
+            stale_ok: true,
+            base_revision: eventsRevision
+        }
+        callHelper("fetch_google_events", params, function handle(result, error) {
+            if (result) {
+                try {
+                    applyHelperEvents(result)
+                } catch(e) {
+                    console.log("Error parsing Google events:", e)
+                    statusText = "Error parsing events: " + e.toString()
+                }
+                if (result.stale) {
+                    params.stale_ok = false
+                    params.base_revision = eventsRevision
+                    callHelper("fetch_google_events", params, handle)
+                }
+                return
+            }
+            
+            if (error.indexOf("401") >= 0) {
+                console.log("Authentication expired (401)")
+                refreshAccessToken(token)
+                return
+            }
+            
+            console.log("Helper Google fetch failed (" + error + "), querying the API directly")
+            refreshEvents(true)
+        })
+    }
+    
+    function fetchCalendars(calIds, provider, token, timeMin, timeMax) {
+        // All calendars are queried concurrently and merged by start time
+        var serverUrl = (cfg_nextcloudServer || "").replace(/\/$/, "")
+        var calendars = []
+        for (var i = 0; i < calIds.length; i++) {
+            calendars.push({
+                provider: provider,
+                calendar_id: calIds[i],
+                access_token: token,
+                server_url: serverUrl
+            })
+        }
+        var params = {
+            calendars: calendars,
+            time_min: timeMin,
+            time_max: timeMax,
+            stale_ok: true,
+            base_revision: eventsRevision
+        }
+        callHelper("fetch_calendars", params, function handle(result, error) {
+            if (result) {
+                try {
+                    applyHelperEvents(result)
+                } catch(e) {
+                    console.log("Error parsing events:", e)
+                    statusText = "Error parsing events: " + e.toString()
+                }
+                if (result.stale) {
+                    params.stale_ok = false
+                    params.base_revision = eventsRevision
+                    callHelper("fetch_calendars", params, handle)
+                }
+                return
+            }
+            
+            if (error.indexOf("401") >= 0) {
+                console.log("Authentication expired (401)")
+                refreshAccessToken(token)
+                return
+            }
+            
+            console.log("Helper fetch failed (" + error + "), spawning Python helper for all calendars...")
+            var calendarsJson = JSON.stringify(calendars).replace(/'/g, "'\\''")
+            var command = "python3 '" + getHelperScriptPath() + "' --fetch-calendars '" + 
+                          calendarsJson + "' '" + 
+                          timeMin + "' '" + 
+                          timeMax + "'"
+            caldavEventFetcher.connectSource(command)
+        })
+    }
+    
+    function applyHelperEvents(response) {
+        if (response.access_token && response.access_token !== cfg_accessToken) {
+            // The helper refreshed the token in the background
+            adoptedAccessToken = response.access_token
+            plasmoid.configuration.accessToken = response.access_token
+        }
+        if (response.errors && Object.keys(response.errors).length > 0) {
+            console.log("Some calendars could not be fetched:", JSON.stringify(response.errors))
+        }
+        
+        eventsRevision = response.revision || ""
+        if (response.ops) {
+            // Only what changed since the view we show
+            applyEventOps(response.ops)
+            finishEventsUpdate(response)
+            return
+        }
+        calendarModel.clear()
+        
+        // The long-lived helper sends ready-to-show rows grouped by day
+        var days = response.days || []
+        for (var d = 0; d < days.length; d++) {
+            calendarModel.append(days[d].events)
+        }
+        
+        // Events printed by a spawned helper still need formatting
+        var events = response.items || []
+        for (var i = 0; i < events.length; i++) {
+            var event = events[i]
+            var start = event.start
+            var summary = event.summary || "No Title"
+            var location = event.location || ""
+            
+            if (!start) continue
+            
+            // The helper sends normalized timestamps: no date parsing needed
+            var startDate = new Date(event.start_ms)
+            var endDate = new Date(event.end_ms)
+            
+            var isAllDay = event.all_day
+            var dateStr = isAllDay ? start : startDate.toISOString().split('T')[0]
+            var timeStr = ""
+            
+            if (!isAllDay && startDate) {
+                var startTime = startDate.toLocaleTimeString('en-US', {hour: '2-digit', minute: '2-digit', hour12: false})
+                var endTime = endDate.toLocaleTimeString('en-US', {hour: '2-digit', minute: '2-digit', hour12: false})
+                timeStr = startTime + " - " + endTime
+            } else {
+                timeStr = "All day"
+            }
+            
+            calendarModel.append({
+                title: summary,
+                date: dateStr,
+                time: timeStr,
+                location: location
+            })
+        }
+        
+        finishEventsUpdate(response)
+    }
+    
+    function applyEventOps(ops) {
+        for (var i = 0; i < ops.length; i++) {
+            var op = ops[i]
+            if (op.op === "remove") {
+                calendarModel.remove(op.index, op.count)
+            } else if (op.op === "insert") {
+                for (var j = 0; j < op.rows.length; j++) {
+                    calendarModel.insert(op.index + j, op.rows[j])
+                }
+            } else if (op.op === "move") {
+                calendarModel.move(op.from, op.to, 1)
+            } else if (op.op === "set") {
+                calendarModel.set(op.index, op.row)
+            }
+        }
+    }
+    
+    function finishEventsUpdate(response) {
+        console.log("Loaded", calendarModel.count, "events from helper")
+        eventsFetchedAt = response.fetched_at || Date.now() / 1000
+        if (response.stale) {
+            statusText = "Showing " + calendarModel.count + " events from " +
+                         Qt.formatDateTime(new Date(eventsFetchedAt * 1000), "ddd hh:mm") + ", updating..."
+        } else {
+            statusText = "Loaded " + calendarModel.count + " events"
+        }
+    }
+    
+    function snapshotKey() {
+        // Matches the key the helper saves its last result under
+        var calIds = (cfg_calendarId || "").split(",").map(function(id) { return id.trim() }).filter(function(id) { return id.length > 0 })
+        return (cfg_provider || "google") + ":" + calIds.join(",")
+    }
+    
+    function loadSnapshots() {
+        // Show the events and tasks the helper saved last time right away,
+        // before the helper is even started or any network request is made
+        var dir = "\"${XDG_CACHE_HOME:-$HOME/.cache}/kagenda/"
+        snapshotReader.connectSource("cat " + dir + "events-snapshot.json\" 2>/dev/null")
+        if (cfg_provider === "google") {
+            snapshotReader.connectSource("cat " + dir + "tasks-snapshot.json\" 2>/dev/null")
+        }
+    }
+    
     // DataSource for fetching CalDAV events via Python helper
     P5Support.DataSource {
         id: caldavEventFetcher
@@ -437,79 +883,14 @@ PlasmoidItem {
             
             if (exitCode === 0 && stdout && stdout.trim()) {
                 try {
-                    var response = JSON.parse(stdout.trim())
-                    console.log("CalDAV events response:", JSON.stringify(response).substring(0, 500))
-                    calendarModel.clear()
-                    
-                    var events = response.items || []
-                    console.log("Found", events.length, "events from CalDAV")
-                    
-                    for (var i = 0; i < events.length; i++) {
-                        var event = events[i]
-                        var start = event.start
-                        var end = event.end
-                        var summary = event.summary || "No Title"
-                        var location = event.location || ""
-                        
-                        if (!start) continue
-                        
-                        // Parse iCalendar date format (YYYYMMDDTHHMMSSZ or YYYYMMDD)
-                        var startDate, endDate
-                        if (start.length === 8) {
-                            // All-day event (YYYYMMDD)
-                            startDate = new Date(start.substring(0,4), parseInt(start.substring(4,6))-1, start.substring(6,8))
-                            endDate = end && end.length === 8 ? new Date(end.substring(0,4), parseInt(end.substring(4,6))-1, end.substring(6,8)) : startDate
-                        } else if (start.length >= 15) {
-                            // Date-time (YYYYMMDDTHHMMSSZ)
-                            var year = start.substring(0,4)
-                            var month = parseInt(start.substring(4,6)) - 1
-                            var day = start.substring(6,8)
-                            var hour = start.substring(9,11) || 0
-                            var minute = start.substring(11,13) || 0
-                            var second = start.substring(13,15) || 0
-                            startDate = new Date(Date.UTC(year, month, day, hour, minute, second))
-                            
-                            if (end && end.length >= 15) {
-                                var endYear = end.substring(0,4)
-                                var endMonth = parseInt(end.substring(4,6)) - 1
-                                var endDay = end.substring(6,8)
-                                var endHour = end.substring(9,11) || 0
-                                var endMinute = end.substring(11,13) || 0
-                                var endSecond = end.substring(13,15) || 0
-                                endDate = new Date(Date.UTC(endYear, endMonth, endDay, endHour, endMinute, endSecond))
-                            } else {
-                                endDate = startDate
-                            }
-                        } else {
-                            continue
-                        }
-                        
-                        var dateStr = startDate.toISOString().split('T')[0]
-                        var timeStr = ""
-                        var isAllDay = start.length === 8
-                        
-                        if (!isAllDay && startDate) {
-                            var startTime = startDate.toLocaleTimeString('en-US', {hour: '2-digit', minute: '2-digit', hour12: false})
-                            var endTime = endDate.toLocaleTimeString('en-US', {hour: '2-digit', minute: '2-digit', hour12: false})
-                            timeStr = startTime + " - " + endTime
-                        } else {
-                            timeStr = "All day"
-                        }
-                        
-                        calendarModel.append({
-                            title: summary,
-                            date: dateStr,
-                            time: timeStr,
-                            location: location
-                        })
-                    }
-                    
-                    console.log("Loaded", calendarModel.count, "events from CalDAV")
-                    statusText = "Loaded " + calendarModel.count + " events"
+                    applyHelperEvents(JSON.parse(stdout.trim()))
                 } catch(e) {
                     console.log("Error parsing CalDAV events:", e)
                     statusText = "Error parsing CalDAV events: " + e.toString()
                 }
+            } else if (stderr.indexOf("401") >= 0) {
+                console.log("Authentication expired (401)")
+                refreshAccessToken(cfg_accessToken)
             } else {
                 console.log("CalDAV fetch error:", stderr)
                 statusText = "Failed to fetch events: " + (stderr || "Unknown error")
@@ -518,6 +899,97 @@ PlasmoidItem {
         }
     }
     
+    // DataSource for reading the helper's saved events and tasks, see loadSnapshots()
+    P5Support.DataSource {
+        id: snapshotReader
+        engine: "executable"
+        connectedSources: []
+        
+        onNewData: function(sourceName, data) {
+            var stdout = data.stdout || ""
+            disconnectSource(sourceName)
+            if (data["exit code"] !== 0 || !stdout.trim()) {
+                return
+            }
+            try {
+                var snapshot = JSON.parse(stdout.trim())
+                snapshot.stale = true
+                if (sourceName.indexOf("tasks-snapshot") >= 0) {
+                    // Fresh tasks may have arrived first
+                    if (todoListModel.count === 0) {
+                        applyHelperTasks(snapshot)
+                    }
+                } else if (eventsFetchedAt === 0 && snapshot.key === snapshotKey()) {
+                    var now = Date.now()
+                    snapshot.days = (snapshot.days || []).map(function(day) {
+                        return {date: day.date, events: day.events.filter(function(row) { return row.end_ms > now })}
+                    })
+                    applyHelperEvents(snapshot)
+                }
+            } catch(e) {
+                console.log("Error parsing saved snapshot:", e)
+            }
+        }
+    }
+    
+    // DataSource for refreshing the access token when the helper is not running
+    P5Support.DataSource {
+        id: tokenRefresher
+        engine: "executable"
+        connectedSources: []
+        
+        onNewData: function(sourceName, data) {
+            var stdout = data.stdout || ""
+            var token = ""
+            if (data["exit code"] === 0 && stdout.trim()) {
+                try {
+                    token = JSON.parse(stdout.trim()).access_token || ""
+                } catch(e) {
+                    console.log("Error parsing refreshed token:", e)
+                }
+            }
+            disconnectSource(sourceName)
+            
+            if (token) {
+                adoptAccessToken(token)
+            } else {
+                console.log("Token refresh failed:", data.stderr || "")
+                executeOAuthScript()
+            }
+        }
+    }
+    
+    // DataSource for starting the long-lived helper
+    P5Support.DataSource {
+        id: helperLauncher
+        engine: "executable"
+        connectedSources: []
+        
+        onNewData: function(sourceName, data) {
+            var stdout = data.stdout || ""
+            if (data["exit code"] === 0 && stdout.trim()) {
+                try {
+                    var state = JSON.parse(stdout.trim())
+                    helperToken = state.token
+                    helperPort = state.port
+                    console.log("Helper running on port", helperPort)
+                    watchConfig()
+                } catch(e) {
+                    console.log("Error parsing helper state:", e)
+                }
+            } else {
+                console.log("Failed to start helper:", data.stderr || "")
+            }
+            disconnectSource(sourceName)
+            helperStarting = false
+            if (refreshAfterHelperStart) {
+                // Without a helper this falls back to spawning commands
+                refreshAfterHelperStart = false
+                refreshEvents()
+            }
+        }
+    }
+    
     // DataSource for reading config file
     P5Support.DataSource {
         id: configReader
@@ -525,38 +997,19 @@ PlasmoidItem {
         connectedSources: []
         
         onNewData: function(sourceName, data) {
-            if (data["exit code"] === 0) {
-                var output = data.stdout || ""
-                if (output && output.trim()) {
-                    try {
-                        var config = JSON.parse(output.trim())
-                        if (config.access_token) {
-                            // Save to plasmoid configuration
-                            plasmoid.configuration.accessToken = config.access_token
-                            if (config.provider) {
-                                plasmoid.configuration.provider = config.provider
-                            }
-                            if (config.nextcloud_server) {
-                                plasmoid.configuration.nextcloudServer = config.nextcloud_server
-                            }
-                            console.log("Access token loaded and saved to configuration:", config.access_token.substring(0, 20) + "...")
-                            
-                            // Wait a moment for the property binding to update, then check if we can refresh events
-                            // Use a timer to ensure cfg_accessToken property has updated
-                            tokenLoadedTimer.start()
-                        } else {
-                            console.log("No access_token found in config file")
-                        }
-                    } catch(e) {
-                        console.log("Error parsing config:", e, "Output:", output.substring(0, 100))
-                    }
-                } else {
-                    console.log("Config file is empty or could not be read")
+            var config = {}
+            var output = data.stdout || ""
+            if (data["exit code"] === 0 && output.trim()) {
+                try {
+                    config = JSON.parse(output.trim())
+                } catch(e) {
+                    console.log("Error parsing config:", e, "Output:", output.substring(0, 100))
                 }
             } else {
                 console.log("Failed to read config file, exit code:", data["exit code"])
             }
             disconnectSource(sourceName)
+            applyConfigFile(config)
         }
     }
     
@@ -586,24 +1039,17 @@ PlasmoidItem {
                         // Parse calendar list first (this is the main output)
                         parseCalendarList(jsonOutput)
                         
-                        // Wait a moment for Python script to finish writing config file, then load token
-                        // The configReader will update the token asynchronously
-                        // Use Timer instead of setTimeout (which doesn't exist in QML)
-                        tokenLoadTimer.interval = 200 // Wait 200ms for Python to write the file
-                        tokenLoadTimer.start()
+                        // The script saved the token to the config file before exiting
+                        loadAccessTokenFromConfig(true)
                     } catch(e) {
                         console.log("Error parsing calendar list:", e)
                         console.log("Full stdout:", stdout)
                         root.statusText = "Error parsing calendar list: " + e.toString()
                     }
                 } else {
-                    // No output but exit code 0 - might still be processing
+                    // No output but exit code 0 - load the token from config
                     root.statusText = "Authentication completed. Loading calendar list..."
-                    // Try to load from config and check for output file
-                    loadAccessTokenFromConfig()
-                    if (fullRepresentation && fullRepresentation.oauthOutputTimerInstance) {
-                        fullRepresentation.oauthOutputTimerInstance.start()
-                    }
+                    loadAccessTokenFromConfig(true)
                 }
             } else {
                 // Error occurred - show stderr if available, otherwise generic message
@@ -645,7 +1091,9 @@ PlasmoidItem {
         }
     }
     
-    function refreshTodos() {
+    function refreshTodos(direct) {
+        // All task lists are fetched by the helper in one call unless direct
+        // is set (helper unavailable)
         var token = cfg_accessToken || ""
         var provider = cfg_provider || ""
         
@@ -656,6 +1104,11 @@ PlasmoidItem {
         
         statusText = "Loading todos..."
         
+        if (!direct) {
+            fetchTasks(token)
+            return
+        }
+        
         var url = "https://www.googleapis.com/tasks/v1/users/@me/lists"
         var request = new XMLHttpRequest()
         
@@ -698,6 +1151,139 @@ PlasmoidItem {
         request.send()
     }
     
+    function fetchTasks(token) {
+        // The helper syncs every task list concurrently and only transfers
+        // tasks updated since the last refresh
+        var params = {access_token: token, stale_ok: true}
+        callHelper("fetch_tasks", params, function handle(result, error) {
+            if (result) {
+                try {
+                    applyHelperTasks(result)
+                } catch(e) {
+                    console.log("Error parsing todos:", e)
+                    statusText = "Error parsing todos: " + e.toString()
+                }
+                if (result.stale) {
+                    params.stale_ok = false
+                    callHelper("fetch_tasks", params, handle)
+                }
+                return
+            }
+            
+            if (error.indexOf("401") >= 0) {
+                console.log("Authentication expired (401)")
+                refreshAccessToken(token)
+                return
+            }
+            
+            console.log("Helper tasks fetch failed (" + error + "), querying the API directly")
+            refreshTodos(true)
+        })
+    }
+    
+    function applyHelperTasks(response) {
+        if (response.access_token && response.access_token !== cfg_accessToken) {
+            // The helper refreshed the token in the background
+            adoptedAccessToken = response.access_token
+            plasmoid.configuration.accessToken = response.access_token
+        }
+        if (response.errors && Object.keys(response.errors).length > 0) {
+            console.log("Some task lists could not be fetched:", JSON.stringify(response.errors))
+        }
+        
+        var tasks = {}
+        var items = response.items || []
+        for (var i = 0; i < items.length; i++) {
+            var listId = items[i].list_id
+            if (!tasks[listId]) {
+                tasks[listId] = []
+            }
+            tasks[listId].push(items[i])
+        }
+        tasksByList = tasks
+        
+        // Keep showing the current list if it still exists, else the first
+        var taskLists = response.lists || []
+        var shownListId = taskLists.length > 0 ? taskLists[0].id : ""
+        for (var k = 0; k < taskLists.length; k++) {
+            if (taskLists[k].id === currentTaskListId) {
+                shownListId = currentTaskListId
+            }
+        }
+        
+        // Reconcile the lists by id like fillTodoModel(), so the selector
+        // is not emptied and rebuilt on every refresh
+        for (var j = 0; j < taskLists.length; j++) {
+            var row = {
+                id: taskLists[j].id,
+                title: taskLists[j].title
+            }
+            var m = j
+            while (m < todoListModel.count && todoListModel.get(m).id !== row.id) {
+                m++
+            }
+            if (m === todoListModel.count) {
+                todoListModel.insert(j, row)
+                continue
+            }
+            if (m !== j) {
+                todoListModel.move(m, j, 1)
+            }
+            todoListModel.set(j, row)
+        }
+        if (todoListModel.count > taskLists.length) {
+            todoListModel.remove(taskLists.length, todoListModel.count - taskLists.length)
+        }
+        
+        if (shownListId) {
+            showTaskList(shownListId)
+        }
+        taskListsApplied()
+        
+        statusText = "Todos loaded"
+    }
+    
+    function showTaskList(taskListId) {
+        // Task lists fetched by the helper are shown without another request
+        currentTaskListId = taskListId
+        var tasks = tasksByList[taskListId]
+        if (!tasks) {
+            loadTasksFromList(taskListId)
+            return
+        }
+        fillTodoModel(tasks)
+    }
+    
+    function fillTodoModel(tasks) {
+        // Update the rows in place, matched by task id, so unchanged tasks
+        // keep their delegates and the list does not jump
+        for (var i = 0; i < tasks.length; i++) {
+            var task = tasks[i]
+            var row = {
+                id: task.id,
+                title: task.title,
+                notes: task.notes || "",
+                completed: task.status === "completed",
+                due: task.due || ""
+            }
+            var j = i
+            while (j < todoModel.count && todoModel.get(j).id !== task.id) {
+                j++
+            }
+            if (j === todoModel.count) {
+                todoModel.insert(i, row)
+                continue
+            }
+            if (j !== i) {
+                todoModel.move(j, i, 1)
+            }
+            todoModel.set(i, row)
+        }
+        if (todoModel.count > tasks.length) {
+            todoModel.remove(tasks.length, todoModel.count - tasks.length)
+        }
+    }
+    
     function loadTasksFromList(taskListId) {
         var token = cfg_accessToken || ""
         
@@ -714,19 +1300,9 @@ PlasmoidItem {
                 if (request.status === 200) {
                     try {
                         var response = JSON.parse(request.responseText)
-                        todoModel.clear()
-                        
                         var tasks = response.items || []
-                        for (var i = 0; i < tasks.length; i++) {
-                            var task = tasks[i]
-                            todoModel.append({
-                                id: task.id,
-                                title: task.title,
-                                notes: task.notes || "",
-                                completed: task.status === "completed",
-                                due: task.due || ""
-                            })
-                        }
+                        tasksByList[taskListId] = tasks
+                        fillTodoModel(tasks)
                         
                         statusText = "Tasks loaded"
                     } catch(e) {
@@ -743,11 +1319,43 @@ PlasmoidItem {
         request.send()
     }
     
-    function createTodo(title, notes, taskListId) {
+    function queueTaskOp(op, taskListId, taskId, fields, fallback) {
+        // The helper applies the edit to its task store right away and sends
+        // queued edits to Google in one batch request a moment later
+        callHelper("queue_task_op", {
+            op: op,
+            list_id: taskListId,
+            task_id: taskId,
+            fields: fields,
+            access_token: cfg_accessToken || ""
+        }, function(result, error) {
+            if (!result) {
+                console.log("Helper could not queue the task edit (" + error + "), sending it directly")
+                fallback()
+                return
+            }
+            var tasks = tasksByList
+            tasks[taskListId] = result.items
+            tasksByList = tasks
+            if (currentTaskListId === taskListId) {
+                fillTodoModel(result.items)
+            }
+            statusText = result.pending > 0 ? "Todos saved (" + result.pending + " pending sync)" : "Todos saved"
+        })
+    }
+    
+    function createTodo(title, notes, taskListId, direct) {
         var token = cfg_accessToken || ""
         
         if (!token || !taskListId) return
         
+        if (!direct) {
+            queueTaskOp("insert", taskListId, "", {title: title, notes: notes || ""}, function() {
+                createTodo(title, notes, taskListId, true)
+            })
+            return
+        }
+        
         var url = "https://www.googleapis.com/tasks/v1/lists/" + taskListId + "/tasks"
         var request = new XMLHttpRequest()
         
@@ -776,11 +1384,27 @@ PlasmoidItem {
         request.send(JSON.stringify(taskData))
     }
     
-    function updateTodo(taskListId, taskId, title, notes, completed) {
+    function updateTodo(taskListId, taskId, title, notes, completed, direct) {
         var token = cfg_accessToken || ""
         
         if (!token || !taskListId || !taskId) return
         
+        if (!direct) {
+            var fields = {
+                title: title,
+                notes: notes || "",
+                status: completed ? "completed" : "needsAction"
+            }
+            if (!completed) {
+                // Google keeps the completion date unless it is cleared
+                fields.completed = null
+            }
+            queueTaskOp("update", taskListId, taskId, fields, function() {
+                updateTodo(taskListId, taskId, title, notes, completed, true)
+            })
+            return
+        }
+        
         var url = "https://www.googleapis.com/tasks/v1/lists/" + taskListId + "/tasks/" + taskId
         var request = new XMLHttpRequest()
         
@@ -810,11 +1434,18 @@ PlasmoidItem {
         request.send(JSON.stringify(taskData))
     }
     
-    function deleteTodo(taskListId, taskId) {
+    function deleteTodo(taskListId, taskId, direct) {
         var token = cfg_accessToken || ""
         
         if (!token || !taskListId || !taskId) return
         
+        if (!direct) {
+            queueTaskOp("delete", taskListId, taskId, {}, function() {
+                deleteTodo(taskListId, taskId, true)
+            })
+            return
+        }
+        
         var url = "https://www.googleapis.com/tasks/v1/lists/" + taskListId + "/tasks/" + taskId
         var request = new XMLHttpRequest()
         
@@ -973,10 +1604,19 @@ PlasmoidItem {
                         model: todoListModel
                         textRole: "title"
                         valueRole: "id"
+                        
+                        // Select the shown list again after the lists were reconciled
+                        Connections {
+                            target: root
+                            function onTaskListsApplied() {
+                                taskListCombo.currentIndex = taskListCombo.indexOfValue(currentTaskListId)
+                            }
+                        }
+                        
                         onCurrentIndexChanged: {
                             if (currentIndex >= 0 && todoListModel.count > currentIndex) {
                                 var taskListId = todoListModel.get(currentIndex).id
-                                loadTasksFromList(taskListId)
+                                showTaskList(taskListId)
                             }
                         }
                     }
@@ -1093,65 +1733,6 @@ PlasmoidItem {
                 }
             }
         }
-        
-        // Timer to check for OAuth completion (kept for backward compatibility)
-        property alias oauthOutputTimer: oauthOutputTimerInstance
-        Timer {
-            id: oauthOutputTimerInstance
-            interval: 1000
-            repeat: true
-            running: false
-            
-            onTriggered: {
-                var homeDir = root.getHomeDir()
-                
-                // Check for output file from wrapper script
-                var outputFile = "file://" + homeDir + "/.local/share/plasma/plasmoids/com.github.kagenda/oauth-output.json"
-                var request = new XMLHttpRequest()
-                request.open("GET", outputFile, false)
-                request.send()
-                
-                if (request.status === 200 && request.responseText.trim()) {
-                    try {
-                        // Parse the calendar list JSON
-                        var calendarData = JSON.parse(request.responseText.trim())
-                        root.parseCalendarList(request.responseText.trim())
-                        
-                        // Load access token from config
-                        root.loadAccessTokenFromConfig()
-                        
-                        root.statusText = "Authentication successful! " + root.calendarListModel.count + " calendar(s) loaded."
-                        running = false
-                    } catch(e) {
-                        console.log("Error parsing output:", e)
-                    }
-                }
-                
-                // Also check config file directly as fallback
-                var configPath = "file://" + homeDir + "/.config/kagenda/config.json"
-                var configRequest = new XMLHttpRequest()
-                configRequest.open("GET", configPath, false)
-                configRequest.send()
-                
-                if (configRequest.status === 200) {
-                    try {
-                        var config = JSON.parse(configRequest.responseText.trim())
-                        if (config.access_token) {
-                            plasmoid.configuration.accessToken = config.access_token
-                            if (config.provider) {
-                                plasmoid.configuration.provider = config.provider
-                            }
-                            if (config.nextcloud_server) {
-                                plasmoid.configuration.nextcloudServer = config.nextcloud_server
-                            }
-                            running = false
-                        }
-                    } catch(e) {
-                        console.log("Error parsing config:", e)
-                    }
-                }
-            }
-        }
     }
     
     Component.onCompleted: {
@@ -1161,6 +1742,8 @@ PlasmoidItem {
         console.log("Current plasmoid.configuration.accessToken:", plasmoid.configuration.accessToken ? plasmoid.configuration.accessToken.substring(0, 20) + "..." : "empty")
         console.log("Current plasmoid.configuration.calendarId:", plasmoid.configuration.calendarId || "empty")
         
+        startHelper()
+        
         // First, check if we already have configuration saved (from previous session)
         // Plasma configuration persists across restarts, so check that first
         var hasToken = plasmoid.configuration.accessToken && plasmoid.configuration.accessToken.length > 0
@@ -1169,118 +1752,26 @@ PlasmoidItem {
         if (hasToken && hasCalendar) {
             console.log("Found saved configuration, refreshing events immediately...")
             statusText = "Loading events..."
-            // Use a small delay to ensure everything is initialized
+            loadSnapshots()
+            // Use a small delay to ensure everything is initialized; the
+            // fetch itself waits for the helper started above
             Qt.callLater(function() {
                 refreshEvents()
             })
         } else {
-            // No saved configuration, try to load from config file
+            // No saved configuration, try to load from config file.
+            // applyConfigFile() then refreshes or opens the configuration.
             console.log("No saved configuration found, loading from config file...")
             loadAccessTokenFromConfig()
-            
-            // Use a timer to wait for the config file to be read asynchronously
-            // Then check if we have configuration
-            Qt.callLater(function() {
-                // Give configReader time to load the token (it's async)
-                startupTimer.start()
-            })
         }
     }
     
-    // Timer to check configuration after startup token load
+    // Retry a failed config watch after a pause instead of hammering the helper
     Timer {
-        id: startupTimer
-        interval: 1500
+        id: configWatchRetryTimer
+        interval: 5000
         repeat: false
-        onTriggered: {
-            console.log("startupTimer triggered")
-            // Check if we have configuration (token might have been loaded from config file)
-            // Use plasmoid.configuration directly for more reliable checking
-            var hasToken = plasmoid.configuration.accessToken && plasmoid.configuration.accessToken.length > 0
-            var hasCalendar = plasmoid.configuration.calendarId && plasmoid.configuration.calendarId.length > 0
-            
-            console.log("startupTimer: hasToken:", hasToken, "hasCalendar:", hasCalendar)
-            
-            if (hasToken && hasCalendar) {
-                console.log("startupTimer: Both token and calendar found, refreshing events...")
-                statusText = "Loading events..."
-                refreshEvents()
-                refreshTodos()
-            } else if (hasToken && !hasCalendar) {
-                // We have token but no calendar selected - open config to select calendar
-                console.log("startupTimer: Token found but no calendar selected")
-                statusText = "Please select a calendar"
-                Qt.callLater(function() {
-                    root.showConfigModal = true
-                })
-            } else {
-                console.log("startupTimer: No configuration found")
-                statusText = "Please configure the widget"
-                // Open configuration popup automatically if not authenticated
-                Qt.callLater(function() {
-                    root.showConfigModal = true
-                })
-            }
-        }
-    }
-    
-    // Timer to refresh events after token is loaded from config file
-    Timer {
-        id: tokenLoadedTimer
-        interval: 500
-        repeat: false
-        onTriggered: {
-            console.log("tokenLoadedTimer triggered")
-            // Check if we have both token and calendar ID after loading token from config
-            // Use plasmoid.configuration directly to avoid timing issues with property bindings
-            var hasToken = plasmoid.configuration.accessToken && plasmoid.configuration.accessToken.length > 0
-            var hasCalendar = plasmoid.configuration.calendarId && plasmoid.configuration.calendarId.length > 0
-            
-            console.log("tokenLoadedTimer: hasToken:", hasToken, "hasCalendar:", hasCalendar)
-            
-            if (hasToken && hasCalendar) {
-                console.log("tokenLoadedTimer: Both token and calendar found, refreshing events...")
-                statusText = "Loading events..."
-                refreshEvents()
-                refreshTodos()
-            } else if (hasToken && !hasCalendar) {
-                console.log("tokenLoadedTimer: Token loaded but no calendar selected")
-                statusText = "Please select a calendar"
-            } else {
-                console.log("tokenLoadedTimer: Token or calendar missing")
-            }
-        }
-    }
-    
-    // Timer to load token after OAuth authentication
-    Timer {
-        id: tokenLoadTimer
-        interval: 200
-        repeat: false
-        onTriggered: {
-            // Load access token from config file (saved by Python script)
-            loadAccessTokenFromConfig()
-            
-            // Wait a bit more for the config reader to finish, then update status
-            tokenStatusTimer.interval = 300 // Wait 300ms for configReader to finish
-            tokenStatusTimer.start()
-        }
-    }
-    
-    // Timer to update status after token is loaded
-    Timer {
-        id: tokenStatusTimer
-        interval: 300
-        repeat: false
-        onTriggered: {
-            root.statusText = "Authentication successful! " + calendarListModel.count + " calendar(s) loaded."
-            
-            // Open configuration popup automatically after authentication
-            // This allows user to select a calendar
-            if (!cfg_calendarId || cfg_calendarId === "") {
-                root.showConfigModal = true
-            }
-        }
+        onTriggered: watchConfig()
     }
     
     // Timer to refresh after configuration changes (with delay to ensure save is complete)
@@ -1295,24 +1786,6 @@ PlasmoidItem {
             }
         }
     }
-    
-    // Watch for configuration changes - use a Timer to check periodically
-    Timer {
-        id: configCheckTimer
-        interval: 2000
-        running: true
-        repeat: true
-        onTriggered: {
-            var hasToken = cfg_accessToken && cfg_accessToken.length > 0
-            var hasCalendar = cfg_calendarId && cfg_calendarId.length > 0
-            
-            if (hasToken && hasCalendar) {
-                if (statusText === "Please configure the widget" || statusText === "Please configure the widget (click Configure button)") {
-                    refreshEvents()
-                }
-            }
-        }
-    }
 }
 
 